@@ -0,0 +1,132 @@
+"""Prompt tokens and latency of P&ID conversations with and without context caching.
+
+Runs the real P&ID specialists, with their documents attached by the
+callbacks, over concurrent multi-turn conversations. The models are
+`FakeVertexLlm` on one `FakeVertexEndpoint` that charges latency per prompt
+token it has to read, and caches are created by `FakeCacheService`, so the
+cache-hit path runs offline:
+
+- without caching, every turn sends the instructions and the whole PDF again,
+- with caching, `shared.context_cache` caches each specialist's prefix once
+  and every later turn, in any session, sends only the conversation.
+
+The Instructor's course guide is 42 pages and is cached. The Analyst's
+one-page P&ID with its instructions stays under the 4,096-token minimum for
+Gemini 3 and is sent uncached in both modes.
+
+    python benchmarks/context_cache.py --sessions 8 --turns 4
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT))
+sys.path.append(str(REPO_ROOT / "gemini-engineering-doc"))
+
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+import agents
+from shared.context_cache import ContextCache, set_context_cache
+from shared.fake_vertex import FakeCacheService, FakeVertexEndpoint, FakeVertexLlm
+from shared.scheduler import VertexScheduler, set_scheduler
+
+MODEL = "gemini-3-pro-preview"
+QUESTIONS = {
+    "instructor_agent": ["What does a gate valve symbol look like?", "How is a control loop drawn?",
+                         "What do dashed lines mean?", "Which letters identify a pressure transmitter?"],
+    "analyst_agent": ["Which pumps are shown on the diagram?", "Where does line 101 go?",
+                      "Which valves isolate the first vessel?", "What instruments are on the outlet line?"],
+}
+
+
+async def sweep(context_cache: bool, args) -> dict:
+    endpoint = FakeVertexEndpoint(rpm=args.rpm, tpm=args.tpm, base_latency_s=args.latency,
+                                  prefill_s_per_token=args.prefill_s_per_token)
+    caches = FakeCacheService()
+    set_scheduler(VertexScheduler())
+    cache = set_context_cache(ContextCache(caches=caches))
+    model = FakeVertexLlm(model=MODEL, endpoint=endpoint, caches=caches)
+
+    session_service = InMemorySessionService()
+    artifact_service = InMemoryArtifactService()
+    runners = {
+        name: Runner(agent=agents.create_pid_agent(None, None, route_to=name, specialist_model=model,
+                                                   context_cache=context_cache),
+                     app_name="agents", session_service=session_service, artifact_service=artifact_service)
+        for name in QUESTIONS
+    }
+
+    totals = {"prompt_tokens": 0, "cached_tokens": 0, "turns": 0}
+    turn_latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def converse(index: int):
+        name = list(QUESTIONS)[index % len(QUESTIONS)]
+        async with semaphore:
+            session = await session_service.create_session(app_name="agents", user_id="bench")
+            await agents.setup_artifact_service("agents", "bench", session.id, artifact_service)
+            for turn in range(args.turns):
+                question = QUESTIONS[name][turn % len(QUESTIONS[name])]
+                content = types.Content(role="user", parts=[types.Part(text=question)])
+                started_at = time.perf_counter()
+                async for event in runners[name].run_async(user_id="bench", session_id=session.id, new_message=content):
+                    if event.usage_metadata is not None:
+                        totals["prompt_tokens"] += event.usage_metadata.prompt_token_count or 0
+                        totals["cached_tokens"] += event.usage_metadata.cached_content_token_count or 0
+                turn_latencies.append(time.perf_counter() - started_at)
+                totals["turns"] += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(converse(index) for index in range(args.sessions)))
+    makespan = time.perf_counter() - started_at
+
+    ordered = sorted(turn_latencies)
+    return {
+        **totals,
+        "uncached_tokens_per_turn": (totals["prompt_tokens"] - totals["cached_tokens"]) / totals["turns"],
+        "cached_token_ratio": totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0,
+        "mean_turn_s": sum(ordered) / len(ordered),
+        "p95_turn_s": ordered[min(int(round(0.95 * (len(ordered) - 1))), len(ordered) - 1)],
+        "makespan_s": makespan,
+        "caches_created": caches.created,
+        "cache": cache.metrics() if context_cache else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare P&ID conversations with and without context caching.")
+    parser.add_argument("--sessions", type=int, default=8, help="Conversations, alternating between the specialists.")
+    parser.add_argument("--turns", type=int, default=4, help="Questions per conversation.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations in flight at once.")
+    parser.add_argument("--rpm", type=float, default=600, help="Endpoint requests/min quota.")
+    parser.add_argument("--tpm", type=float, default=10_000_000, help="Endpoint tokens/min quota.")
+    parser.add_argument("--latency", type=float, default=0.4, help="Endpoint base latency in seconds.")
+    parser.add_argument("--prefill-s-per-token", type=float, default=0.00005,
+                        help="Endpoint latency per prompt token read from scratch.")
+    args = parser.parse_args()
+
+    results = {mode: asyncio.run(sweep(mode == "cached", args)) for mode in ("uncached", "cached")}
+
+    print(f"{args.sessions} conversations of {args.turns} turns, {args.concurrency} in flight, "
+          f"{args.prefill_s_per_token * 1_000_000:.0f} ms per 1k uncached prompt tokens\n")
+    print(f"{'mode':<10}{'turns':>6}{'prompt tokens':>15}{'cached':>8}{'sent/turn':>11}{'mean s':>8}{'p95 s':>7}"
+          f"{'done s':>8}{'caches':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['turns']:>6}{r['prompt_tokens']:>15,}{r['cached_token_ratio']:>8.0%}"
+              f"{r['uncached_tokens_per_turn']:>11,.0f}{r['mean_turn_s']:>8.2f}{r['p95_turn_s']:>7.2f}"
+              f"{r['makespan_s']:>8.1f}{r['caches_created']:>8}")
+    cache = results["cached"]["cache"]
+    print(f"\ncontext cache: {cache['hits']} hits, {cache['created']} created, {cache['too_small']} prefixes too small, "
+          f"mean model latency {cache['mean_latency_s']['cached']}s cached / {cache['mean_latency_s']['uncached']}s "
+          f"uncached, {cache['latency_saved_s']}s saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Throughput and token cost of SkyGuard in single-frame vs. corridor mode.
+
+Runs the real ADK pipeline over a sweep of N frames, either one run per
+frame or one run per corridor segment from `plan_segments`. The models are
+offline stand-ins on one quota-limited `FakeVertexEndpoint`, shared through
+the scheduler like the real Gemini quota:
+
+- the agents are a scripted model that calls the tools and answers with the
+  schemas the way Gemini does (analysis tool, permit check when there is
+  heavy machinery, `set_model_response`),
+- the vision tool's SDK model answers with a scene description per image.
+
+Tokens are counted from what is actually sent: each agent request as
+serialized (instructions, history, tool declarations) at ~4 characters per
+token, images by their 768px tiles, and answers by their length. The endpoint
+charges latency per output token, so a segment's longer answer is slower.
+
+    python benchmarks/corridor_batching.py --frames 48 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import AsyncGenerator
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT))
+sys.path.append(str(REPO_ROOT / "gemini-vision"))
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from pydantic import ConfigDict
+
+import agents
+from corridor import Frame, image_tokens, plan_segments, segment_message
+from results import SkyGuardResult, corridor_results, summarize
+from shared.fake_vertex import FakeVertexEndpoint
+from shared.scheduler import ModelQuota, VertexScheduler, scheduled_model, set_scheduler
+
+MODEL = "gemini-2.5-flash"
+ASSETS = REPO_ROOT / "gemini-vision" / "assets"
+
+# What the vision model sees in each asset
+SCENES = {
+    "clear": ("Clear skies and bright midday light over open grassland along the right-of-way. The access road is dry "
+              "and empty, the line's towers are plainly visible and no vegetation encroaches on the corridor.", []),
+    "farm": ("Overcast, even light over cultivated farmland crossed by the right-of-way. A tractor works a field next "
+             "to the corridor and cattle graze by a fence line; a gravel farm road runs parallel to the line.",
+             ["tractor", "cattle", "pickup truck"]),
+    "excavator": ("Clear weather over a graded work site inside the right-of-way. A tracked excavator is digging a "
+                  "trench that runs toward the line, with fresh spoil piles and a parked pickup next to it.",
+                  ["excavator", "trench", "pickup truck"]),
+}
+
+
+def _tokens(chars: int) -> int:
+    return chars // 4
+
+
+def request_tokens(llm_request: LlmRequest) -> int:
+    """Input tokens of an agent request: instructions, history, tool declarations and response schema."""
+    config = llm_request.config
+    chars = len(config.system_instruction or "") if config and isinstance(config.system_instruction, str) else 0
+    chars += sum(len(content.model_dump_json(exclude_none=True)) for content in llm_request.contents or [])
+    chars += sum(len(tool.model_dump_json(exclude_none=True)) for tool in (config.tools or [] if config else []))
+    schema = config.response_schema if config else None
+    if isinstance(schema, type) and hasattr(schema, "model_json_schema"):
+        chars += len(json.dumps(schema.model_json_schema()))
+    return _tokens(chars)
+
+
+class Counters:
+    def __init__(self):
+        self.agent_calls = 0
+        self.vision_calls = 0
+        self.agent_tokens = 0
+        self.vision_tokens = 0
+
+
+class FakeVisionModel:
+    """Stands in for the Vertex AI SDK `GenerativeModel` the vision tools call."""
+
+    endpoint: FakeVertexEndpoint
+    counters: Counters
+    # Image bytes to (scene description, detected objects)
+    scenes: dict
+    image_tokens: int
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    async def generate_content_async(self, contents, **kwargs):
+        texts = [c for c in contents if isinstance(c, str)]
+        images = [c.inline_data.data for c in contents if not isinstance(c, str)]
+        observations = [{"frame_index": index, "scene_description": self.scenes[data][0],
+                         "detected_objects": self.scenes[data][1]} for index, data in enumerate(images)]
+        if len(images) == 1 and not any(text.startswith("Frame ") for text in texts):
+            observations[0].pop("frame_index")
+            answer = json.dumps(observations[0])
+        else:
+            answer = json.dumps({"frames": observations})
+        tokens_in = _tokens(sum(len(text) for text in texts)) + sum(self.image_tokens for _ in images)
+        tokens_out = _tokens(len(answer))
+        await self.endpoint.generate(tokens_in + tokens_out, output_tokens=tokens_out)
+        self.counters.vision_calls += 1
+        self.counters.vision_tokens += tokens_in + tokens_out
+        return type("Response", (), {"text": answer})()
+
+
+class ScriptedLlm(BaseLlm):
+    """Drives the scout, risk and dispatcher agents the way Gemini answers them."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    endpoint: FakeVertexEndpoint
+    counters: Counters
+
+    def _answer(self, llm_request: LlmRequest) -> types.Part:
+        tools = llm_request.tools_dict or {}
+        instruction = llm_request.config.system_instruction if llm_request.config else ""
+        last = llm_request.contents[-1].parts[0] if llm_request.contents and llm_request.contents[-1].parts else None
+        called = last.function_response.name if last is not None and last.function_response else None
+        message = next((c.parts[0].text for c in llm_request.contents if c.role == "user" and c.parts and c.parts[0].text), "")
+
+        if "analyze_aerial_image" in tools or "analyze_corridor_segment" in tools:
+            if called in ("analyze_aerial_image", "analyze_corridor_segment"):
+                answer = {k: v for k, v in last.function_response.response.items() if k != "error"}
+                return types.Part(function_call=types.FunctionCall(name="set_model_response", args=answer))
+            paths = re.findall(r"\S+\.(?:jpg|jpeg|png)", message)
+            if "analyze_corridor_segment" in tools:
+                call = types.FunctionCall(name="analyze_corridor_segment", args={"image_paths": paths})
+            else:
+                call = types.FunctionCall(name="analyze_aerial_image", args={"image_path": paths[0]})
+            return types.Part(function_call=call)
+
+        if "check_permit_database" in tools:
+            # The instruction embeds the scout's results as a dict; its own rules mention excavators too
+            high = "'excavator'" in instruction
+            if high and called is None:
+                call = types.FunctionCall(name="check_permit_database", args={"gps_location": "Location A"})
+                return types.Part(function_call=call)
+            answer = {"risk_level": "High" if high else "Low",
+                      "reasoning": ("An excavator is digging a trench toward the line and no active permit covers "
+                                    "excavation; vegetation management and ATV inspection do not apply." if high else
+                                    "Only livestock, farm vehicles and clear terrain: typical rural activity.")}
+            if "frames" in tools["set_model_response"]._model_type.model_fields:
+                frames = re.findall(r"'detected_objects': \[([^\]]*)\], 'frame': '([^']+)'", instruction)
+                answer["frames"] = [{"frame": frame, "risk_level": "High" if "'excavator'" in objects else "Low"}
+                                    for objects, frame in frames]
+            return types.Part(function_call=types.FunctionCall(name="set_model_response", args=answer))
+
+        high = "'High'" in instruction
+        message = ("STOP WORK: unpermitted excavation in the right-of-way. Halt digging and call the field manager."
+                   if high else "Log: routine inspection, low risk, no action required.")
+        return types.Part(text=json.dumps({"message": message}))
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        part = self._answer(llm_request)
+        tokens_in = request_tokens(llm_request)
+        tokens_out = _tokens(len(part.model_dump_json(exclude_none=True)))
+        await self.endpoint.generate(tokens_in + tokens_out, output_tokens=tokens_out)
+        self.counters.agent_calls += 1
+        self.counters.agent_tokens += tokens_in + tokens_out
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(total_token_count=tokens_in + tokens_out),
+        )
+
+
+async def sweep(mode: str, frames: list[Frame], args) -> dict:
+    endpoint = FakeVertexEndpoint(rpm=args.rpm, tpm=args.tpm, base_latency_s=args.latency,
+                                  decode_s_per_token=args.decode_s_per_token)
+    counters = Counters()
+    scheduler = set_scheduler(VertexScheduler())
+    scheduler.configure(MODEL, ModelQuota(rpm=args.rpm * 0.9, tpm=args.tpm * 0.9))
+
+    FakeVisionModel.endpoint, FakeVisionModel.counters = endpoint, counters
+    FakeVisionModel.scenes = {(ASSETS / f"{name}.jpg").read_bytes(): scene for name, scene in SCENES.items()}
+    FakeVisionModel.image_tokens = image_tokens(frames[0].path)
+    agents.GenerativeModel = FakeVisionModel
+
+    corridor = mode == "corridor"
+    model = scheduled_model(ScriptedLlm(model=MODEL, endpoint=endpoint, counters=counters))
+    pipeline = agents.get_infrastructure_monitoring_pipeline(MODEL, model=model, corridor=corridor)
+    session_service = InMemorySessionService()
+    runner = Runner(agent=pipeline, app_name="infrastructure_monitoring_pipeline", session_service=session_service)
+
+    if corridor:
+        messages = [segment_message(segment) for segment in
+                    plan_segments(frames, token_budget=args.token_budget, max_frames=args.max_frames)]
+    else:
+        messages = [f"Please analyze this aerial image: {frame.path}" for frame in frames]
+
+    results = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(message: str):
+        async with semaphore:
+            session = await session_service.create_session(app_name="infrastructure_monitoring_pipeline", user_id="bench")
+            state = {}
+            content = types.Content(role="user", parts=[types.Part(text=message)])
+            async for event in runner.run_async(user_id="bench", session_id=session.id, new_message=content):
+                state.update(event.actions.state_delta)
+            if corridor:
+                results.extend(corridor_results(state))
+            else:
+                results.append(SkyGuardResult.from_state(state, image=message.rsplit(" ", 1)[-1]))
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(run(message) for message in messages))
+    makespan = time.perf_counter() - started_at
+
+    summary = summarize(results)
+    return {
+        "runs": len(messages),
+        "images": summary.images,
+        "high_risk": summary.high_risk,
+        "images_per_s": summary.images / makespan,
+        "makespan_s": makespan,
+        "calls_per_image": (counters.agent_calls + counters.vision_calls) / len(frames),
+        "tokens_per_image": (counters.agent_tokens + counters.vision_tokens) / len(frames),
+        "vision_tokens_per_image": counters.vision_tokens / len(frames),
+        "429s": endpoint.throttled,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-frame and corridor-batched SkyGuard sweeps.")
+    parser.add_argument("--frames", type=int, default=48, help="Frames in the sweep, cycling through the three assets.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pipeline runs in flight at once.")
+    parser.add_argument("--max-frames", type=int, default=8, help="Most frames per corridor segment.")
+    parser.add_argument("--token-budget", type=int, default=32_000, help="Estimated tokens per corridor request.")
+    parser.add_argument("--rpm", type=float, default=300, help="Endpoint requests/min quota.")
+    parser.add_argument("--tpm", type=float, default=1_000_000, help="Endpoint tokens/min quota.")
+    parser.add_argument("--latency", type=float, default=0.4, help="Endpoint base latency in seconds.")
+    parser.add_argument("--decode-s-per-token", type=float, default=0.005, help="Endpoint latency per output token.")
+    args = parser.parse_args()
+
+    # Frames 50 m apart along one line, so positions never split a segment
+    names = list(SCENES)
+    frames = [Frame(str(ASSETS / f"{names[index % len(names)]}.jpg"), 51.0 + index * 0.00045, -114.0)
+              for index in range(args.frames)]
+    results = {mode: asyncio.run(sweep(mode, frames, args)) for mode in ("single", "corridor")}
+
+    assert results["single"]["high_risk"] == results["corridor"]["high_risk"], "the modes disagree on the risk"
+    print(f"{args.frames} frames of {image_tokens(frames[0].path):,} image tokens, {args.concurrency} runs in flight, "
+          f"endpoint quota {args.rpm:.0f} rpm / {args.tpm:,.0f} tpm\n")
+    print(f"{'mode':<10}{'runs':>6}{'images/s':>10}{'done s':>8}{'calls/image':>13}{'tokens/image':>14}"
+          f"{'vision tokens/image':>21}{'429s':>6}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['runs']:>6}{r['images_per_s']:>10.2f}{r['makespan_s']:>8.1f}{r['calls_per_image']:>13.2f}"
+              f"{r['tokens_per_image']:>14,.0f}{r['vision_tokens_per_image']:>21,.0f}{r['429s']:>6}")
+    print(f"\nboth modes flag {results['single']['high_risk']} of {args.frames} frames as high risk")
+
+
+if __name__ == "__main__":
+    main()
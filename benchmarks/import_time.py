@@ -0,0 +1,138 @@
+"""Import-time report for the entry points of the three projects, checked against a startup budget.
+
+Each entry point's startup imports run in a fresh interpreter with
+`python -X importtime`, from its project directory. The report shows how long
+they took (median of `--runs`), the packages that cost the most, and whether
+the total fits the budget. Modules a bare interpreter already imports
+(`site`, `encodings`, ...) are not counted.
+
+Startup is what an app imports before it can paint its first page, or a CLI
+before it can do any work. The SDKs a pipeline run needs are deferred to the
+run, or loaded by the `preload()` warm-up in the background; the `warm-up`
+rows show that deferred cost and are reported but not budgeted.
+
+    python benchmarks/import_time.py --budget-ms 500
+
+Exits with status 1 when an entry point is over budget. Streamlit itself is
+not part of the measured imports; `streamlit run` has loaded it before the
+script starts.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# The imports each entry point runs before it can do anything useful
+ENTRY_POINTS = {
+    "rca app": {
+        "project": "gemini-root-cause",
+        "imports": "import pandas; from agents.agent import create_rca_agent; from agents.anomaly import detect_incidents",
+    },
+    "rca logstore cli": {
+        "project": "gemini-root-cause",
+        "imports": "import agents.logstore",
+    },
+    "skyguard app": {
+        "project": "gemini-vision",
+        "imports": "from agents import get_infrastructure_monitoring_pipeline",
+    },
+    "pid app": {
+        "project": "gemini-engineering-doc",
+        "imports": "import agents, answer_cache, budget, router",
+    },
+    "rca warm-up": {
+        "project": "gemini-root-cause",
+        "imports": "from agents.agent import preload; preload()",
+        "budgeted": False,
+    },
+    "skyguard warm-up": {
+        "project": "gemini-vision",
+        "imports": "from agents import preload; preload()",
+        "budgeted": False,
+    },
+    "pid warm-up": {
+        "project": "gemini-engineering-doc",
+        "imports": "from agents import preload; preload()",
+        "budgeted": False,
+    },
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """
+    Returns:
+        list: (module, self microseconds, cumulative microseconds, nesting depth) per line of `-X importtime` output
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        # One space after the bar, then two per nesting level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(own), int(cumulative), depth))
+    return rows
+
+
+def importtime(statement: str, cwd: Path) -> list[tuple[str, int, int, int]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=cwd,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def measure(statement: str, cwd: Path, interpreter_modules: set[str]) -> dict:
+    """Total and per-package import time of one run, leaving out what a bare interpreter imports."""
+    total, packages = 0, defaultdict(int)
+    for name, own, cumulative, depth in importtime(statement, cwd):
+        if name in interpreter_modules:
+            continue
+        # Top-level lines already include everything they imported
+        if depth == 0:
+            total += cumulative
+        # A module's own time goes to its distribution, e.g. google.adk.agents to google
+        packages[name.split(".")[0]] += own
+    return {"total_ms": total / 1000, "packages_ms": {k: v / 1000 for k, v in packages.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of each entry point against a startup budget.")
+    parser.add_argument("--entry-points", nargs="+", choices=sorted(ENTRY_POINTS), default=list(ENTRY_POINTS))
+    parser.add_argument("--budget-ms", type=float, default=500, help="Startup budget per entry point.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per entry point; the median is reported.")
+    parser.add_argument("--top", type=int, default=4, help="Heaviest packages to list per entry point.")
+    args = parser.parse_args()
+
+    interpreter_modules = {name for name, *_ in importtime("pass", REPO_ROOT)}
+    over_budget = []
+    print(f"{'entry point':<20}{'import ms':>10}{'budget':>10}   heaviest packages")
+    for name in args.entry_points:
+        spec = ENTRY_POINTS[name]
+        try:
+            runs = [measure(spec["imports"], REPO_ROOT / spec["project"], interpreter_modules) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<20}{'failed':>10}{'':>10}   {e}")
+            continue
+        run = sorted(runs, key=lambda r: r["total_ms"])[len(runs) // 2]
+        heaviest = sorted(run["packages_ms"].items(), key=lambda item: -item[1])[:args.top]
+        budgeted = spec.get("budgeted", True)
+        status = ("ok" if run["total_ms"] <= args.budget_ms else "OVER") if budgeted else "-"
+        if status == "OVER":
+            over_budget.append(name)
+        print(f"{name:<20}{statistics.median(r['total_ms'] for r in runs):>10,.0f}{status:>10}   "
+              + ", ".join(f"{package} {ms:,.0f}" for package, ms in heaviest))
+
+    if over_budget:
+        print(f"\nOver the {args.budget_ms:,.0f} ms startup budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    print(f"\nEvery entry point starts within the {args.budget_ms:,.0f} ms budget.")
+
+
+if __name__ == "__main__":
+    main()
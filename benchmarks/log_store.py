@@ -0,0 +1,170 @@
+"""Memory footprint of Versa logs as `pd.read_csv` frames vs. the compact log store.
+
+Writes a synthetic Versa SD-WAN export (timestamp, site_id, log_level,
+message) of N rows, then measures each representation in its own subprocess
+so peak RSS is not shared between them:
+
+- pandas: `pd.read_csv` as the RCA tools use it today (object columns),
+- store build: `LogStore.build` from the CSV, in 1M-row chunks,
+- store: open the store and run the same query as pandas (events of 50
+  sites in one hour, by message), then decode every row to a categorical frame.
+
+`memory_usage(deep=True)` counts a string once per row, but the CSV parser
+shares repeated strings, so peak RSS is the footprint that matters.
+
+    python benchmarks/log_store.py --rows 10000000
+"""
+
+import argparse
+import importlib.util
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+LOGSTORE = Path(__file__).resolve().parent.parent / "gemini-root-cause" / "agents" / "logstore.py"
+
+TEMPLATES = [
+    ("VRRP State: MASTER to BACKUP", 0),
+    ("VRRP State: BACKUP to MASTER", 0),
+    ("Intermittent packet loss detected on primary link.", 0),
+    ("VPN tunnel flap detected.", 0),
+    ("Configuration sync completed.", 0),
+    ("High latency on primary link: {} ms", 900),
+    ("Packet loss {}% on WAN link 2", 40),
+    ("BGP neighbor 10.0.{}.1 state changed to Established", 256),
+]
+LEVELS = np.array(["INFO", "WARN", "ERROR"])
+QUERY_SITES = [f"SITE-{index:05d}" for index in range(50)]
+
+
+def write_csv(path: Path, rows: int, sites: int, seed: int, chunk: int = 1_000_000):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"SITE-{index:05d}" for index in range(sites)])
+    start = np.datetime64("2025-07-24T00:00:00")
+    for offset in range(0, rows, chunk):
+        n = min(chunk, rows - offset)
+        # One day of logs spread evenly over the rows, so the file stays time-sorted
+        seconds = (np.arange(offset, offset + n) * (86400 / rows)).astype(np.int64)
+        kinds = rng.integers(0, len(TEMPLATES), size=n)
+        messages = pd.Series(np.empty(n, dtype=object))
+        for kind, (text, span) in enumerate(TEMPLATES):
+            mask = kinds == kind
+            if span:
+                messages[mask] = [text.format(value) for value in rng.integers(1, span, size=int(mask.sum()))]
+            else:
+                messages[mask] = text
+        pd.DataFrame({
+            "timestamp": np.datetime_as_string(start + seconds, unit="s"),
+            "site_id": names[rng.integers(0, sites, size=n)],
+            "log_level": LEVELS[rng.integers(0, len(LEVELS), size=n)],
+            "message": messages,
+        }).to_csv(path, mode="a", header=offset == 0, index=False)
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM, unlike ru_maxrss, is not inherited from the parent across exec
+    status = Path("/proc/self/status")
+    if status.exists():
+        return int(next(line for line in status.read_text().splitlines() if line.startswith("VmHWM")).split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(kind: str, csv: Path, store_dir: Path) -> dict:
+    # Loaded by path: importing the `agents` package would pull in ADK and inflate the RSS baseline
+    spec = importlib.util.spec_from_file_location("logstore", LOGSTORE)
+    logstore = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(logstore)
+    LogStore = logstore.LogStore
+
+    window = (pd.Timestamp("2025-07-24 12:00"), pd.Timestamp("2025-07-24 13:00"))
+    if kind == "baseline":
+        return {"peak_rss_mb": _peak_rss_mb()}
+
+    if kind == "pandas":
+        started_at = time.perf_counter()
+        df = pd.read_csv(csv)
+        loaded_at = time.perf_counter()
+        times = pd.to_datetime(df["timestamp"])
+        hits = df[(times >= window[0]) & (times < window[1]) & df["site_id"].isin(QUERY_SITES)]
+        counts = hits["message"].value_counts()
+        return {"load_s": loaded_at - started_at, "query_s": time.perf_counter() - loaded_at,
+                "frame_mb": df.memory_usage(deep=True).sum() / 2**20, "peak_rss_mb": _peak_rss_mb(),
+                "query_rows": int(counts.sum())}
+
+    if kind == "build":
+        started_at = time.perf_counter()
+        store = LogStore.build([csv], store_dir)
+        return {"build_s": time.perf_counter() - started_at, "templates": len(store.templates),
+                "disk_mb": sum(f.stat().st_size for f in store_dir.iterdir()) / 2**20, "peak_rss_mb": _peak_rss_mb()}
+
+    started_at = time.perf_counter()
+    store = LogStore.open(store_dir)
+    opened_at = time.perf_counter()
+    rows = store.between(*window)
+    sites = [store.meta["dictionaries"]["site_id"].index(site) for site in QUERY_SITES]
+    hits = np.flatnonzero(np.isin(store.column("site_id")[rows], sites)) + rows.start
+    counts = store.frame(hits, columns=["message"])["message"].value_counts()
+    queried_at = time.perf_counter()
+    query_rss = _peak_rss_mb()
+    frame = store.frame()
+    decoded_at = time.perf_counter()
+    return {"open_s": opened_at - started_at, "query_s": queried_at - opened_at, "decode_s": decoded_at - queried_at,
+            "frame_mb": frame.memory_usage(deep=True).sum() / 2**20, "peak_rss_mb": query_rss,
+            "decoded_rss_mb": _peak_rss_mb(), "query_rows": int(counts.sum())}
+
+
+def run_worker(kind: str, csv: Path, store_dir: Path) -> dict:
+    output = subprocess.run([sys.executable, __file__, "--worker", kind, "--csv", str(csv), "--store", str(store_dir)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pd.read_csv frames and the compact log store.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--sites", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dir", help="Where to write the CSV and store; a temporary directory by default.")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--store", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, Path(args.csv), Path(args.store))))
+        return
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        csv, store_dir = Path(tmp) / "versa_sdwan_logs.csv", Path(tmp) / "versa_sdwan_logs.logstore"
+        started_at = time.perf_counter()
+        write_csv(csv, args.rows, args.sites, args.seed)
+        print(f"wrote {args.rows:,} rows ({csv.stat().st_size / 2**20:,.0f} MB CSV) in {time.perf_counter() - started_at:.0f}s\n")
+
+        baseline = run_worker("baseline", csv, store_dir)["peak_rss_mb"]
+        pandas = run_worker("pandas", csv, store_dir)
+        build = run_worker("build", csv, store_dir)
+        store = run_worker("store", csv, store_dir)
+        assert pandas["query_rows"] == store["query_rows"], "pandas and the store disagree on the query"
+
+    print(f"{'':<14}{'frame MB':>10}{'peak RSS MB':>13}{'load s':>9}{'query s':>9}")
+    print(f"{'pd.read_csv':<14}{pandas['frame_mb']:>10,.0f}{pandas['peak_rss_mb'] - baseline:>13,.0f}"
+          f"{pandas['load_s']:>9.1f}{pandas['query_s']:>9.2f}")
+    print(f"{'log store':<14}{store['frame_mb']:>10,.0f}{store['peak_rss_mb'] - baseline:>13,.0f}"
+          f"{store['open_s']:>9.3f}{store['query_s']:>9.2f}")
+    print(f"\nstore: {build['disk_mb']:,.0f} MB on disk, {build['templates']} templates, built in {build['build_s']:.0f}s "
+          f"(peak RSS {build['peak_rss_mb'] - baseline:,.0f} MB)")
+    print(f"decoding every row to a categorical frame: {store['decode_s']:.1f}s, "
+          f"peak RSS {store['decoded_rss_mb'] - baseline:,.0f} MB")
+    print(f"peak RSS is above a {baseline:.0f} MB interpreter baseline; query: {pandas['query_rows']:,} rows "
+          f"from 50 sites in one hour")
+
+
+if __name__ == "__main__":
+    main()
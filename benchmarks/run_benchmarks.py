@@ -0,0 +1,344 @@
+"""End-to-end benchmarks for the RCA, SkyGuard and P&ID pipelines.
+
+Models are served by the record/replay stand-in in `shared/replay.py`, so the
+numbers isolate what the pipelines themselves cost: ADK orchestration, tools,
+event-loop stalls and memory at 1, 10 and 100 concurrent sessions.
+
+    # once, with Google Cloud credentials: capture real responses
+    python benchmarks/run_benchmarks.py --mode record
+
+    # any time, offline: replay them with 0.5s of synthetic model latency
+    python benchmarks/run_benchmarks.py --latency 0.5 --baseline benchmarks/results/baseline.json
+
+    # profile every tool and callback under load into .profiles/ (see shared/profiling.py)
+    python benchmarks/run_benchmarks.py --profile --concurrency 10
+
+Each flow runs in its own subprocess from its project directory, because the
+projects all use the module name `agents` and relative data paths.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CASSETTES = REPO_ROOT / "benchmarks" / "cassettes"
+RESULTS = REPO_ROOT / "benchmarks" / "results"
+
+FLOWS = {
+    "rca": {
+        "project": "gemini-root-cause",
+        "app_name": "rca_agent",
+        "prompt": "Incident date: 2025-07-24. Affected location: Calgary.\n"
+                  "Analyze the logs from ['data/servicenow_incidents.csv', 'data/versa_sdwan_logs.csv']",
+    },
+    "skyguard": {
+        "project": "gemini-vision",
+        "app_name": "infrastructure_monitoring_pipeline",
+        "prompt": "Please analyze this aerial image: assets/excavator.jpg",
+    },
+    "pid": {
+        "project": "gemini-engineering-doc",
+        "app_name": "agents",
+        "prompt": "What does the P&ID document pid_sample_1.pdf depict?",
+    },
+}
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+# --- Worker side: runs inside the project directory ---
+
+def build_flow(flow: str, args):
+    """
+    Builds the flow's root agent with every model swapped for a replay stand-in.
+
+    Returns:
+        tuple: (root agent, optional async artifact-service factory, replay models by name)
+    """
+    from shared.replay import ReplayGenerativeModel, ReplayLlm
+
+    cassette = CASSETTES / flow
+    models = {}
+
+    def llm(model_name):
+        if model_name not in models:
+            models[model_name] = ReplayLlm(model=model_name, cassette_dir=str(cassette), mode=args.mode,
+                                           latency_s=args.latency, jitter_s=args.jitter, on_miss=args.on_miss)
+        return models[model_name]
+
+    project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+    location = os.getenv("GOOGLE_CLOUD_LOCATION")
+
+    if flow == "rca":
+        from agents.agent import create_rca_agent
+        return create_rca_agent(project_id, location, "gemini-2.5-flash", model=llm("gemini-2.5-flash")), None, models
+
+    import agents
+    if flow == "skyguard":
+        # analyze_aerial_image calls the Vertex AI SDK directly, so swap that too
+        agents.GenerativeModel = ReplayGenerativeModel.factory(
+            cassette / "vision_tool", mode=args.mode, latency_s=args.latency, on_miss=args.on_miss,
+            synthetic_text=json.dumps({"scene_description": "synthetic", "detected_objects": []}),
+        )
+        return agents.get_infrastructure_monitoring_pipeline(model=llm("gemini-2.5-flash")), None, models
+
+    root = agents.create_pid_agent(project_id, location, specialist_model=llm("gemini-3-pro-preview"),
+                                   overseer_model=llm("gemini-3-pro-preview"))
+    return root, agents.setup_artifact_service, models
+
+
+def make_tool_timer():
+    from google.adk.plugins.base_plugin import BasePlugin
+    from shared.replay import record_time
+
+    class ToolTimer(BasePlugin):
+        """Attributes wall time spent inside tools to the current session."""
+
+        def __init__(self):
+            super().__init__(name="benchmark_tool_timer")
+            self._started = {}
+
+        async def before_tool_callback(self, *, tool, tool_args, tool_context):
+            self._started[tool_context.function_call_id] = time.perf_counter()
+
+        async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+            started_at = self._started.pop(tool_context.function_call_id, None)
+            if started_at is not None:
+                record_time("tool_s", time.perf_counter() - started_at)
+
+    return ToolTimer()
+
+
+async def run_session(flow: str, root, artifact_factory, session_service, shared_runner, index: int) -> dict:
+    from google.adk.runners import Runner
+    from google.genai import types
+    from shared.replay import run_stats
+
+    spec = FLOWS[flow]
+    stats = {}
+    run_stats.set(stats)
+
+    started_at = time.perf_counter()
+    session = await session_service.create_session(app_name=spec["app_name"], user_id=f"bench{index}")
+    runner = shared_runner
+    if artifact_factory is not None:
+        artifact_service = await artifact_factory(app_name=spec["app_name"], user_id=f"bench{index}", session_id=session.id)
+        runner = Runner(agent=root, app_name=spec["app_name"], session_service=session_service,
+                        artifact_service=artifact_service, plugins=[make_tool_timer()])
+
+    events = 0
+    message = types.Content(role="user", parts=[types.Part(text=spec["prompt"])])
+    async for _ in runner.run_async(user_id=f"bench{index}", session_id=session.id, new_message=message):
+        events += 1
+
+    wall = time.perf_counter() - started_at
+    model_s = stats.get("model_s", 0.0)
+    tool_s = stats.get("tool_s", 0.0)
+    return {
+        "wall_s": wall,
+        "model_s": model_s,
+        "tool_s": tool_s,
+        "tool_model_s": stats.get("tool_model_s", 0.0),
+        "overhead_s": max(wall - model_s - tool_s, 0.0),
+        "model_calls": stats.get("model_s_calls", 0),
+        "tool_calls": stats.get("tool_s_calls", 0),
+        "events": events,
+    }
+
+
+async def _monitor_loop_lag(samples: list, interval: float = 0.005):
+    while True:
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(time.perf_counter() - started_at - interval, 0.0))
+
+
+async def run_level(flow: str, root, artifact_factory, sessions: int, trace_memory: bool) -> dict:
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    session_service = InMemorySessionService()
+    shared_runner = Runner(agent=root, app_name=FLOWS[flow]["app_name"], session_service=session_service,
+                           plugins=[make_tool_timer()])
+
+    if trace_memory:
+        tracemalloc.start()
+    lag_samples = []
+    monitor = asyncio.create_task(_monitor_loop_lag(lag_samples))
+    started_at = time.perf_counter()
+    runs = await asyncio.gather(*(
+        run_session(flow, root, artifact_factory, session_service, shared_runner, i) for i in range(sessions)
+    ))
+    elapsed = time.perf_counter() - started_at
+    monitor.cancel()
+
+    report = {
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "sessions_per_s": sessions / elapsed if elapsed else 0.0,
+        "wall_p50_s": _percentile([r["wall_s"] for r in runs], 0.5),
+        "wall_p95_s": _percentile([r["wall_s"] for r in runs], 0.95),
+        "model_s_mean": statistics.mean(r["model_s"] for r in runs),
+        "tool_s_mean": statistics.mean(r["tool_s"] for r in runs),
+        "overhead_s_mean": statistics.mean(r["overhead_s"] for r in runs),
+        "overhead_s_p95": _percentile([r["overhead_s"] for r in runs], 0.95),
+        "model_calls_per_session": statistics.mean(r["model_calls"] for r in runs),
+        "tool_calls_per_session": statistics.mean(r["tool_calls"] for r in runs),
+        "events_per_session": statistics.mean(r["events"] for r in runs),
+        "loop_lag_ms_mean": statistics.mean(lag_samples) * 1000 if lag_samples else 0.0,
+        "loop_lag_ms_p99": _percentile(lag_samples, 0.99) * 1000,
+        "loop_lag_ms_max": max(lag_samples, default=0.0) * 1000,
+    }
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["traced_peak_mb"] = peak / 2**20
+    return report
+
+
+def worker(args):
+    from shared.scheduler import get_scheduler
+
+    root, artifact_factory, models = build_flow(args.worker, args)
+    # One discarded session first: the SDK imports are deferred to the first run (see preload()),
+    # and would otherwise be charged to the lowest concurrency level
+    asyncio.run(run_level(args.worker, root, artifact_factory, 1, trace_memory=False))
+    warm_up_misses = sum(m.misses for m in models.values())
+    if args.profile:
+        from shared.profiling import get_profiler
+        get_profiler().reset()
+    levels = {}
+    for sessions in args.concurrency:
+        report = asyncio.run(run_level(args.worker, root, artifact_factory, sessions, trace_memory=False))
+        if args.memory:
+            # A separate pass: tracemalloc slows allocation-heavy code and would skew the timings
+            report["traced_peak_mb"] = asyncio.run(
+                run_level(args.worker, root, artifact_factory, sessions, trace_memory=True)
+            )["traced_peak_mb"]
+        report["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        # Replayed calls are admitted by the scheduler like real ones, so its queueing is part of the overhead
+        scheduler = get_scheduler().metrics().values()
+        report["concurrency_limit"] = max((m["concurrency_limit"] for m in scheduler), default=0.0)
+        report["queue_wait_p95_s"] = max((m["queue_wait_p95_s"]["interactive"] for m in scheduler), default=0.0)
+        levels[str(sessions)] = report
+    result = {"flow": args.worker, "levels": levels, "replay_misses": sum(m.misses for m in models.values()) - warm_up_misses}
+    if args.profile:
+        from shared.profiling import get_profiler
+        get_profiler().save()
+    Path(args.worker_output).write_text(json.dumps(result))
+
+
+# --- Driver side ---
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lists metrics that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for flow, flow_result in results["flows"].items():
+        for level, report in flow_result.get("levels", {}).items():
+            before = baseline.get("flows", {}).get(flow, {}).get("levels", {}).get(level)
+            if not before:
+                continue
+            for metric in ("wall_p95_s", "overhead_s_mean", "loop_lag_ms_p99", "traced_peak_mb"):
+                if metric in report and before.get(metric):
+                    change = (report[metric] - before[metric]) / before[metric]
+                    marker = "❌" if change > tolerance else "✅"
+                    print(f"   {marker} {flow} x{level} {metric}: {before[metric]:.3f} → {report[metric]:.3f} ({change:+.0%})")
+                    if change > tolerance:
+                        regressions.append(f"{flow} x{level} {metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the three agent pipelines against a record/replay model.")
+    parser.add_argument("--flows", nargs="+", choices=sorted(FLOWS), default=sorted(FLOWS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument("--mode", choices=["replay", "record"], default="replay")
+    parser.add_argument("--latency", type=float, default=0.5, help="Synthetic seconds per replayed model call.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency per call.")
+    parser.add_argument("--on-miss", choices=["error", "synthetic"], default="synthetic",
+                        help="What to do when a request was never recorded.")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the tracemalloc pass.")
+    parser.add_argument("--output", type=Path, default=None, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", type=Path, default=None, help="Previous results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression vs. the baseline.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile tools and callbacks into .profiles/; timings include the profiler's overhead.")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    if args.mode == "record":
+        # Recording hits the real API: one session, no synthetic latency
+        args.concurrency, args.latency, args.memory = [1], 0.0, False
+    if args.profile:
+        # The profiler keeps tracemalloc running, which the memory pass would stop
+        args.memory = False
+
+    results = {"created_at": time.time(), "mode": args.mode, "latency_s": args.latency, "flows": {}}
+    for flow in args.flows:
+        project_dir = REPO_ROOT / FLOWS[flow]["project"]
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            worker_output = tmp.name
+        command = [sys.executable, str(Path(__file__).resolve()), "--worker", flow, "--worker-output", worker_output,
+                   "--mode", args.mode, "--latency", str(args.latency), "--jitter", str(args.jitter),
+                   "--on-miss", args.on_miss, "--concurrency", *map(str, args.concurrency)]
+        if not args.memory:
+            command.append("--no-memory")
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(REPO_ROOT), str(project_dir), os.environ.get("PYTHONPATH", "")])}
+        if args.profile:
+            command.append("--profile")
+            env["AGENT_PROFILE"] = "1"
+
+        print(f"▶️  {flow}: sessions {args.concurrency}")
+        completed = subprocess.run(command, cwd=project_dir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"❌ {flow} failed:\n{completed.stderr[-2000:]}")
+            results["flows"][flow] = {"error": completed.stderr[-2000:]}
+            continue
+        results["flows"][flow] = json.loads(Path(worker_output).read_text())
+        os.remove(worker_output)
+
+        for level, report in results["flows"][flow]["levels"].items():
+            print(f"   x{level:<4} p95 {report['wall_p95_s']:.2f}s · overhead {report['overhead_s_mean'] * 1000:.0f}ms"
+                  f" · tools {report['tool_s_mean'] * 1000:.0f}ms · loop lag p99 {report['loop_lag_ms_p99']:.1f}ms"
+                  f" · {report['sessions_per_s']:.1f} sessions/s"
+                  + (f" · limit {report['concurrency_limit']:.0f}, queue p95 {report['queue_wait_p95_s'] * 1000:.0f}ms"
+                     if "concurrency_limit" in report else "")
+                  + (f" · peak {report['traced_peak_mb']:.1f}MB" if "traced_peak_mb" in report else ""))
+
+    output = args.output or RESULTS / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\n💾 Results saved to {output}")
+    if args.profile:
+        print("🔥 Profile merged into .profiles/; summarize it with `python -m shared.profiling`")
+
+    if args.baseline:
+        print(f"\n📊 Compared to {args.baseline}:")
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Interactive and batch traffic against a throttling fake endpoint, with and without the scheduler.
+
+A batch job (e.g. a SkyGuard image sweep or a set of RCA runs) fires all of
+its requests at once while a user keeps asking interactive questions. Without
+the scheduler, every call retries 429s on its own with exponential backoff,
+like the SDK does. With it, calls are paced to the quota and interactive
+calls jump the batch queue.
+
+    python benchmarks/scheduler_sim.py --batch 300 --rpm 1200
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from shared.fake_vertex import FakeVertexEndpoint, FakeVertexLlm, ResourceExhausted
+from shared.scheduler import ModelQuota, VertexScheduler, lane, scheduled_model, set_scheduler
+
+MODEL = "gemini-2.5-flash"
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)] if ordered else float("nan")
+
+
+def make_request(prompt_chars: int) -> LlmRequest:
+    return LlmRequest(
+        model=MODEL,
+        contents=[types.Content(role="user", parts=[types.Part(text="x" * prompt_chars)])],
+        config=types.GenerateContentConfig(max_output_tokens=512),
+    )
+
+
+async def direct_call(model, request, max_retries: int = 4):
+    """What each call site does today: retry 429s with jittered exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            async for _ in model.generate_content_async(request):
+                pass
+            return
+        except ResourceExhausted:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.5))
+
+
+async def scenario(mode: str, args) -> dict:
+    endpoint = FakeVertexEndpoint(rpm=args.rpm, tpm=args.tpm, base_latency_s=args.latency,
+                                  throttle_probability=args.throttle_probability)
+    fake = FakeVertexLlm(model=MODEL, endpoint=endpoint)
+
+    if mode == "scheduled":
+        scheduler = set_scheduler(VertexScheduler())
+        # Pace under the endpoint's quota: the bucket's burst plus a full window of refill must still fit
+        scheduler.configure(MODEL, ModelQuota(rpm=args.rpm * 0.9, tpm=args.tpm * 0.9))
+        interactive_model = batch_model = scheduled_model(fake)
+
+        async def run(model, request, lane_name):
+            with lane(lane_name):
+                async for _ in model.generate_content_async(request):
+                    pass
+    else:
+        interactive_model = batch_model = fake
+
+        async def run(model, request, lane_name):
+            await direct_call(model, request)
+
+    failures = {"interactive": 0, "batch": 0}
+    interactive_latencies = []
+    started_at = time.perf_counter()
+
+    async def batch_job(index):
+        try:
+            await run(batch_model, make_request(args.prompt_chars), "batch")
+        except ResourceExhausted:
+            failures["batch"] += 1
+
+    async def interactive_user():
+        while time.perf_counter() - started_at < args.interactive_s:
+            t0 = time.perf_counter()
+            try:
+                await run(interactive_model, make_request(400), "interactive")
+                interactive_latencies.append(time.perf_counter() - t0)
+            except ResourceExhausted:
+                failures["interactive"] += 1
+            await asyncio.sleep(args.think_time)
+
+    batch = asyncio.gather(*(batch_job(i) for i in range(args.batch)))
+    await asyncio.gather(batch, *(interactive_user() for _ in range(args.users)))
+    makespan = time.perf_counter() - started_at
+
+    report = {
+        "429s": endpoint.throttled,
+        "interactive_p50_s": _percentile(interactive_latencies, 0.5),
+        "interactive_p95_s": _percentile(interactive_latencies, 0.95),
+        "interactive_done": len(interactive_latencies),
+        "batch_makespan_s": makespan,
+        "failed": failures["interactive"] + failures["batch"],
+    }
+    if mode == "scheduled":
+        report["metrics"] = scheduler.metrics()[MODEL]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare direct calls and the shared scheduler against a throttling fake endpoint.")
+    parser.add_argument("--batch", type=int, default=300, help="Batch requests fired at once.")
+    parser.add_argument("--users", type=int, default=3, help="Interactive users asking questions during the batch.")
+    parser.add_argument("--interactive-s", type=float, default=15.0, help="How long interactive users keep asking.")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Pause between one user's questions.")
+    parser.add_argument("--rpm", type=float, default=1200, help="Endpoint requests/min quota.")
+    parser.add_argument("--tpm", type=float, default=2_000_000, help="Endpoint tokens/min quota.")
+    parser.add_argument("--latency", type=float, default=0.4, help="Endpoint base latency in seconds.")
+    parser.add_argument("--prompt-chars", type=int, default=4000, help="Prompt size of batch requests.")
+    parser.add_argument("--throttle-probability", type=float, default=0.02, help="Random 429s injected under quota.")
+    args = parser.parse_args()
+
+    random.seed(7)
+    results = {mode: asyncio.run(scenario(mode, args)) for mode in ("direct", "scheduled")}
+
+    print(f"{args.batch} batch requests + {args.users} interactive users for {args.interactive_s:.0f}s, "
+          f"endpoint quota {args.rpm:.0f} rpm / {args.tpm:,.0f} tpm\n")
+    print(f"{'mode':<11}{'429s':>7}{'failed':>8}{'interactive p50/p95 s':>24}{'answered':>10}{'batch done s':>14}")
+    for mode, r in results.items():
+        print(f"{mode:<11}{r['429s']:>7}{r['failed']:>8}{r['interactive_p50_s']:>12.2f}/{r['interactive_p95_s']:<11.2f}"
+              f"{r['interactive_done']:>10}{r['batch_makespan_s']:>14.1f}")
+    metrics = results["scheduled"]["metrics"]
+    print(f"\nscheduler: limit {metrics['concurrency_limit']}, granted {metrics['granted']}, retried {metrics['retried']}, "
+          f"queue wait p95 {metrics['queue_wait_p95_s']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Append and load latency of the session stores at scale.
+
+Creates N sessions, appends events to them round-robin, then loads random
+sessions. The SQLite store is compared against `InMemorySessionService`.
+
+    python benchmarks/session_store.py --sessions 10000 --events 20
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.sessions import SqliteSessionService
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def make_event(index: int, text_chars: int) -> Event:
+    """An agent turn about the size of a researcher or hypothesis answer."""
+    author = "user" if index % 4 == 0 else "researcher_agent"
+    text = (f"Turn {index}: site SFO-EDGE-2 reported packet loss on WAN link 1 during the storm window. " * 20)[:text_chars]
+    return Event(
+        author=author,
+        invocation_id=f"inv-{index // 4}",
+        content=types.Content(role="user" if author == "user" else "model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta={"last_turn": index}),
+    )
+
+
+async def bench(service, args) -> dict:
+    rng = random.Random(7)
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    sessions = [await service.create_session(app_name="bench", user_id=f"user{i % 100}") for i in range(args.sessions)]
+    create_s = time.perf_counter() - started_at
+
+    appends = []
+    for turn in range(args.events):
+        for session in sessions:
+            event = make_event(turn, args.text_chars)
+            t0 = time.perf_counter()
+            await service.append_event(session, event)
+            appends.append(time.perf_counter() - t0)
+        # The runner drops its session object after each turn; keep only what a server would hold
+        if isinstance(service, SqliteSessionService):
+            for session in sessions:
+                session.events.clear()
+
+    loads = []
+    for _ in range(args.loads):
+        session = rng.choice(sessions)
+        t0 = time.perf_counter()
+        loaded = await service.get_session(app_name="bench", user_id=session.user_id, session_id=session.id)
+        loads.append(time.perf_counter() - t0)
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "create_per_session_ms": 1000 * create_s / args.sessions,
+        "append_ms": [1000 * _percentile(appends, f) for f in (0.5, 0.95, 0.99)],
+        "load_ms": [1000 * _percentile(loads, f) for f in (0.5, 0.95, 0.99)],
+        "events_per_load": len(loaded.events),
+        "python_heap_mb": current / 2**20,
+        "python_peak_mb": peak / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark session store append/load latency.")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=20, help="Events appended to every session.")
+    parser.add_argument("--loads", type=int, default=2000, help="Random get_session calls.")
+    parser.add_argument("--text-chars", type=int, default=800, help="Text size of each event.")
+    parser.add_argument("--window", type=int, default=40, help="Events the SQLite store keeps verbatim.")
+    parser.add_argument("--skip-memory-store", action="store_true", help="Only benchmark the SQLite store.")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "sessions.db"
+        results["sqlite"] = asyncio.run(bench(SqliteSessionService(db, window=args.window), args))
+        results["sqlite"]["db_mb"] = sum(p.stat().st_size for p in Path(tmp).iterdir()) / 2**20
+    if not args.skip_memory_store:
+        results["in-memory"] = asyncio.run(bench(InMemorySessionService(), args))
+
+    print(f"{args.sessions:,} sessions x {args.events} events ({args.text_chars} chars each), {args.loads:,} random loads\n")
+    print(f"{'store':<11}{'append p50/p95/p99 ms':>26}{'load p50/p95/p99 ms':>26}{'events':>8}{'heap MB':>9}{'disk MB':>9}")
+    for name, r in results.items():
+        print(f"{name:<11}{'/'.join(f'{v:.3f}' for v in r['append_ms']):>26}{'/'.join(f'{v:.3f}' for v in r['load_ms']):>26}"
+              f"{r['events_per_load']:>8}{r['python_heap_mb']:>9.1f}{r.get('db_mb', 0):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
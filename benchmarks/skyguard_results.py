@@ -0,0 +1,95 @@
+"""Cost of aggregating SkyGuard results for a batch run.
+
+Simulates N finished runs and rolls them up two ways:
+
+- text: what the app used to do per run: `json.loads` the streamed scout and
+  risk text and style the alert by searching the dispatcher text for "HIGH",
+- typed: `SkyGuardResult`s written as JSON lines, read back and validated
+  by `load_results` and rolled up by `summarize`.
+
+The text path does no validation, and its substring search counts a
+"Low risk, no high-voltage work" log entry as high risk.
+
+    python benchmarks/skyguard_results.py --results 50000
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "gemini-vision"))
+
+from results import DispatcherOutput, RiskAssessment, ScoutOutput, SkyGuardResult, dump_results, load_results, summarize
+
+OBJECTS = ["pickup truck", "excavator", "cattle", "tractor", "person", "backhoe", "ATV", "trench"]
+
+
+def simulate(count: int, seed: int) -> list[SkyGuardResult]:
+    rng = random.Random(seed)
+    results = []
+    for index in range(count):
+        high = rng.random() < 0.1
+        results.append(SkyGuardResult(
+            image=f"frame_{index:06d}.jpg",
+            scout=ScoutOutput(scene_description="Clear skies over flat farmland along the right-of-way.",
+                              detected_objects=rng.sample(OBJECTS, rng.randint(0, 3))),
+            risk=RiskAssessment(risk_level="High" if high else "Low",
+                                reasoning="Heavy machinery without a matching permit." if high else "Routine rural activity."),
+            action=DispatcherOutput(message="STOP WORK: unpermitted excavation near the line." if high
+                                    else "Log: Low risk, no high-voltage work in progress."),
+        ))
+    return results
+
+
+def text_path(texts: list[dict]) -> tuple[int, Counter]:
+    high, objects = 0, Counter()
+    for run in texts:
+        scout_output = run["scout_agent"]
+        if scout_output.strip().startswith("{"):
+            objects.update(json.loads(scout_output).get("detected_objects", []))
+        json.loads(run["risk_agent"])
+        if "STOP WORK" in run["dispatcher_agent"].upper() or "HIGH" in run["dispatcher_agent"].upper():
+            high += 1
+    return high, objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare text parsing and typed results for batch aggregation.")
+    parser.add_argument("--results", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = simulate(args.results, args.seed)
+    texts = [{"scout_agent": r.scout.model_dump_json(), "risk_agent": r.risk.model_dump_json(),
+              "dispatcher_agent": r.action.message} for r in results]
+
+    started_at = time.perf_counter()
+    text_high, text_objects = text_path(texts)
+    text_s = time.perf_counter() - started_at
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "results.jsonl"
+        started_at = time.perf_counter()
+        dump_results(results, path)
+        dumped_at = time.perf_counter()
+        loaded = load_results(path)
+        loaded_at = time.perf_counter()
+        summary = summarize(loaded)
+        summarized_at = time.perf_counter()
+        size_mb = path.stat().st_size / 2**20
+
+    assert summary.detected_objects == text_objects
+    print(f"{args.results:,} results ({size_mb:.1f} MB of JSON lines)")
+    print(f"   text   parse + substring  {text_s * 1000:7.0f} ms   high risk {text_high:,}")
+    print(f"   typed  load + summarize   {(summarized_at - dumped_at) * 1000:7.0f} ms   high risk {summary.high_risk:,}   "
+          f"(load {(loaded_at - dumped_at) * 1000:.0f} ms)")
+    print(f"   (writing the file took {(dumped_at - started_at) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
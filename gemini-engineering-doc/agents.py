@@ -1,22 +1,118 @@
-from google.adk.agents import Agent
-from google.genai import types
-from google.adk.planners import BuiltInPlanner
-from google.adk.artifacts import InMemoryArtifactService
 from pathlib import Path
-import vertexai
-from google.adk.agents.callback_context import CallbackContext
-from google.adk.models import LlmResponse, LlmRequest
-from typing import Optional
+import hashlib
+import os
+import sys
+from typing import TYPE_CHECKING, Optional
 
-from google.adk import Agent
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.profiling import profiled
 
-ASSETS_DIR = Path("./assets")
+# ADK and the Vertex AI SDK take seconds to import, so they are imported where
+# agents are built or documents loaded; preload() does that ahead of time
+if TYPE_CHECKING:
+    from google.adk.agents.callback_context import CallbackContext
+    from google.adk.models import LlmResponse, LlmRequest
 
-async def inject_pid_context(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+ASSETS_DIR = Path(__file__).resolve().parent / "assets"
+
+# Documents pre-loaded into the artifact service for the specialists.
+CONTEXT_FILES = [
+    "learning_course.pdf",
+    "pid_sample_1.pdf"
+]
+
+ANALYST_INSTRUCTION = """
+        You are a Senior Process Engineer acting as a P&ID Analyst.
+        
+        **Context:** A P&ID diagram (PDF) has been attached to the user's message in your context. 
+        You have immediate visual access to this document.
+        
+        **Your Goal:** Answer technical questions based *strictly* on the visual information in that attached diagram.
+        
+        **Analysis Guidelines:**
+        - **Visual Tracing:** Trace process lines carefully from source to destination to confirm flow direction.
+        - **Tag Identification:** Identify components explicitly by their tag numbers (e.g., V-101, P-20A) whenever possible.
+        - **Ambiguity:** If a symbol is distinct but you cannot read the tag (e.g., due to resolution), describe the component's visual appearance and location (e.g., "The pump in the bottom left") rather than guessing.
+        - **Standards:** Do not rely on general industry standards if they conflict with what is drawn; the specific diagram takes precedence.
+        
+        **Output Format:**
+        - **Strictly use Markdown** for all responses.
+        - Use **Bold** for specific tag numbers (e.g., **V-101**) and component names.
+        - Use `Headed Sections` (###) to separate different parts of your analysis.
+        - Use bullet points for lists of components or process steps.
+        """
+
+INSTRUCTOR_INSTRUCTION = """
+        You are a friendly and knowledgeable P&ID Instructor.
+        
+        **Context:** A Course Guide (`learning_course.pdf`) has been attached to the conversation. 
+        You have direct access to this document in your context history.
+        
+        **Your Goal:** Teach the user about Process and Instrumentation Diagrams using the content of that attached guide.
+        
+        **Teaching Guidelines:**
+        - **Source of Truth:** Base your explanations strictly on the provided guide. Do not lecture on general topics unless they are present in the material.
+        - **Referencing:** When explaining a symbol or concept, explicitly mention the page number or section title where it is found (e.g., "As shown on slide 4...").
+        - **Visual Descriptions:** Since the user might not be looking at the specific page you are, describe the visuals. (e.g., "The gate valve symbol looks like a bow-tie...").
+        
+        **Tone:**
+        - Be patient and educational.
+        - Use analogies to simplify complex chemical engineering concepts.
+        - If a question is not covered in the guide, politely admit that the current course material does not address it.
+        
+        **Output Format:**
+        - **Strictly use Markdown** for all responses.
+        - Use **Bold** for key terms and concepts.
+        - Use > Blockquotes for important definitions or rules from the guide.
+        - Use Numbered Lists for step-by-step procedures.
+        """
+
+OVERSEER_INSTRUCTION = """
+        You are the "Overseer," a specialized orchestrator for a Chemical Engineering P&ID Assistant.
+        Your goal is to route user requests to the correct specialist sub-agent.
+
+        You have access to three specialists:
+        1. **Analyst:** Has access to specific P&ID PDF files. Use this for specific lookup questions (e.g., "What is the pressure on line 101?").
+        2. **Instructor:** Has access to the Course Guide. Use this for "How-to" or educational questions (e.g., "What does this symbol mean?" or "Teach me about control loops").
+        3. **Drafter:** Has access to the Reference Guide. Use this for visualization requests (e.g., "Draw a simple feed loop").
+
+        **Rules:**
+        - Do not attempt to answer technical questions yourself. Always delegate to a specialist.
+        - If the user greets you, reply politely and explain your capabilities.
+        - If a query is ambiguous, ask for clarification before routing.
+        
+        **Output Format:**
+        - Format all your direct responses in **Markdown**.
+        - Use bullet points when listing your available capabilities.
+        """
+
+# Routing needs far less reasoning than the specialists' answers.
+OVERSEER_THINKING_BUDGET = 2048
+
+# What the specialists are sent besides their prompts; bump it when that changes.
+# 2: the callbacks attach each specialist's PDF, which earlier answers were written without.
+REQUEST_FORMAT = 2
+
+# Changes whenever any prompt changes, so cached answers from older prompts are never served.
+INSTRUCTION_VERSION = hashlib.sha256(
+    (f"{REQUEST_FORMAT}:" + ANALYST_INSTRUCTION + INSTRUCTOR_INSTRUCTION + OVERSEER_INSTRUCTION).encode()
+).hexdigest()[:12]
+
+def preload():
+    """Imports what a pipeline run needs and initializes the Vertex AI SDK, for `shared.warmup.warm_up`."""
+    import google.adk.runners
+    from google.adk.agents import Agent
+    from google.adk.artifacts import InMemoryArtifactService
+    from google.adk.planners import BuiltInPlanner
+    from shared.scheduler import init_vertexai
+    init_vertexai(os.getenv("GOOGLE_CLOUD_PROJECT"), os.getenv("GOOGLE_CLOUD_LOCATION"))
+
+@profiled
+async def inject_pid_context(callback_context: "CallbackContext", llm_request: "LlmRequest") -> Optional["LlmResponse"]:
     print("⚡ [Callback] Injecting P&ID into context...")
     
     # 1. Load the file (Pass-by-Value, but it's okay because it's User Role)
-    # Note: In a real app, you might check context.state to see if it's already loaded
+    # The request is rebuilt from the session on every model call, so it is attached every time
     filename = "pid_sample_1.pdf"
     try:
         # Load the latest version
@@ -27,6 +123,10 @@ async def inject_pid_context(callback_context: CallbackContext, llm_request: Llm
             print(f"MIME Type: {report_artifact.inline_data.mime_type}")
             pdf_bytes = report_artifact.inline_data.data
             print(f"Report size: {len(pdf_bytes)} bytes.")
+            # First in the request, so the instructions and the document form one static prefix
+            # that `shared.context_cache` can cache
+            from shared.context_cache import document_content
+            llm_request.contents.insert(0, document_content(filename, report_artifact))
         else:
             print(f"Python artifact '{filename}' not found.")
 
@@ -36,45 +136,32 @@ async def inject_pid_context(callback_context: CallbackContext, llm_request: Llm
         # Handle potential storage errors
         print(f"An unexpected error occurred during Python artifact load: {e}")
 
-def create_analyst_agent(model):
+def create_analyst_agent(model, thinking_budget: int = 16000, context_cache: bool = False):
+    from google.adk.agents import Agent
+    from google.adk.planners import BuiltInPlanner
+    from google.genai import types
+    from shared.context_cache import model_callbacks
+    from shared.scheduler import scheduled_model
 
     return Agent(
         name="analyst_agent",
-        model=model,
-        before_model_callback=inject_pid_context,        
-        instruction="""
-        You are a Senior Process Engineer acting as a P&ID Analyst.
-        
-        **Context:** A P&ID diagram (PDF) has been attached to the user's message in your context. 
-        You have immediate visual access to this document.
-        
-        **Your Goal:** Answer technical questions based *strictly* on the visual information in that attached diagram.
-        
-        **Analysis Guidelines:**
-        - **Visual Tracing:** Trace process lines carefully from source to destination to confirm flow direction.
-        - **Tag Identification:** Identify components explicitly by their tag numbers (e.g., V-101, P-20A) whenever possible.
-        - **Ambiguity:** If a symbol is distinct but you cannot read the tag (e.g., due to resolution), describe the component's visual appearance and location (e.g., "The pump in the bottom left") rather than guessing.
-        - **Standards:** Do not rely on general industry standards if they conflict with what is drawn; the specific diagram takes precedence.
-        
-        **Output Format:**
-        - **Strictly use Markdown** for all responses.
-        - Use **Bold** for specific tag numbers (e.g., **V-101**) and component names.
-        - Use `Headed Sections` (###) to separate different parts of your analysis.
-        - Use bullet points for lists of components or process steps.
-        """,
+        model=scheduled_model(model),
+        **model_callbacks(inject_pid_context, context_cache),
+        instruction=ANALYST_INSTRUCTION,
         planner=BuiltInPlanner(
             thinking_config=types.ThinkingConfig(
                 include_thoughts=True,
-                thinking_budget=16000,
+                thinking_budget=thinking_budget,
             )
         )
     )
 
-async def inject_instructor_context(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+@profiled
+async def inject_instructor_context(callback_context: "CallbackContext", llm_request: "LlmRequest") -> Optional["LlmResponse"]:
     print("⚡ [Callback] Injecting Learnign Course into context...")
     
     # 1. Load the file (Pass-by-Value, but it's okay because it's User Role)
-    # Note: In a real app, you might check context.state to see if it's already loaded
+    # The request is rebuilt from the session on every model call, so it is attached every time
     filename = "learning_course.pdf"
     try:
         # Load the latest version
@@ -85,6 +172,10 @@ async def inject_instructor_context(callback_context: CallbackContext, llm_reque
             print(f"MIME Type: {report_artifact.inline_data.mime_type}")
             pdf_bytes = report_artifact.inline_data.data
             print(f"Report size: {len(pdf_bytes)} bytes.")
+            # First in the request, so the instructions and the document form one static prefix
+            # that `shared.context_cache` can cache
+            from shared.context_cache import document_content
+            llm_request.contents.insert(0, document_content(filename, report_artifact))
         else:
             print(f"Python artifact '{filename}' not found.")
 
@@ -94,69 +185,53 @@ async def inject_instructor_context(callback_context: CallbackContext, llm_reque
         # Handle potential storage errors
         print(f"An unexpected error occurred during Python artifact load: {e}")
 
-def create_instructor_agent(model):
+def create_instructor_agent(model, thinking_budget: int = 16000, context_cache: bool = False):
     """
     Call this agent when the user wants to learn concepts, 
     understands symbols, or needs a tutorial on P&ID standards.
     """
     
+    from google.adk.agents import Agent
+    from google.adk.planners import BuiltInPlanner
+    from google.genai import types
+    from shared.context_cache import model_callbacks
+    from shared.scheduler import scheduled_model
+
     # Placeholder: Logic to invoke the Instructor Agent
     return Agent(
         name="instructor_agent",
-        model=model,
-        before_model_callback=inject_instructor_context,
-        instruction="""
-        You are a friendly and knowledgeable P&ID Instructor.
-        
-        **Context:** A Course Guide (`learning_course.pdf`) has been attached to the conversation. 
-        You have direct access to this document in your context history.
-        
-        **Your Goal:** Teach the user about Process and Instrumentation Diagrams using the content of that attached guide.
-        
-        **Teaching Guidelines:**
-        - **Source of Truth:** Base your explanations strictly on the provided guide. Do not lecture on general topics unless they are present in the material.
-        - **Referencing:** When explaining a symbol or concept, explicitly mention the page number or section title where it is found (e.g., "As shown on slide 4...").
-        - **Visual Descriptions:** Since the user might not be looking at the specific page you are, describe the visuals. (e.g., "The gate valve symbol looks like a bow-tie...").
-        
-        **Tone:**
-        - Be patient and educational.
-        - Use analogies to simplify complex chemical engineering concepts.
-        - If a question is not covered in the guide, politely admit that the current course material does not address it.
-        
-        **Output Format:**
-        - **Strictly use Markdown** for all responses.
-        - Use **Bold** for key terms and concepts.
-        - Use > Blockquotes for important definitions or rules from the guide.
-        - Use Numbered Lists for step-by-step procedures.
-        """,
+        model=scheduled_model(model),
+        **model_callbacks(inject_instructor_context, context_cache),
+        instruction=INSTRUCTOR_INSTRUCTION,
         planner=BuiltInPlanner(
             thinking_config=types.ThinkingConfig(
                 include_thoughts=True,
-                thinking_budget=16000,
+                thinking_budget=thinking_budget,
             )
         )
     )
 
-async def setup_artifact_service(app_name, user_id, session_id):
+async def setup_artifact_service(app_name, user_id, session_id, artifact_service=None):
     """
     Initializes the InMemoryArtifactService and pre-loads 
     specific PDF documents from the local assets folder.
+
+    Pass an existing `artifact_service` to load the documents for another
+    session into a shared service instead of creating a new one.
     """
+    from google.adk.artifacts import InMemoryArtifactService
+    from google.genai import types
+
     print("--- Bootstrapping Artifact Service ---")
     
     # 1. Initialize the Service
-    artifact_service = InMemoryArtifactService()
+    artifact_service = artifact_service or InMemoryArtifactService()
     
-    # 2. Define the files we want to preload
+    # 2. The files we want to preload are listed in CONTEXT_FILES
     # We map the local filename to the artifact name we want in the system
 
-    files_to_load = [
-        "learning_course.pdf", 
-        "pid_sample_1.pdf"
-    ]
-
     # 3. Iterate and Load
-    for filename in files_to_load:
+    for filename in CONTEXT_FILES:
         file_path = ASSETS_DIR / filename
         
         if not file_path.exists():
@@ -193,39 +268,52 @@ async def setup_artifact_service(app_name, user_id, session_id):
     return artifact_service
 
 
-def create_pid_agent(project_id: str, location: str):
+def create_pid_agent(project_id: str, location: str, route_to: Optional[str] = None,
+                     specialist_model="gemini-3-pro-preview", thinking_budget: int = 16000,
+                     overseer_model="gemini-3-pro-preview", context_cache: bool = False):
+    """
+    Builds the P&ID agent tree.
+
+    Args:
+        project_id: Google Cloud project.
+        location: Vertex AI location.
+        route_to: Name of a specialist picked by the local router
+            (`analyst_agent` or `instructor_agent`). When set, that specialist
+            is returned on its own and the Overseer hop is skipped.
+        specialist_model: Model name (or BaseLlm instance) for the Analyst and Instructor.
+        thinking_budget: Thinking budget for the Analyst and Instructor,
+            usually picked per question by `budget.BudgetController`.
+        overseer_model: Model name (or BaseLlm instance) for the Overseer.
+        context_cache: Cache each specialist's instructions and document
+            once and send only the conversation with every request (see
+            `shared.context_cache`). Prefixes below the model's cache
+            minimum, like the Overseer's, are sent as they are.
+    """
+    from google.adk.agents import Agent
+    from google.adk.planners import BuiltInPlanner
+    from google.genai import types
+    from shared.scheduler import init_vertexai, scheduled_model
+
     print(f"project={project_id}, location={location}")
-    vertexai.init(project=project_id, location=location)
-    
-    overseer_instructions = """
-        You are the "Overseer," a specialized orchestrator for a Chemical Engineering P&ID Assistant.
-        Your goal is to route user requests to the correct specialist sub-agent.
+    init_vertexai(project_id, location)
 
-        You have access to three specialists:
-        1. **Analyst:** Has access to specific P&ID PDF files. Use this for specific lookup questions (e.g., "What is the pressure on line 101?").
-        2. **Instructor:** Has access to the Course Guide. Use this for "How-to" or educational questions (e.g., "What does this symbol mean?" or "Teach me about control loops").
-        3. **Drafter:** Has access to the Reference Guide. Use this for visualization requests (e.g., "Draw a simple feed loop").
+    if route_to == "analyst_agent":
+        return create_analyst_agent(specialist_model, thinking_budget, context_cache)
+    if route_to == "instructor_agent":
+        return create_instructor_agent(specialist_model, thinking_budget, context_cache)
 
-        **Rules:**
-        - Do not attempt to answer technical questions yourself. Always delegate to a specialist.
-        - If the user greets you, reply politely and explain your capabilities.
-        - If a query is ambiguous, ask for clarification before routing.
-        
-        **Output Format:**
-        - Format all your direct responses in **Markdown**.
-        - Use bullet points when listing your available capabilities.
-        """
-    analyst = create_analyst_agent("gemini-3-pro-preview")
-    instructor = create_instructor_agent("gemini-3-pro-preview")
+    analyst = create_analyst_agent(specialist_model, thinking_budget, context_cache)
+    instructor = create_instructor_agent(specialist_model, thinking_budget, context_cache)
 
     return Agent(
-        model="gemini-3-pro-preview",
+        model=scheduled_model(overseer_model),
         name="overseer_agent",
-        instruction=overseer_instructions,
+        instruction=OVERSEER_INSTRUCTION,
         sub_agents=[analyst, instructor],
         planner=BuiltInPlanner(
             thinking_config=types.ThinkingConfig(
-                include_thoughts=True
+                include_thoughts=True,
+                thinking_budget=OVERSEER_THINKING_BUDGET,
             )
         )
     )
\ No newline at end of file
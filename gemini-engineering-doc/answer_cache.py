@@ -0,0 +1,203 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+PUNCTUATION_PATTERN = re.compile(r"[^\w&\-\. ]")
+# Tokens that change what a question asks about: tags, numbers and file names all contain a digit or a dot
+ANCHOR_PATTERN = re.compile(r"[\w\-]*\d[\w\-\.]*|\w+\.\w+")
+NEGATION_PATTERN = re.compile(r"\b(?:no|not|never|none|nor|without|cannot)\b|n't\b")
+
+
+@dataclass
+class CachedAnswer:
+    """A final answer produced by one of the specialists."""
+    question: str
+    answer: str
+    author: str
+    created_at: float
+    similarity: float = 1.0
+    grams: frozenset = field(default_factory=frozenset, repr=False)
+    anchors: frozenset = field(default_factory=frozenset, repr=False)
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cases a question and strips punctuation and repeated whitespace."""
+    question = PUNCTUATION_PATTERN.sub(" ", question.lower())
+    return WHITESPACE_PATTERN.sub(" ", question).strip(" .")
+
+
+def question_anchors(question: str) -> frozenset:
+    """
+    The tags, numbers, file names and negations of a question. Two questions
+    that differ in any of them ask different things however similar the rest
+    is ("line 101" vs "line 102"), so near matches must agree on all of them.
+    """
+    lowered = question.lower()
+    anchors = {token.strip(".-") for token in ANCHOR_PATTERN.findall(lowered)}
+    if NEGATION_PATTERN.search(lowered):
+        anchors.add("<not>")
+    return frozenset(anchors)
+
+
+def conversation_key(previous_questions: Iterable[str]) -> str:
+    """Identifies the turns before a question; empty for the first question of a conversation."""
+    normalized = [normalize_question(question) for question in previous_questions]
+    return hashlib.sha256("\n".join(normalized).encode()).hexdigest()[:16] if normalized else ""
+
+
+def char_ngrams(text: str, n: int = 3) -> frozenset:
+    padded = f" {text} "
+    return frozenset(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+
+
+_digests: dict[tuple, str] = {}
+
+
+def file_digest(path: Path) -> str:
+    """
+    SHA-256 of a file's content, memoised on (path, size, mtime) so unchanged
+    PDFs are not re-read on every Streamlit rerun.
+    """
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        _digests[key] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return _digests[key]
+
+
+def document_fingerprint(paths: Iterable[Path]) -> str:
+    """Hashes the content of the context documents into one short fingerprint."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        if not path.exists():
+            digest.update(f"{path.name}:missing".encode())
+            continue
+        digest.update(f"{path.name}:{file_digest(path)}".encode())
+    return digest.hexdigest()[:16]
+
+
+class AnswerCache:
+    """
+    An in-process LRU/TTL cache of final answers.
+
+    Entries are partitioned by (document fingerprint, instruction version) so a
+    changed PDF or prompt never serves an old answer, and by the conversation
+    before the question (see `conversation_key`) and the model variant that
+    answered, so a follow-up or a cheaper tier's answer is only reused in the
+    same situation. Inside a partition, questions match exactly on their
+    normalised text or, failing that, on character-trigram Jaccard similarity
+    above `similarity_threshold` between questions with the same
+    `question_anchors`.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_s: float = 24 * 3600, similarity_threshold: float = 0.7):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[tuple, CachedAnswer] = OrderedDict()
+        self._index: dict[tuple, dict[str, set]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def lookup(self, question: str, doc_fingerprint: str, instruction_version: str,
+               conversation: str = "", variant: str = "") -> Optional[CachedAnswer]:
+        partition = (doc_fingerprint, instruction_version, conversation, variant)
+        normalized = normalize_question(question)
+        with self._lock:
+            self._expire()
+            key = (partition, normalized)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+
+            best_key, best_score = self._nearest(partition, char_ngrams(normalized), question_anchors(question))
+            if best_key is not None and best_score >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self.stats["near_hits"] += 1
+                entry = self._entries[best_key]
+                return CachedAnswer(entry.question, entry.answer, entry.author, entry.created_at, best_score,
+                                    entry.grams, entry.anchors)
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, question: str, doc_fingerprint: str, instruction_version: str, answer: str, author: str,
+              conversation: str = "", variant: str = ""):
+        partition = (doc_fingerprint, instruction_version, conversation, variant)
+        normalized = normalize_question(question)
+        key = (partition, normalized)
+        grams = char_ngrams(normalized)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedAnswer(question, answer, author, time.time(), grams=grams,
+                                              anchors=question_anchors(question))
+            postings = self._index.setdefault(partition, {})
+            for gram in grams:
+                postings.setdefault(gram, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate(self, doc_fingerprint: str, instruction_version: str) -> int:
+        """Drops every entry that was answered against other documents or prompts."""
+        current = (doc_fingerprint, instruction_version)
+        with self._lock:
+            stale = [key for key in self._entries if key[0][:2] != current]
+            for key in stale:
+                self._remove(key)
+            self.stats["invalidations"] += len(stale)
+            return len(stale)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["near_hits"] + self.stats["misses"]
+        return (self.stats["hits"] + self.stats["near_hits"]) / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _nearest(self, partition, grams: frozenset, anchors: frozenset):
+        postings = self._index.get(partition, {})
+        overlaps: dict[tuple, int] = {}
+        for gram in grams:
+            for key in postings.get(gram, ()):
+                overlaps[key] = overlaps.get(key, 0) + 1
+
+        best_key, best_score = None, 0.0
+        for key, overlap in overlaps.items():
+            if self._entries[key].anchors != anchors:
+                continue
+            other = self._entries[key].grams
+            score = overlap / (len(grams) + len(other) - overlap)
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_s
+        # Entries are in LRU order, not insertion order, so scan them all.
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        postings = self._index.get(key[0], {})
+        for gram in entry.grams:
+            keys = postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del postings[gram]
+        if not postings:
+            self._index.pop(key[0], None)
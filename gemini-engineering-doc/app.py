@@ -1,11 +1,18 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from agents import create_pid_agent, setup_artifact_service
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
+from agents import ASSETS_DIR, CONTEXT_FILES, INSTRUCTION_VERSION, create_pid_agent, preload, setup_artifact_service
+from answer_cache import AnswerCache, conversation_key, document_fingerprint
+from budget import BudgetController
+from doc_viewer import cited_page, document_viewer, list_documents, open_at_page, prerender_thumbnails
+from router import build_router, log_routing
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.profiling import get_profiler, hot_spots, profiling_enabled, profiling_plugins
+from shared.warmup import warm_up
 import asyncio
+import time
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +23,10 @@ st.set_page_config(page_title="Gemini 3 Pro P&ID Multi-Agent", layout="wide")
 # Title
 st.title("Gemini 3 Pro P&ID Multi-Agent")
 
+def start_new_conversation():
+    st.session_state.pop("adk_session_id", None)
+    st.session_state.pop("conversation_questions", None)
+
 # Sidebar
 with st.sidebar:
     st.header("Configuration")
@@ -27,23 +38,85 @@ with st.sidebar:
     if location:
         os.environ["LOCATION"] = location
 
+    st.header("Routing")
+    use_fast_path = st.toggle("Local fast-path routing", value=True,
+                              help="Send clear-cut questions straight to a specialist and only ask the Overseer when unsure.")
+    routing_threshold = st.slider("Router confidence threshold", 0.0, 1.0, 0.2, 0.05)
+
+    st.header("Thinking Budget")
+    use_adaptive_budget = st.toggle("Adaptive thinking budget", value=True,
+                                    help="Pick the specialist model and thinking budget per question instead of a fixed 16k.")
+
+    st.header("Answer Cache")
+    use_answer_cache = st.toggle("Serve repeated questions from cache", value=True)
+    cache_metrics = st.empty()
+    use_context_cache = st.toggle("Cache instructions and documents", value=False,
+                                  help="Send each specialist's instructions and PDF once as a Vertex AI context cache "
+                                       "and reference it on later turns.")
+    context_cache_metrics = st.empty()
+
+    st.header("Profiling")
+    # Set for the whole process with AGENT_PROFILE=1: a per-session toggle would turn it off for everyone else
+    if profiling_enabled():
+        st.caption("Tools and callbacks are profiled (AGENT_PROFILE=1). This run's hot spots appear here, "
+                   "and every run is merged into .profiles/.")
+    else:
+        st.caption("Off. Start the app with AGENT_PROFILE=1 to profile tools and callbacks.")
+    profile_report = st.empty()
+    profiled_run = None
+
+    st.header("Conversation")
+    st.button("Start a new conversation", on_click=start_new_conversation,
+              help="Follow-up questions share one session until you start over.")
+
+# Which specialist reads which document
+DOCUMENT_ROLES = {"pid_sample_1.pdf": "Analyst Context", "learning_course.pdf": "Instructor Context"}
+AGENT_DOCUMENTS = {"analyst_agent": "pid_sample_1.pdf", "instructor_agent": "learning_course.pdf"}
+
+def show_cited_page(author, answer):
+    """Offers to open the specialist's document at the page its answer cites."""
+    page = cited_page(answer)
+    if page and author in AGENT_DOCUMENTS:
+        filename = AGENT_DOCUMENTS[author]
+        st.button(f"📖 Open {filename} at page {page}", on_click=open_at_page, args=(filename, page))
+
+@st.cache_resource(ttl=3600)
+def get_router(threshold):
+    return build_router(threshold=threshold)
+
+@st.cache_resource
+def get_budget_controller():
+    # Caps come from PID_P95_LATENCY_CAP_S / PID_MAX_THINKING_BUDGET
+    return BudgetController()
+
+def record_answer_feedback():
+    last_answer = st.session_state.get("last_answer")
+    feedback = st.session_state.get("answer_feedback")
+    if last_answer and feedback is not None:
+        get_budget_controller().record(last_answer["question"], last_answer["tier"], None, quality=float(feedback))
+
+@st.cache_resource
+def get_session_service():
+    from shared.sessions import SqliteSessionService
+    # Sessions persist in .sessions/; older turns are compacted into a summary
+    return SqliteSessionService()
+
+@st.cache_resource
+def get_answer_cache():
+    # Shared by every browser session served by this process
+    return AnswerCache()
+
 hcol1, hcol2, hcol3 = st.columns([1, 2, 1])
 with hcol2: 
     st.markdown("<h2 style='text-align: center;'>Multi-Agent Architecture</h2>", unsafe_allow_html=True)
     st.image("assets/architecture.png", width='stretch')
 
-with st.expander("Analyst Context: pid_sample_1.pdf", expanded=False):
-        try:
-            with open("assets/pid_sample_1.pdf", "rb") as file:
-                st.pdf(file.read(), height=600)
-        except FileNotFoundError:
-            st.error("Please ensure 'pid_sample_1.pdf' is in the app's asset directory.")
-with st.expander("Instructor Context: learning_course.pdf", expanded=False):
-    try:
-        with open("assets/learning_course.pdf", "rb") as file:
-            st.pdf(file.read(), height=600)
-    except FileNotFoundError:
-        st.error("Please ensure 'learning_course.pdf' is in the app's asset directory.")      
+# --- Document Viewers ---
+# Nothing is read until a viewer is opened; thumbnails are queued once the page is on screen
+st.subheader("Context Documents")
+documents = list_documents(ASSETS_DIR)
+for document in documents:
+    document_viewer(document, label=f"{DOCUMENT_ROLES.get(document.name, 'Reference')}: {document.name}")
 
 questions = [
     "What does the P&ID document pid_sample_1.pdf depict?",
@@ -69,75 +142,203 @@ if submit_button:
         st.subheader("Final Response")
         final_response_placeholder = st.empty() # Single placeholder for the final answer
         final_response_placeholder.info("Agents are working...")
+        latency_caption = st.empty()
+
+        # Size the specialists' thinking to the question; PID_MAX_THINKING_BUDGET caps it either way
+        budget_controller = get_budget_controller()
+        tier = budget_controller.choose(selected_question) if use_adaptive_budget else budget_controller.highest_tier
+
+        # Answers depend on the turns before them in this session and on the model that wrote them
+        answer_cache = get_answer_cache()
+        doc_fingerprint = document_fingerprint(ASSETS_DIR / filename for filename in CONTEXT_FILES)
+        answer_cache.invalidate(doc_fingerprint, INSTRUCTION_VERSION)
+        cache_key = {
+            "conversation": conversation_key(st.session_state.get("conversation_questions", [])),
+            "variant": f"{tier.model}:{tier.thinking_budget}",
+        }
+        cached = answer_cache.lookup(selected_question, doc_fingerprint, INSTRUCTION_VERSION, **cache_key) if use_answer_cache else None
 
-        try:
-            # Create the RCA pipeline
-            overseer_agent = create_pid_agent(project_id=project_id, location=location)
+        if cached:
+            with thoughts_expander:
+                st.write(f"⚡ **Cache:** Served a previous `{cached.author}` answer (similarity {cached.similarity:.2f})")
+                if cached.question != selected_question:
+                    st.caption(f"Matched question: {cached.question}")
+            final_response_placeholder.markdown(f"**{cached.author}:**\n\n{cached.answer}")
+            latency_caption.caption("⏱️ Served from the answer cache")
+            show_cited_page(cached.author, cached.answer)
+
+        else:
+            try:
+                # Usually already imported by the warm-up
+                from google.adk.agents.run_config import RunConfig, StreamingMode
+                from google.adk.runners import Runner
+                from google.genai import types
+
+                # Decide locally whether the Overseer hop can be skipped
+                router = get_router(routing_threshold)
+                decision = router.predict(selected_question)
+                route_to = decision.agent_name if use_fast_path else None
+                started_at = time.perf_counter()
+                answered_by = None
+                final_text = ""
+
+                # Create the P&ID agent tree (or just the routed specialist)
+                overseer_agent = create_pid_agent(
+                    project_id=project_id,
+                    location=location,
+                    route_to=route_to,
+                    specialist_model=tier.model,
+                    thinking_budget=tier.thinking_budget,
+                    context_cache=use_context_cache
+                )
             
-            # Set up ADK session and runner
-            session_service = InMemorySessionService()
+                # Set up ADK session and runner
+                session_service = get_session_service()
             
-            async def create_session_async():
-                return await session_service.create_session(
-                    app_name="agents", 
-                    user_id="user1"
-                )
+                async def create_session_async():
+                    # Continue this browser tab's conversation while it is still stored
+                    session_id = st.session_state.get("adk_session_id")
+                    if session_id:
+                        session = await session_service.get_session(app_name="agents", user_id="user1", session_id=session_id)
+                        if session:
+                            return session
+                    return await session_service.create_session(
+                        app_name="agents", 
+                        user_id="user1"
+                    )
             
-            session = asyncio.run(create_session_async())
+                session = asyncio.run(create_session_async())
+                if st.session_state.get("adk_session_id") != session.id:
+                    # A new session, or the old one expired: this is the conversation's first turn
+                    st.session_state["conversation_questions"] = []
+                    cache_key["conversation"] = conversation_key([])
+                st.session_state["adk_session_id"] = session.id
 
-            artifact_service = asyncio.run(setup_artifact_service(
-                app_name="agents", 
-                user_id="user1", 
-                session_id=session.id
-            ))
+                artifact_service = asyncio.run(setup_artifact_service(
+                    app_name="agents", 
+                    user_id="user1", 
+                    session_id=session.id
+                ))
             
-            if not artifact_service:
-                thoughts_expander.error("CRITICAL: Failed to load artifacts!")
-
-            runner = Runner(
-                agent=overseer_agent,
-                app_name="agents",
-                artifact_service=artifact_service,
-                session_service=session_service
-            )
+                if not artifact_service:
+                    thoughts_expander.error("CRITICAL: Failed to load artifacts!")
+
+                runner = Runner(
+                    agent=overseer_agent,
+                    app_name="agents",
+                    artifact_service=artifact_service,
+                    session_service=session_service,
+                    plugins=profiling_plugins(),
+                )
             
-            user_message_parts = [types.Part(text=selected_question)]
-            user_content = types.Content(role='user', parts=user_message_parts)
+                user_message_parts = [types.Part(text=selected_question)]
+                user_content = types.Content(role='user', parts=user_message_parts)
 
-            # --- Event Loop ---
-            # We open the expander context to stream logs into it
-            with thoughts_expander:
-                st.caption("Stream initiated...")
+                # --- Event Loop ---
+                # We open the expander context to stream logs into it
+                with thoughts_expander:
+                    st.caption("Stream initiated...")
+                    if route_to:
+                        st.write(f"🚀 **Router:** Sent directly to `{route_to}` (confidence {decision.confidence:.2f})")
+                    elif use_fast_path:
+                        st.write(f"🧭 **Router:** Low confidence ({decision.confidence:.2f}), asking the Overseer")
+                    st.write(f"🎚️ **Budget:** `{tier.name}` tier, `{tier.model}` with {tier.thinking_budget:,} thinking tokens")
                 
-                events = runner.run(
-                    user_id="user1", 
-                    session_id=session.id, 
-                    new_message=user_content
-                )
+                    # SSE streaming yields partial events carrying text deltas,
+                    # followed by one aggregated event per model turn
+                    run_started_at = time.perf_counter()
+                    first_token_s = None
+                    thought_text, thought_placeholder = "", None
+                    answer_text = ""
+
+                    events = runner.run(
+                        user_id="user1", 
+                        session_id=session.id, 
+                        new_message=user_content,
+                        run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+                    )
                 
-                for event in events:
-                    if hasattr(event, 'content') and event.content and event.content.parts:
-                        for part in event.content.parts:
+                    for event in events:
+                        profiled_run = event.invocation_id
+                        if hasattr(event, 'content') and event.content and event.content.parts:
+                            for part in event.content.parts:
+                                if first_token_s is None and getattr(part, 'text', None):
+                                    first_token_s = time.perf_counter() - run_started_at
+                                    latency_caption.caption(f"⏱️ First token after {first_token_s:.2f}s")
                             
-                            # -- CAPTURE THOUGHTS (Inside Expander) --
-                            if hasattr(part, 'thought') and part.thought:
-                                st.markdown(f"**🧠 {event.author} Thought:**")
-                                st.info(part.text) 
-
-                            # -- CAPTURE FUNCTION CALLS (Inside Expander) --
-                            elif hasattr(part, 'function_call') and part.function_call:
-                                st.markdown(f"**⚡ {event.author} Action:**")
-                                st.code(f"Calling Tool: {part.function_call.name}\nArgs: {part.function_call.args}", language="json")
-
-                            # -- CAPTURE FINAL TEXT (Outside Expander) --
-                            elif hasattr(part, 'text') and part.text:
-                                final_response_placeholder.markdown(f"**{event.author}:**\n\n{part.text}")
-
-                    # -- CAPTURE SYSTEM ACTIONS (Inside Expander) --
-                    if hasattr(event, 'actions') and event.actions:
-                        if event.actions.transfer_to_agent:
-                            st.write(f"🔄 **System:** Transferring execution to `{event.actions.transfer_to_agent}`")
-
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
-            st.exception(e)
\ No newline at end of file
+                                # -- CAPTURE THOUGHTS (Inside Expander) --
+                                if hasattr(part, 'thought') and part.thought:
+                                    if thought_placeholder is None:
+                                        st.markdown(f"**🧠 {event.author} Thought:**")
+                                        thought_placeholder = st.empty()
+                                    # The aggregated event repeats the whole thought, so replace rather than append
+                                    thought_text = part.text if not event.partial else thought_text + part.text
+                                    thought_placeholder.info(thought_text)
+                                    if not event.partial:
+                                        thought_text, thought_placeholder = "", None
+
+                                # -- CAPTURE FUNCTION CALLS (Inside Expander) --
+                                elif hasattr(part, 'function_call') and part.function_call:
+                                    st.markdown(f"**⚡ {event.author} Action:**")
+                                    st.code(f"Calling Tool: {part.function_call.name}\nArgs: {part.function_call.args}", language="json")
+
+                                # -- CAPTURE FINAL TEXT (Outside Expander) --
+                                elif hasattr(part, 'text') and part.text:
+                                    answer_text = part.text if not event.partial else answer_text + part.text
+                                    final_response_placeholder.markdown(f"**{event.author}:**\n\n{answer_text}")
+                                    if not event.partial:
+                                        answered_by = event.author
+                                        final_text = answer_text
+                                        answer_text = ""
+
+                        # -- CAPTURE SYSTEM ACTIONS (Inside Expander) --
+                        if hasattr(event, 'actions') and event.actions:
+                            if event.actions.transfer_to_agent:
+                                st.write(f"🔄 **System:** Transferring execution to `{event.actions.transfer_to_agent}`")
+
+                show_cited_page(answered_by, final_text)
+
+                elapsed = time.perf_counter() - started_at
+                first_token_label = f"{first_token_s:.2f}s" if first_token_s is not None else "n/a"
+                latency_caption.caption(f"⏱️ First token after {first_token_label} · Complete after {elapsed:.2f}s")
+                if use_fast_path:
+                    log_routing(selected_question, decision, answered_by, elapsed)
+                if use_adaptive_budget:
+                    budget_controller.record(selected_question, tier, elapsed)
+                    st.session_state["last_answer"] = {"question": selected_question, "tier": tier}
+                    st.feedback("thumbs", key="answer_feedback", on_change=record_answer_feedback)
+
+                # Only specialist answers are reusable; Overseer greetings and clarifications are not
+                if answered_by in ("analyst_agent", "instructor_agent") and final_text:
+                    answer_cache.store(selected_question, doc_fingerprint, INSTRUCTION_VERSION, final_text, answered_by,
+                                       **cache_key)
+                # Cached answers never reach the session, so only questions the agents ran count as history
+                st.session_state.setdefault("conversation_questions", []).append(selected_question)
+
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+                st.exception(e)
+
+answer_cache = get_answer_cache()
+cache_metrics.caption(
+    f"Hit rate: {answer_cache.hit_rate:.0%} · Hits: {answer_cache.stats['hits']} · "
+    f"Near hits: {answer_cache.stats['near_hits']} · Misses: {answer_cache.stats['misses']} · Entries: {len(answer_cache)}"
+)
+if use_context_cache:
+    from shared.context_cache import get_context_cache
+    context_metrics = get_context_cache().metrics()
+    context_cache_metrics.caption(
+        f"Cached tokens: {context_metrics['cached_token_ratio']:.0%} · Caches: {context_metrics['caches']} · "
+        f"Latency saved: {context_metrics['latency_saved_s'] or 0:.1f}s"
+    )
+
+# This run's hot spots, without other sessions' calls; the files in .profiles/ accumulate every run's
+if profiling_enabled() and profiled_run is not None:
+    rows = get_profiler().report(top=5, run=profiled_run)
+    profile_dir = get_profiler().save()
+    profile_report.caption("  \n".join(hot_spots(rows) + [f"Flamegraph: {profile_dir / 'profile.speedscope.json'}"]))
+
+# The page is on screen; load ADK and the Vertex AI SDK before the first question needs them,
+# and rasterize thumbnails before a viewer needs them
+warm_up(preload)
+prerender_thumbnails(documents)
@@ -0,0 +1,105 @@
+import argparse
+import random
+import statistics
+
+from budget import TIERS, BudgetController, estimate_complexity
+
+# Base latency (seconds) and thinking throughput (tokens/second) per model.
+STAND_IN_MODELS = {
+    "gemini-2.5-flash": {"base_s": 1.2, "thinking_tps": 900},
+    "gemini-3-pro-preview": {"base_s": 3.0, "thinking_tps": 400},
+}
+# Rough model capability: how many "reasoning units" one thinking token buys.
+MODEL_SKILL = {"gemini-2.5-flash": 0.7, "gemini-3-pro-preview": 1.0}
+
+QUESTIONS = [
+    "What does the P&ID document pid_sample_1.pdf depict?",
+    "What are the key components when drafting a P&ID document?",
+    "What are the key components of our pid_sample_1.pdf P&ID document?",
+    "Who would need to sign off on a P&ID Document?",
+    "What is an instrument bubble?",
+    "Define a control loop.",
+    "List the vessels on the drawing.",
+    "Which pump feeds vessel V-101?",
+    "Trace the flow from P-101 through E-201 to V-301.",
+    "Compare the relief system on V-101 with the one on V-102 and explain why they differ.",
+    "Walk me through the control loop around FV-12 and what happens if it fails closed?",
+    "Trace every line leaving the separator and list all the instruments on each.",
+]
+
+
+class StandInModel:
+    """
+    Simulates a specialist call: thinking tokens spent grow with question
+    complexity up to the budget, and answer quality drops when the budget is
+    smaller than what the question needs.
+    """
+
+    def __init__(self, seed: int = 7):
+        self.rng = random.Random(seed)
+
+    def answer(self, question: str, model: str, thinking_budget: int):
+        profile = STAND_IN_MODELS[model]
+        needed = int(500 + 15000 * estimate_complexity(question) ** 2 / MODEL_SKILL[model])
+        used = min(needed, thinking_budget)
+        # Models tend to spend part of a generous budget even on easy questions.
+        used = max(used, int(0.25 * thinking_budget))
+        latency = profile["base_s"] + used / profile["thinking_tps"]
+        latency *= self.rng.uniform(0.85, 1.25)
+        quality = min(1.0, thinking_budget / needed)
+        return latency, used, quality
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[min(int(round(0.95 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def replay(strategy, rounds: int, controller: BudgetController = None, seed: int = 7):
+    model = StandInModel(seed)
+    latencies, tokens, qualities = [], [], []
+    for _ in range(rounds):
+        for question in QUESTIONS:
+            tier = strategy(question)
+            latency, used, quality = model.answer(question, tier.model, tier.thinking_budget)
+            if controller is not None:
+                controller.record(question, tier, latency, quality)
+            latencies.append(latency)
+            tokens.append(used)
+            qualities.append(quality)
+    return {
+        "mean_latency_s": statistics.mean(latencies),
+        "p95_latency_s": _p95(latencies),
+        "thinking_tokens_per_question": statistics.mean(tokens),
+        "mean_quality": statistics.mean(qualities),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a question set against a stand-in model to compare thinking budget strategies.")
+    parser.add_argument("--rounds", type=int, default=20, help="How many times to replay the question set.")
+    parser.add_argument("--p95-cap", type=float, default=None, help="p95 latency cap in seconds for the adaptive controller.")
+    parser.add_argument("--max-budget", type=int, default=None, help="Thinking budget ceiling for the adaptive controller.")
+    args = parser.parse_args()
+
+    deep = TIERS[-1]
+    controller = BudgetController(p95_latency_cap_s=args.p95_cap, max_thinking_budget=args.max_budget, log_path=None)
+
+    results = {
+        "fixed 16k (current)": replay(lambda question: deep, args.rounds),
+        "adaptive": replay(controller.choose, args.rounds, controller=controller),
+    }
+
+    print(f"Replayed {len(QUESTIONS)} questions x {args.rounds} rounds against the stand-in model\n")
+    print(f"{'strategy':<22}{'mean s':>9}{'p95 s':>9}{'think tok':>11}{'quality':>9}")
+    for name, report in results.items():
+        print(f"{name:<22}{report['mean_latency_s']:>9.2f}{report['p95_latency_s']:>9.2f}"
+              f"{report['thinking_tokens_per_question']:>11.0f}{report['mean_quality']:>9.2f}")
+
+    print("\nTier chosen per question after learning:")
+    for question in QUESTIONS:
+        print(f"   {controller.choose(question).name:<9} {question}")
+
+
+if __name__ == "__main__":
+    main()
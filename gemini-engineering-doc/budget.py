@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Optional
+
+BUDGET_LOG = Path("./logs/budget_log.jsonl")
+
+
+@dataclass(frozen=True)
+class BudgetTier:
+    """A model and thinking budget the specialists can be built with."""
+    name: str
+    model: str
+    thinking_budget: int
+
+
+# Ordered from cheapest to most thorough.
+TIERS = [
+    BudgetTier("light", "gemini-2.5-flash", 1024),
+    BudgetTier("standard", "gemini-3-pro-preview", 4096),
+    BudgetTier("deep", "gemini-3-pro-preview", 16000),
+]
+
+# Wording that signals multi-step reasoning over the documents.
+DEEP_CUES = ["trace", "why", "compare", "difference", "sequence", "step by step", "every", "all the",
+             "interlock", "control loop", "failure", "what happens if", "walk me through"]
+LIGHT_CUES = ["what does", "who", "what is", "define", "depict", "list"]
+TAG_PATTERN = re.compile(r"\b[A-Za-z]{1,3}-\d+[A-Za-z]?\b")
+
+
+def estimate_complexity(question: str) -> float:
+    """
+    Scores how much reasoning a question is likely to need, from 0 (a direct
+    lookup or definition) to 1 (multi-hop tracing across the diagram).
+    """
+    lowered = question.lower()
+    words = len(lowered.split())
+
+    score = min(words / 40, 0.35)
+    score += 0.2 * sum(1 for cue in DEEP_CUES if cue in lowered)
+    score -= 0.1 * sum(1 for cue in LIGHT_CUES if lowered.startswith(cue))
+    score += 0.1 * min(len(TAG_PATTERN.findall(question)), 3)
+    score += 0.1 * max(lowered.count("?") + lowered.count(" and ") - 1, 0)
+    return max(0.0, min(score, 1.0))
+
+
+def _p95(values: list[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(round(0.95 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class BudgetController:
+    """
+    Picks a specialist model and thinking budget per question.
+
+    The starting tier comes from `estimate_complexity`. Logged outcomes then
+    move it: a tier whose observed p95 latency breaks the deployment cap is
+    stepped down, and questions of a given complexity whose answers are rated
+    poorly at a tier are stepped up, as long as the higher tier still fits
+    under the cap.
+
+    Caps are read from the environment so each deployment can set its own:
+        PID_P95_LATENCY_CAP_S: p95 end-to-end latency target in seconds.
+        PID_MAX_THINKING_BUDGET: hard ceiling on the thinking budget.
+    """
+
+    def __init__(self, p95_latency_cap_s: Optional[float] = None, max_thinking_budget: Optional[int] = None,
+                 quality_floor: float = 0.6, min_samples: int = 5, window: int = 200,
+                 log_path: Optional[Path] = BUDGET_LOG):
+        if p95_latency_cap_s is None and os.getenv("PID_P95_LATENCY_CAP_S"):
+            p95_latency_cap_s = float(os.getenv("PID_P95_LATENCY_CAP_S"))
+        if max_thinking_budget is None and os.getenv("PID_MAX_THINKING_BUDGET"):
+            max_thinking_budget = int(os.getenv("PID_MAX_THINKING_BUDGET"))
+
+        self.p95_latency_cap_s = p95_latency_cap_s
+        self.tiers = [tier for tier in TIERS if max_thinking_budget is None or tier.thinking_budget <= max_thinking_budget]
+        if not self.tiers:
+            # A cap below the lightest tier still holds: that tier thinks no more than the cap allows
+            self.tiers = [replace(TIERS[0], thinking_budget=max_thinking_budget)]
+        self.quality_floor = quality_floor
+        self.min_samples = min_samples
+        self.window = window
+        self.log_path = log_path
+        # Latency is a property of the tier; quality depends on how hard the question was too
+        self.latencies: dict[str, list[float]] = {tier.name: [] for tier in TIERS}
+        self.qualities: dict[tuple[int, str], list[float]] = {}
+        self._load()
+
+    def complexity_bucket(self, question: str) -> int:
+        """The tier index a question starts from before any adaptation."""
+        return min(int(estimate_complexity(question) * len(self.tiers)), len(self.tiers) - 1)
+
+    @property
+    def highest_tier(self) -> BudgetTier:
+        """The most thorough tier the thinking-budget cap allows, for when budgets are not adapted."""
+        return self.tiers[-1]
+
+    def choose(self, question: str) -> BudgetTier:
+        bucket = self.complexity_bucket(question)
+        index = bucket
+
+        # Step up while answers for this kind of question are rated poorly and the next tier fits the cap
+        while index + 1 < len(self.tiers) and self._underperforms(bucket, self.tiers[index]) and self._fits_cap(self.tiers[index + 1]):
+            index += 1
+        # Step down while this tier breaks the latency cap
+        while index > 0 and not self._fits_cap(self.tiers[index]):
+            index -= 1
+        return self.tiers[index]
+
+    def record(self, question: str, tier: BudgetTier, latency_s: Optional[float], quality: Optional[float] = None):
+        """
+        Stores the outcome of one request so later choices can adapt.
+
+        Latency and quality may arrive separately (e.g. user feedback given
+        after the answer rendered); pass None for whichever is unknown.
+        """
+        bucket = self.complexity_bucket(question)
+        self._observe(bucket, tier.name, latency_s, quality)
+        if self.log_path is None:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        record = {
+            "timestamp": time.time(),
+            "question": question,
+            "tier": tier.name,
+            "bucket": bucket,
+            "latency_s": round(latency_s, 3) if latency_s is not None else None,
+            "quality": quality,
+        }
+        with self.log_path.open("a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def p95_latency(self, tier: BudgetTier) -> Optional[float]:
+        samples = self.latencies[tier.name]
+        return _p95(samples) if len(samples) >= self.min_samples else None
+
+    def _fits_cap(self, tier: BudgetTier) -> bool:
+        if self.p95_latency_cap_s is None:
+            return True
+        p95 = self.p95_latency(tier)
+        return p95 is None or p95 <= self.p95_latency_cap_s
+
+    def _underperforms(self, bucket: int, tier: BudgetTier) -> bool:
+        samples = self.qualities.get((bucket, tier.name), [])
+        return len(samples) >= self.min_samples and sum(samples) / len(samples) < self.quality_floor
+
+    def _observe(self, bucket: Optional[int], tier_name: str, latency_s: Optional[float], quality: Optional[float]):
+        if tier_name not in self.latencies:
+            return
+        if latency_s is not None:
+            self.latencies[tier_name] = (self.latencies[tier_name] + [latency_s])[-self.window:]
+        if quality is not None and bucket is not None:
+            key = (bucket, tier_name)
+            self.qualities[key] = (self.qualities.get(key, []) + [quality])[-self.window:]
+
+    def _load(self):
+        if self.log_path is None or not self.log_path.exists():
+            return
+        with self.log_path.open() as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._observe(record.get("bucket"), record.get("tier"), record.get("latency_s"), record.get("quality"))
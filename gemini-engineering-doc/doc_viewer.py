@@ -0,0 +1,175 @@
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+import streamlit as st
+
+from answer_cache import file_digest
+
+RENDER_CACHE = Path("./.cache/pages")
+THUMBNAIL_ZOOM = 0.3
+PAGE_ZOOM = 1.5
+THUMBNAILS_PER_ROW = 6
+
+# Matches "page 12", "pages 4-5", "p. 7", "slide 4" and "slides 9 and 10"
+CITATION_PATTERN = re.compile(r"\b(?:pages?|p\.|slides?)\s*(\d{1,4})", re.IGNORECASE)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_workers = max((os.cpu_count() or 2) - 1, 1)
+# Documents whose thumbnails are queued, by (path, size, mtime)
+_scheduled: set[tuple] = set()
+_scheduled_lock = threading.Lock()
+
+
+def _render_pages(pdf_path: str, page_indices: list[int], out_dir: str, zoom: float, prefix: str):
+    """Rasterizes a batch of pages in a worker process, opening the PDF only once."""
+    import pymupdf
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with pymupdf.open(pdf_path) as doc:
+        for index in page_indices:
+            target = out / f"{prefix}_{index + 1:04d}.png"
+            if target.exists():
+                continue
+            # Write then rename so readers never see a half-written image. The temp name is unique:
+            # sessions in the same process may render the same page at the same time
+            png = doc[index].get_pixmap(matrix=pymupdf.Matrix(zoom, zoom)).tobytes("png")
+            with tempfile.NamedTemporaryFile(dir=out, prefix=f"{target.stem}.", suffix=".tmp", delete=False) as tmp:
+                tmp.write(png)
+            os.replace(tmp.name, target)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=_workers)
+    return _pool
+
+
+def _cache_dir(path: Path) -> Path:
+    # Keyed by content, so an edited PDF never shows stale pages
+    return RENDER_CACHE / file_digest(path)
+
+
+def list_documents(assets_dir: Path) -> list[Path]:
+    """Every PDF in the assets folder, in a stable order."""
+    return sorted(assets_dir.glob("*.pdf"))
+
+
+@lru_cache(maxsize=64)
+def _page_count(path: str, digest: str) -> int:
+    import pymupdf
+
+    with pymupdf.open(path) as doc:
+        return doc.page_count
+
+
+def page_count(path: Path) -> int:
+    return _page_count(str(path), file_digest(path))
+
+
+def render_images(path: Path, page_indices: Iterable[int], zoom: float = THUMBNAIL_ZOOM, prefix: str = "thumb") -> list[Path]:
+    """
+    Returns cached PNGs for the given pages, rasterizing any missing ones.
+    Larger batches are split across the process pool.
+    """
+    page_indices = list(page_indices)
+    out_dir = _cache_dir(path)
+    targets = [out_dir / f"{prefix}_{index + 1:04d}.png" for index in page_indices]
+    missing = [index for index, target in zip(page_indices, targets) if not target.exists()]
+
+    if len(missing) <= 2:
+        if missing:
+            _render_pages(str(path), missing, str(out_dir), zoom, prefix)
+    else:
+        pool = _get_pool()
+        chunks = [missing[i::_workers] for i in range(_workers) if missing[i::_workers]]
+        wait([pool.submit(_render_pages, str(path), chunk, str(out_dir), zoom, prefix) for chunk in chunks])
+    return targets
+
+
+def _queue_thumbnails(paths: list[Path]):
+    pool = _get_pool()
+    for path in paths:
+        try:
+            pool.submit(_render_pages, str(path), list(range(page_count(path))), str(_cache_dir(path)), THUMBNAIL_ZOOM, "thumb")
+        except Exception as e:
+            print(f"⚠️ Could not schedule thumbnails for {path.name}: {e}")
+
+
+def prerender_thumbnails(paths: Iterable[Path]) -> Optional[threading.Thread]:
+    """
+    Queues thumbnails for every page of every document on the process pool
+    without waiting, so they are usually on disk before a viewer is opened.
+    Hashing and counting pages happen on a background thread; on reruns,
+    documents already queued are recognized by their size and mtime alone.
+    """
+    pending = []
+    with _scheduled_lock:
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            key = (str(path), stat.st_size, stat.st_mtime_ns)
+            if key not in _scheduled:
+                _scheduled.add(key)
+                pending.append(path)
+    if not pending:
+        return None
+    thread = threading.Thread(target=_queue_thumbnails, args=(pending,), name="thumbnails", daemon=True)
+    thread.start()
+    return thread
+
+
+def cited_page(text: str) -> Optional[int]:
+    """The first page or slide number cited in an answer, if any."""
+    match = CITATION_PATTERN.search(text or "")
+    return int(match.group(1)) if match else None
+
+
+def open_at_page(filename: str, page: int):
+    """Widget callback: opens a document's viewer at a given page on the next rerun."""
+    st.session_state[f"viewer_open_{filename}"] = True
+    st.session_state[f"viewer_page_{filename}"] = page
+
+
+def document_viewer(path: Path, label: str):
+    """
+    A lazily rendered PDF viewer. Nothing is read or rasterized until the user
+    opens it; then only the current page and its strip of thumbnails are drawn.
+    """
+    name = path.name
+    if not st.toggle(label, key=f"viewer_open_{name}"):
+        return
+
+    with st.container(border=True):
+        try:
+            count = page_count(path)
+        except FileNotFoundError:
+            st.error(f"Please ensure '{name}' is in the app's asset directory.")
+            return
+        except Exception as e:
+            st.error(f"Could not open {name}: {e}")
+            return
+
+        page_key = f"viewer_page_{name}"
+        st.session_state[page_key] = min(max(st.session_state.get(page_key, 1), 1), count)
+        page = st.number_input(f"Page (of {count})", min_value=1, max_value=count, key=page_key)
+
+        start = (page - 1) // THUMBNAILS_PER_ROW * THUMBNAILS_PER_ROW
+        strip = range(start, min(start + THUMBNAILS_PER_ROW, count))
+        columns = st.columns(THUMBNAILS_PER_ROW)
+        for column, index, thumbnail in zip(columns, strip, render_images(path, strip)):
+            column.image(str(thumbnail), width="stretch")
+            column.button(f"{index + 1}", key=f"viewer_thumb_{name}_{index}", on_click=open_at_page,
+                          args=(name, index + 1), type="primary" if index + 1 == page else "secondary")
+
+        page_image = render_images(path, [page - 1], zoom=PAGE_ZOOM, prefix="page")[0]
+        st.image(str(page_image), width="stretch")
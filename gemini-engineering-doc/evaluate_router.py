@@ -0,0 +1,112 @@
+import argparse
+import json
+import statistics
+import time
+
+from router import ANALYST, INSTRUCTOR, IntentRouter, ROUTING_LOG, SEED_EXAMPLES, load_logged_examples
+
+# Held-out questions that are not part of the seed set. `None` marks
+# questions that should go to the Overseer (greetings, drafting, ambiguity).
+EVAL_EXAMPLES = [
+    ("What is the design pressure of vessel V-101 on our drawing?", ANALYST),
+    ("Which line connects the pump discharge to the heat exchanger in pid_sample_1.pdf?", ANALYST),
+    ("Trace the cooling water return in this diagram.", ANALYST),
+    ("What tag is on the control valve after the separator?", ANALYST),
+    ("How many pumps are shown in our P&ID?", ANALYST),
+    ("Explain what a P&ID legend sheet contains.", INSTRUCTOR),
+    ("Teach me how instrument bubbles are drawn.", INSTRUCTOR),
+    ("What does a dashed line symbol represent?", INSTRUCTOR),
+    ("What standards govern P&ID drafting?", INSTRUCTOR),
+    ("Who approves revisions to a P&ID?", INSTRUCTOR),
+    ("Hello!", None),
+    ("Draw a simple feed loop.", None),
+    ("Can you help me?", None),
+]
+
+
+def load_overseer_latency(log_path=ROUTING_LOG):
+    """Mean end-to-end latency of questions that went through the Overseer, if logged."""
+    latencies = {"overseer": [], "local": []}
+    if log_path.exists():
+        with log_path.open() as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("route") in latencies:
+                    latencies[record["route"]].append(record.get("latency_s", 0.0))
+    return {route: statistics.mean(values) if values else None for route, values in latencies.items()}
+
+
+def evaluate(router: IntentRouter, examples, overseer_hop_s: float):
+    """
+    Replays labelled questions through the router.
+
+    Returns:
+        dict: Accuracy of the local decisions, how often the router defers to
+        the Overseer, classifier latency and the Overseer time saved.
+    """
+    local, correct, wrong_defer = 0, 0, 0
+    timings = []
+    for question, expected in examples:
+        start = time.perf_counter()
+        decision = router.predict(question)
+        timings.append(time.perf_counter() - start)
+
+        if decision.is_confident:
+            local += 1
+            correct += decision.agent_name == expected
+        elif expected is not None:
+            wrong_defer += 1
+
+    total = len(examples)
+    return {
+        "questions": total,
+        "routed_locally": local,
+        "coverage": local / total if total else 0.0,
+        "local_accuracy": correct / local if local else 0.0,
+        "deferred_but_routable": wrong_defer,
+        "classifier_ms_mean": statistics.mean(timings) * 1000 if timings else 0.0,
+        "classifier_ms_max": max(timings) * 1000 if timings else 0.0,
+        "overseer_seconds_saved": local * overseer_hop_s,
+        "overseer_seconds_saved_per_question": local * overseer_hop_s / total if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline evaluation of the local P&ID intent router.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Confidence margin required to skip the Overseer.")
+    parser.add_argument("--overseer-hop", type=float, default=None,
+                        help="Seconds one Overseer call costs. Defaults to the routing log difference, else 6s.")
+    args = parser.parse_args()
+
+    logged = load_logged_examples()
+    router = IntentRouter(threshold=args.threshold).fit(SEED_EXAMPLES + logged)
+
+    overseer_hop_s = args.overseer_hop
+    if overseer_hop_s is None:
+        means = load_overseer_latency()
+        if means["overseer"] is not None and means["local"] is not None:
+            overseer_hop_s = max(means["overseer"] - means["local"], 0.0)
+        else:
+            overseer_hop_s = 6.0
+
+    print(f"Training examples: {len(SEED_EXAMPLES)} seed + {len(logged)} logged")
+    print(f"Overseer hop assumed: {overseer_hop_s:.2f}s\n")
+
+    # Leave-one-out over the seed set: a seed question may defer, but never misroute.
+    loo_examples = []
+    for i, (question, label) in enumerate(SEED_EXAMPLES):
+        held_out = IntentRouter(threshold=args.threshold).fit(SEED_EXAMPLES[:i] + SEED_EXAMPLES[i + 1:] + logged)
+        loo_examples.append(held_out.predict(question).agent_name in (label, None))
+    print(f"📊 Seed leave-one-out: {sum(loo_examples)}/{len(loo_examples)} not misrouted")
+
+    report = evaluate(router, EVAL_EXAMPLES, overseer_hop_s)
+    print("📊 Held-out evaluation:")
+    for key, value in report.items():
+        print(f"   {key}: {value:.3f}" if isinstance(value, float) else f"   {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import json
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+ROUTING_LOG = Path("./logs/routing_log.jsonl")
+
+ANALYST = "analyst_agent"
+INSTRUCTOR = "instructor_agent"
+
+# Hand-labelled seed queries. Logged queries from ROUTING_LOG are added on top
+# of these so the router keeps learning from real traffic.
+SEED_EXAMPLES = [
+    ("What does the P&ID document pid_sample_1.pdf depict?", ANALYST),
+    ("What are the key components of our pid_sample_1.pdf P&ID document?", ANALYST),
+    ("What is the pressure on line 101?", ANALYST),
+    ("Trace the flow from the feed tank to the reactor in the diagram.", ANALYST),
+    ("Which pump feeds vessel V-101?", ANALYST),
+    ("List all the control valves shown on the drawing.", ANALYST),
+    ("Where does the discharge of P-20A go?", ANALYST),
+    ("How many heat exchangers are in our P&ID?", ANALYST),
+    ("What instruments are on the outlet line of the column?", ANALYST),
+    ("Is there a relief valve on the separator in this diagram?", ANALYST),
+    ("What are the key components when drafting a P&ID document?", INSTRUCTOR),
+    ("Who would need to sign off on a P&ID Document?", INSTRUCTOR),
+    ("What does this symbol mean?", INSTRUCTOR),
+    ("Teach me about control loops.", INSTRUCTOR),
+    ("How do I read instrument tag letters?", INSTRUCTOR),
+    ("Explain the difference between a gate valve and a globe valve.", INSTRUCTOR),
+    ("What is the purpose of a P&ID in a project?", INSTRUCTOR),
+    ("How are line numbers usually structured?", INSTRUCTOR),
+    ("Give me a tutorial on P&ID standards.", INSTRUCTOR),
+    ("What is an interlock and how is it drawn?", INSTRUCTOR),
+]
+
+# Strong lexical cues. Each hit adds a fixed boost to the matching label.
+# Single words match whole tokens; phrases match as substrings.
+KEYWORDS = {
+    ANALYST: ["pid_sample_1.pdf", "diagram", "drawing", "our", "this p&id", "trace", "line", "tag"],
+    INSTRUCTOR: ["teach", "explain", "learn", "tutorial", "course", "standards", "symbol", "sign off", "drafting", "what is a"],
+}
+KEYWORD_BOOST = 0.15
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9&]+(?:[-_.][a-z0-9]+)*")
+# Equipment tags such as V-101 or P-20A only appear in diagram lookups.
+TAG_PATTERN = re.compile(r"\b[a-z]{1,3}-\d+[a-z]?\b")
+
+
+@dataclass
+class RouteDecision:
+    """The outcome of a local routing attempt."""
+    agent_name: Optional[str]
+    confidence: float
+    scores: dict
+
+    @property
+    def is_confident(self) -> bool:
+        return self.agent_name is not None
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cases and splits a question into word and tag tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class IntentRouter:
+    """
+    A small TF-IDF nearest-centroid classifier that decides whether a question
+    belongs to the Analyst or the Instructor without calling the Overseer.
+
+    Questions it is unsure about return `agent_name=None` so the caller can
+    fall back to the LLM Overseer.
+    """
+
+    def __init__(self, threshold: float = 0.2, min_score: float = 0.25):
+        self.threshold = threshold
+        self.min_score = min_score
+        self.idf: dict[str, float] = {}
+        self.centroids: dict[str, dict[str, float]] = {}
+
+    def fit(self, examples: Iterable[tuple[str, str]]) -> "IntentRouter":
+        examples = list(examples)
+        doc_freq = Counter()
+        for question, _ in examples:
+            doc_freq.update(set(tokenize(question)))
+
+        total = len(examples)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in doc_freq.items()}
+
+        sums: dict[str, Counter] = {}
+        for question, label in examples:
+            sums.setdefault(label, Counter()).update(self._vectorize(question))
+        self.centroids = {label: _normalize(vector) for label, vector in sums.items()}
+        return self
+
+    def _vectorize(self, text: str) -> dict[str, float]:
+        counts = Counter(tokenize(text))
+        vector = {term: count * self.idf[term] for term, count in counts.items() if term in self.idf}
+        return _normalize(vector)
+
+    def predict(self, question: str) -> RouteDecision:
+        """
+        Scores a question against every label.
+
+        Returns:
+            RouteDecision: `agent_name` is set only when the best label has
+            enough evidence and its margin over the runner-up clears the
+            confidence threshold.
+        """
+        vector = self._vectorize(question)
+        lowered = question.lower()
+        tokens = set(tokenize(question))
+        scores = {}
+        for label, centroid in self.centroids.items():
+            score = sum(weight * centroid.get(term, 0.0) for term, weight in vector.items())
+            hits = sum(1 for keyword in KEYWORDS.get(label, []) if (keyword in lowered if " " in keyword else keyword in tokens))
+            if label == ANALYST and TAG_PATTERN.search(lowered):
+                hits += 1
+            scores[label] = score + KEYWORD_BOOST * hits
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if not ranked or ranked[0][1] < self.min_score:
+            return RouteDecision(agent_name=None, confidence=0.0, scores=scores)
+
+        best_label, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        confidence = (best_score - runner_up) / best_score
+        agent_name = best_label if confidence >= self.threshold else None
+        return RouteDecision(agent_name=agent_name, confidence=confidence, scores=scores)
+
+
+def _normalize(vector: dict[str, float]) -> dict[str, float]:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return dict(vector)
+    return {term: weight / norm for term, weight in vector.items()}
+
+
+def load_logged_examples(log_path: Path = ROUTING_LOG) -> list[tuple[str, str]]:
+    """
+    Reads labelled questions from the routing log. Only questions the Overseer
+    routed are used, so the router never trains on its own decisions.
+    """
+    examples = []
+    if not log_path.exists():
+        return examples
+    with log_path.open() as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("route") == "overseer" and record.get("answered_by") in (ANALYST, INSTRUCTOR):
+                examples.append((record["question"], record["answered_by"]))
+    return examples
+
+
+def log_routing(question: str, decision: RouteDecision, answered_by: Optional[str], latency_s: float, log_path: Path = ROUTING_LOG):
+    """Appends one routed question to the routing log for retraining and evaluation."""
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    record = {
+        "timestamp": time.time(),
+        "question": question,
+        "routed_to": decision.agent_name,
+        "confidence": round(decision.confidence, 4),
+        "route": "local" if decision.is_confident else "overseer",
+        "answered_by": answered_by,
+        "latency_s": round(latency_s, 3),
+    }
+    with log_path.open("a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def build_router(threshold: float = 0.2, log_path: Path = ROUTING_LOG) -> IntentRouter:
+    """Trains a router on the seed examples plus everything in the routing log."""
+    return IntentRouter(threshold=threshold).fit(SEED_EXAMPLES + load_logged_examples(log_path))
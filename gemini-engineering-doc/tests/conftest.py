@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The project's modules are top-level (`answer_cache`, `budget`, ...), as when the app runs from its folder
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(PROJECT_DIR), str(PROJECT_DIR.parent)]
@@ -0,0 +1,66 @@
+import pytest
+
+from answer_cache import AnswerCache, conversation_key, question_anchors
+
+DOCS, VERSION = "docs", "v1"
+
+
+def cache_with(question: str, answer: str = "cached answer", **key) -> AnswerCache:
+    cache = AnswerCache()
+    cache.store(question, DOCS, VERSION, answer, "analyst_agent", **key)
+    return cache
+
+
+def test_exact_and_near_duplicate_questions_hit():
+    cache = cache_with("Who would need to sign off on a P&ID Document?")
+    assert cache.lookup("who would need to sign off on a p&id document", DOCS, VERSION).similarity == 1.0
+    near = cache.lookup("Who needs to sign off on a P&ID document?", DOCS, VERSION)
+    assert near is not None and near.similarity < 1.0
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Which pump feeds vessel V-101?", "Which pump feeds vessel V-102?"),
+    ("Where does line 101 go?", "Where does line 102 go?"),
+    ("What does pid_sample_1.pdf depict?", "What does pid_sample_2.pdf depict?"),
+    ("Is there a relief valve on the outlet?", "Is there no relief valve on the outlet?"),
+    ("Is the bypass valve open?", "Isn't the bypass valve open?"),
+])
+def test_questions_differing_in_an_anchor_never_match(stored, asked):
+    cache = cache_with(stored)
+    assert cache.lookup(asked, DOCS, VERSION) is None
+    assert cache.stats["misses"] == 1
+
+
+def test_anchors():
+    assert question_anchors("Which pump feeds V-101 on line 7?") == {"v-101", "7"}
+    assert question_anchors("What does pid_sample_1.pdf depict?") == {"pid_sample_1.pdf"}
+    assert question_anchors("Is there no relief valve?") == {"<not>"}
+    assert question_anchors("Who signs off on a P&ID?") == frozenset()
+
+
+def test_answers_are_scoped_to_the_conversation_and_model_variant():
+    first_turn = conversation_key([])
+    follow_up = conversation_key(["What does pid_sample_1.pdf depict?"])
+    cache = cache_with("Which valves does it show?", conversation=first_turn, variant="gemini-2.5-flash:1024")
+
+    assert cache.lookup("Which valves does it show?", DOCS, VERSION, conversation=follow_up,
+                        variant="gemini-2.5-flash:1024") is None
+    assert cache.lookup("Which valves does it show?", DOCS, VERSION, conversation=first_turn,
+                        variant="gemini-3-pro-preview:16000") is None
+    assert cache.lookup("Which valves does it show?", DOCS, VERSION, conversation=first_turn,
+                        variant="gemini-2.5-flash:1024") is not None
+
+
+def test_invalidate_drops_other_documents_and_prompts_in_every_conversation():
+    cache = cache_with("Who signs off?", conversation=conversation_key(["earlier"]))
+    cache.store("Who signs off?", "other-docs", VERSION, "old", "analyst_agent")
+    assert cache.invalidate(DOCS, VERSION) == 1
+    assert len(cache) == 1
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2)
+    for question in ("first question", "second question", "third question"):
+        cache.store(question, DOCS, VERSION, question, "analyst_agent")
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    assert cache.lookup("first question", DOCS, VERSION) is None
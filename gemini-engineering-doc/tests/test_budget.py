@@ -0,0 +1,46 @@
+from budget import TIERS, BudgetController, estimate_complexity
+
+
+def controller(**kwargs) -> BudgetController:
+    return BudgetController(log_path=None, **kwargs)
+
+
+def test_complexity_orders_lookups_below_tracing():
+    assert estimate_complexity("Who signs off on a P&ID?") < estimate_complexity(
+        "Trace the flow from V-101 through P-20A and explain what happens if the control loop fails")
+
+
+def test_cap_removes_tiers_above_it():
+    budget = controller(max_thinking_budget=4096)
+    assert budget.highest_tier.thinking_budget == 4096
+    assert all(budget.choose(q).thinking_budget <= 4096 for q in (
+        "Who signs off?", "Trace every line and compare all the interlock sequences step by step"))
+
+
+def test_cap_below_the_lightest_tier_is_still_respected():
+    budget = controller(max_thinking_budget=500)
+    assert budget.highest_tier.thinking_budget == 500
+    assert budget.choose("Trace every line step by step").thinking_budget == 500
+    assert budget.highest_tier.model == TIERS[0].model
+
+
+def test_without_a_cap_the_highest_tier_is_the_deepest():
+    assert controller().highest_tier == TIERS[-1]
+
+
+def test_slow_tier_is_stepped_down_under_the_latency_cap():
+    budget = controller(p95_latency_cap_s=10, min_samples=3)
+    question = "Trace every line and compare all the interlock sequences step by step"
+    top = budget.choose(question)
+    for _ in range(3):
+        budget.record(question, top, 30.0)
+    assert budget.choose(question).thinking_budget < top.thinking_budget
+
+
+def test_poorly_rated_answers_step_up():
+    budget = controller(min_samples=3)
+    question = "Who signs off on a P&ID?"
+    start = budget.choose(question)
+    for _ in range(3):
+        budget.record(question, start, None, quality=0.0)
+    assert budget.choose(question).thinking_budget > start.thinking_budget
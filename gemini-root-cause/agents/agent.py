@@ -1,16 +1,46 @@
 
+import os
 import pandas as pd
-from google.adk.agents import Agent, SequentialAgent
-from google.adk.tools import FunctionTool
-from google.adk.models import Gemini
-import vertexai
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+import sys
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.profiling import profiled
+from .anomaly import detect_incidents
+from .logstore import LogStore
+
+# ADK and the Vertex AI SDK take seconds to import, so they are imported in
+# create_rca_agent; preload() does that ahead of time
+if TYPE_CHECKING:
+    from google.adk.models import BaseLlm
+
+# Relative data paths resolve against the project folder, not the working directory
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+TICKETS = "data/servicenow_incidents.csv"
+VERSA_LOGS = ["data/versa_sdwan_logs.csv"]
+# Both Versa export formats, which the app scans for candidate incidents
+DETECTOR_LOGS = ["data/versa_networks.csv", "data/versa_sdwan_logs.csv"]
+# The monitored sites are all in one region, which neither the tickets nor the logs name
+SITE_LOCATION = "Calgary"
+
+
+def _resolve(path: str) -> Path:
+    # Paths come from the model (and, behind the service, from the prompt), so
+    # anything outside the project folder is refused, ".." and symlinks included
+    resolved = (PROJECT_DIR / path).resolve()
+    if not resolved.is_relative_to(PROJECT_DIR):
+        raise PermissionError(f"{path} is outside the project folder")
+    return resolved
+
+@profiled
 def read_logs(file_paths: list[str]) -> str:
     """
     Reads the content of specified CSV files and returns them as a single string.
 
     Args:
-        file_paths: A list of paths to the CSV files.
+        file_paths: A list of paths to the CSV files, or to log store directories.
 
     Returns:
         A string containing the concatenated content of the CSV files.
@@ -18,21 +48,45 @@ def read_logs(file_paths: list[str]) -> str:
     all_logs = ""
     for path in file_paths:
         try:
-            df = pd.read_csv(path)
+            resolved = _resolve(path)
+            df = LogStore.open(resolved).frame() if resolved.is_dir() else pd.read_csv(resolved)
             all_logs += f"--- {path} ---\n"
             all_logs += df.to_string()
             all_logs += "\n\n"
         except FileNotFoundError:
             all_logs += f"--- {path} ---\n"
             all_logs += "File not found.\n\n"
+        except PermissionError:
+            all_logs += f"--- {path} ---\n"
+            all_logs += "Access denied: only files in the project folder can be read.\n\n"
     return all_logs
 
+@profiled
+def detect_log_anomalies(file_paths: list[str]) -> str:
+    """
+    Scans Versa SD-WAN logs for bursts of anomalies across many sites at once.
+
+    Args:
+        file_paths: A list of paths to Versa SD-WAN log CSV files.
+
+    Returns:
+        A compact evidence bundle for each detected incident, most significant first.
+    """
+    try:
+        incidents = detect_incidents([_resolve(path) for path in file_paths])
+    except PermissionError as error:
+        return f"Access denied: {error}."
+    if not incidents:
+        return "No multi-site anomalies detected."
+    return "\n\n".join(incident.to_prompt() for incident in incidents[:3])
+
+@profiled
 def get_weather_report(date: str, location: str) -> str:
     """
     Reads weather data from a CSV and returns the report for a given date and location.
     """
     try:
-        weather_df = pd.read_csv("data/weather.csv")
+        weather_df = pd.read_csv(_resolve("data/weather.csv"))
         # Convert timestamp to datetime objects
         weather_df['timestamp'] = pd.to_datetime(weather_df['timestamp'])
         # Filter by date
@@ -46,6 +100,7 @@ def get_weather_report(date: str, location: str) -> str:
     except FileNotFoundError:
         return "Weather data file not found."
 
+@profiled
 def send_email(to: str, subject: str, body: str) -> str:
     """
     Sends an email.
@@ -54,6 +109,7 @@ def send_email(to: str, subject: str, body: str) -> str:
     # For this example, it returns a confirmation message.
     return f"Email sent to {to} with subject '{subject}'."
 
+@profiled
 def update_servicenow_case(case_number: str, comment: str) -> str:
     """
     Updates a ServiceNow case with a comment.
@@ -62,10 +118,52 @@ def update_servicenow_case(case_number: str, comment: str) -> str:
     # For this example, it returns a confirmation message.
     return f"ServiceNow case {case_number} updated with comment: '{comment}'."
 
-def create_rca_agent(project_id: str, location: str, model_name: str):
-    """Creates the Root Cause Analysis agent pipeline."""
-    vertexai.init(project=project_id, location=location)
-    model = Gemini(model_name=model_name)
+def ticket_date(path: str = TICKETS) -> str:
+    """The date of the most urgent ServiceNow ticket, the incident a run investigates by default."""
+    tickets = pd.read_csv(_resolve(path))
+    return str(pd.to_datetime(tickets.sort_values("priority", kind="stable")["timestamp"].iloc[0]).date())
+
+def incident_prompt(date: str, location: str = SITE_LOCATION, evidence: Optional[str] = None,
+                    log_files: Optional[list[str]] = None) -> str:
+    """
+    The request a run starts from. The weather stage runs alongside the log
+    research, so the incident's date and place are stated up front rather than
+    found in the logs; a detected incident's evidence bundle leads when given.
+    `log_files` are the logs the evidence came from, the Versa SD-WAN logs by default.
+    """
+    prompt = (f"Incident date: {date}. Affected location: {location}.\n"
+              f"Analyze the logs from {[TICKETS, *(log_files or VERSA_LOGS)]}")
+    return f"{evidence}\n\n{prompt}" if evidence else prompt
+
+def preload():
+    """Imports what a pipeline run needs and initializes the Vertex AI SDK, for `shared.warmup.warm_up`."""
+    import google.adk.runners
+    from google.adk.agents import Agent
+    from shared.dag import build_pipeline
+    from shared.scheduler import init_vertexai
+    init_vertexai(os.getenv("GOOGLE_CLOUD_PROJECT"), os.getenv("GOOGLE_CLOUD_LOCATION"))
+
+def create_rca_agent(project_id: str, location: str, model_name: str, model: Optional["BaseLlm"] = None,
+                     context_cache: bool = False):
+    """Creates the Root Cause Analysis agent pipeline.
+
+    Args:
+        model: Optional pre-built model (e.g. a replay stand-in) used instead of Gemini.
+        context_cache: Cache each agent's instructions and tools once instead of
+            sending them with every incident (see shared/context_cache.py). Every
+            prefix is a few hundred tokens, below Vertex AI's 2,048-token minimum,
+            so for now they are still sent as they are.
+    """
+    from google.adk.agents import Agent
+    from google.adk.tools import FunctionTool
+    from shared.context_cache import model_callbacks, split_instruction
+    from shared.dag import Stage, build_pipeline
+    from shared.scheduler import init_vertexai, scheduled_model
+
+    init_vertexai(project_id, location)
+    # Every agent's calls go through the shared quota-aware scheduler
+    model = scheduled_model(model or model_name)
+    callbacks = model_callbacks(context_cache=context_cache)
 
     researcher = Agent(
         model=model,
@@ -74,26 +172,51 @@ def create_rca_agent(project_id: str, location: str, model_name: str):
         instruction="""
         You are a network log researcher. Your job is to analyze the provided logs.
         1. Read the ServiceNow and Versa SD-WAN logs using the read_logs tool.
-        2. Identify the critical incident from the ServiceNow tickets.
+           For large Versa logs, use the detect_log_anomalies tool instead of reading them in full.
+        2. Identify the critical incident from the ServiceNow tickets, or use the detected incident if the request includes its evidence.
         3. Correlate the incident timestamp with events in the Versa SD-WAN logs.
         4. Summarize the key events that occurred around the time of the incident.
         Focus on events like VRRP flapping, packet loss, and tunnel drops.
         """,
-        tools=[FunctionTool(read_logs)],
+        tools=[FunctionTool(read_logs), FunctionTool(detect_log_anomalies)],
+        **callbacks,
+        output_key="log_findings",
     )
 
-    hypothesizer = Agent(
+    weather_researcher = Agent(
         model=model,
-        name="NetworkAnalyst",
-        description="Forms a hypothesis based on the researcher's findings.",
+        name="WeatherResearcher",
+        description="Gathers the weather conditions around the incident.",
         instruction="""
-        You are a network analyst. Your job is to form a hypothesis based on the researcher's findings.
-        1. Review the summary of correlated log events.
-        2. Use the get_weather_report tool for the date of the incident (July 24, 2025) and the affected location (Calgary).
-        3. Based on the logs and the weather report, determine the most likely root cause.
-        The hypothesis should connect the weather to the network instability. For example, a storm could cause power issues, leading to the observed VRRP flapping.
+        You are a weather researcher. Your job is to gather the weather context for the incident.
+        1. Use the get_weather_report tool for the incident date and the affected location given in the request,
+           which come from the ServiceNow ticket or the detected incident being investigated.
+        2. Summarize the conditions that could affect network or power infrastructure, such as storms, high winds or heavy precipitation, and when they peaked.
         """,
         tools=[FunctionTool(get_weather_report)],
+        **callbacks,
+        output_key="weather_context",
+    )
+
+    hypothesizer = Agent(
+        model=model,
+        name="NetworkAnalyst",
+        description="Forms a hypothesis based on the researchers' findings.",
+        # The findings change with every incident, the guidance after them does not
+        **split_instruction("""
+        You are a network analyst. Your job is to form a hypothesis based on the researchers' findings.
+
+        Correlated log events:
+        {log_findings}
+
+        Weather around the incident:
+        {weather_context}
+""", """
+        Based on the logs and the weather report, determine the most likely root cause.
+        The hypothesis should connect the weather to the network instability. For example, a storm could cause power issues, leading to the observed VRRP flapping.
+        """, context_cache),
+        **callbacks,
+        output_key="hypothesis",
     )
 
     dispatcher = Agent(
@@ -109,11 +232,15 @@ def create_rca_agent(project_id: str, location: str, model_name: str):
         5. The final recommendation should be a summary of the proposed actions.
         Example actions: 'Dispatch field tech for power checks at affected sites. Propose sending email to ops team and updating ServiceNow case.'
         """,
+        **callbacks,
     )
 
-    rca_agent = SequentialAgent(
-        name="rca_agent",
-        sub_agents=[researcher, hypothesizer, dispatcher]
-    )
-    return rca_agent
-
+    # The pipeline as a dependency graph. Log research and the weather lookup only need
+    # the ticket, so they run side by side; the analyst joins their outputs.
+    stages = [
+        Stage(researcher),
+        Stage(weather_researcher),
+        Stage(hypothesizer, after=("NetworkLogResearcher", "WeatherResearcher")),
+        Stage(dispatcher, after=("NetworkAnalyst",)),
+    ]
+    return build_pipeline("rca_agent", stages, description="Root cause analysis for network incidents.")
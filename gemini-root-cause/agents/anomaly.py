@@ -0,0 +1,284 @@
+"""Anomaly detection over Versa SD-WAN events, to pick which incidents get an RCA.
+
+Events are counted per site, per category (VRRP changes, tunnel flaps,
+latency warnings, packet loss) and per minute. Each of those counts is scored
+against its own EWMA baseline. All sites are scored together as NumPy arrays,
+one minute at a time, so a day of logs from thousands of sites takes seconds.
+
+A single site misbehaving is common. An incident worth an RCA is many sites
+misbehaving at once, so each minute's anomalies are also summed across the
+fleet (their total z-score) and scored against a fleet-wide baseline. A burst
+above that baseline opens a cluster, which grows while anomalies stay
+elevated. The cluster becomes a `CandidateIncident` with a compact evidence
+bundle for the NetworkLogResearcher.
+
+The detector keeps its baselines between `update` calls, so it can follow a
+live feed: hand it each minute's (or hour's) new events as they arrive.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .logstore import LogStore
+
+# Matched case-insensitively against a log line's event type and message
+CATEGORIES = {
+    "vrrp": r"vrrp",
+    "tunnel": r"tunnel",
+    "latency": r"latency",
+    "packet_loss": r"packet loss",
+}
+
+
+def load_events(paths: Sequence) -> pd.DataFrame:
+    """
+    Reads Versa logs in either of the two export formats, as CSV files or
+    `LogStore` directories, into one event table.
+
+    Returns:
+        pd.DataFrame: `timestamp`, `site`, `category` and `message`, sorted by
+            time, with lines that match no category dropped.
+    """
+    frames = []
+    for path in paths:
+        # Stores decode to categoricals, which stay compact all the way through
+        # Empty messages stay "" rather than NaN, which would not match any category reliably
+        raw = LogStore.open(path).frame() if Path(path).is_dir() else pd.read_csv(path, dtype=str, keep_default_na=False)
+        site = raw["site_id"] if "site_id" in raw else raw["device"]
+        text = raw["message"]
+        if "event_type" in raw:
+            text = raw["event_type"].astype(str) + " " + text.astype(str)
+        frames.append(pd.DataFrame({"timestamp": pd.to_datetime(raw["timestamp"]), "site": site,
+                                    "text": text, "message": raw["message"]}))
+    return categorize(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["timestamp", "site", "text", "message"]))
+
+
+def categorize(events: pd.DataFrame) -> pd.DataFrame:
+    """Adds a `category` to `timestamp`/`site`/`text` rows and drops the ones that have none."""
+    # Logs repeat a few message templates, so match each distinct text once
+    # A missing text is one more distinct value; with the default -1 code it would take the last text's category
+    codes, texts = pd.factorize(events["text"], use_na_sentinel=False)
+    texts = pd.Series(texts, dtype=object)
+    conditions = [texts.str.contains(pattern, case=False, regex=True, na=False) for pattern in CATEGORIES.values()]
+    category = np.select(conditions, list(CATEGORIES), default="")[codes]
+    events = events.assign(category=category)[category != ""]
+    return events.drop(columns="text").sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+@dataclass
+class CandidateIncident:
+    """A burst of simultaneous anomalies across sites, and the evidence for it."""
+    start: pd.Timestamp
+    end: pd.Timestamp
+    sites: list[str]
+    event_counts: dict[str, int]
+    # Highest z-score of any site and category, and of the fleet's total anomaly
+    peak_z: float
+    fleet_z: float
+    samples: list[str] = field(default_factory=list)
+
+    @property
+    def score(self) -> float:
+        return self.fleet_z * len(self.sites)
+
+    def to_prompt(self) -> str:
+        """The evidence bundle, short enough to hand to the researcher instead of raw logs."""
+        counts = ", ".join(f"{count} {category}" for category, count in sorted(self.event_counts.items(), key=lambda item: -item[1]))
+        lines = [
+            f"Detected incident: {len(self.sites)} sites anomalous between {self.start:%Y-%m-%d %H:%M} and {self.end:%H:%M}.",
+            f"Sites: {', '.join(self.sites)}",
+            f"Events: {counts}",
+            f"Peak z-score {self.peak_z:.1f} per site, {self.fleet_z:.1f} across the fleet.",
+            "Sample log lines:",
+            *(f"  {line}" for line in self.samples),
+        ]
+        return "\n".join(lines)
+
+
+class _Cluster:
+    def __init__(self, bucket: int, fleet_z: float):
+        self.start = self.end = bucket
+        self.fleet_z = fleet_z
+        self.peak_z = 0.0
+        self.site_z: dict[int, float] = {}
+        self.site_counts: dict[int, np.ndarray] = {}
+        self.samples: list[str] = []
+
+
+class AnomalyDetector:
+    """
+    Args:
+        freq: Bucket size; counts and baselines are per bucket.
+        span: EWMA span of the baselines, in buckets.
+        z_threshold: z-score at which a site's count in a category is anomalous.
+        min_variance: Added to every variance, so a single event at a site that
+            is normally silent scores just above `z_threshold` instead of infinity.
+        fleet_z_threshold: z-score of the fleet's total anomaly that opens a cluster.
+        anomaly_learning: How much slower baselines learn from anomalous counts
+            while a cluster is open, so a long storm stays anomalous throughout.
+        min_sites: Fewest sites that make an incident.
+        gap: Buckets without elevated anomalies that close a cluster.
+        warmup: Buckets spent learning baselines before clusters can open.
+        max_samples: Log lines kept in an evidence bundle.
+        chunk: Buckets counted at a time; bounds memory to chunk x sites x categories.
+    """
+
+    def __init__(self, freq: str = "1min", span: int = 60, z_threshold: float = 3.0, min_variance: float = 0.1,
+                 fleet_z_threshold: float = 4.0, anomaly_learning: float = 0.1, min_sites: int = 2, gap: int = 10, warmup: int = 30, max_samples: int = 12, chunk: int = 60):
+        self.freq = pd.Timedelta(freq)
+        self.alpha = 2.0 / (span + 1)
+        self.z_threshold = z_threshold
+        self.min_variance = min_variance
+        self.fleet_z_threshold = fleet_z_threshold
+        self.anomaly_learning = anomaly_learning
+        self.min_sites = min_sites
+        self.gap = gap
+        self.warmup = warmup
+        self.max_samples = max_samples
+        self.chunk = chunk
+
+        self.sites: dict[str, int] = {}
+        self._mean = np.zeros((0, len(CATEGORIES)))
+        self._var = np.zeros((0, len(CATEGORIES)))
+        self._fleet_mean = 0.0
+        self._fleet_var = 0.0
+        self._origin: Optional[pd.Timestamp] = None
+        self._next_bucket = 0
+        self._open: Optional[_Cluster] = None
+
+    def _site_codes(self, sites: pd.Series) -> np.ndarray:
+        for name in sites.unique():
+            self.sites.setdefault(name, len(self.sites))
+        grow = len(self.sites) - len(self._mean)
+        if grow:
+            self._mean = np.vstack([self._mean, np.zeros((grow, len(CATEGORIES)))])
+            self._var = np.vstack([self._var, np.zeros((grow, len(CATEGORIES)))])
+        return np.asarray(sites.map(self.sites), dtype=np.int64)
+
+    def update(self, events: pd.DataFrame) -> list[CandidateIncident]:
+        """
+        Scores a batch of events from `load_events` or `categorize`. Batches
+        must arrive in time order, and the last bucket of a batch is treated as
+        complete.
+
+        Returns:
+            list[CandidateIncident]: Clusters that closed during this batch.
+        """
+        if events.empty:
+            return []
+        if self._origin is None:
+            self._origin = events["timestamp"].iloc[0].floor(self.freq)
+
+        sites = self._site_codes(events["site"])
+        buckets = ((events["timestamp"] - self._origin) // self.freq).to_numpy()
+        categories = pd.Categorical(events["category"], categories=list(CATEGORIES)).codes
+        # Buckets before `first` were already scored; empty ones in between still age the baselines
+        first, last = self._next_bucket, int(buckets.max())
+        if first > last:
+            return []
+
+        closed, touched = [], {}
+        for chunk_start in range(first, last + 1, self.chunk):
+            chunk_end = min(chunk_start + self.chunk, last + 1)
+            lo, hi = np.searchsorted(buckets, [chunk_start, chunk_end])
+            for offset, x in enumerate(self._counts(buckets[lo:hi] - chunk_start, sites[lo:hi], categories[lo:hi],
+                                                    chunk_end - chunk_start)):
+                cluster = self._score(chunk_start + offset, x)
+                if cluster is not None:
+                    touched[id(cluster)] = cluster
+                    if cluster is not self._open:
+                        closed.append(cluster)
+
+        self._next_bucket = last + 1
+        for cluster in touched.values():
+            self._collect_samples(cluster, events, buckets, sites)
+        return [incident for incident in map(self._incident, closed) if incident is not None]
+
+    def _counts(self, buckets: np.ndarray, sites: np.ndarray, categories: np.ndarray, n_buckets: int) -> np.ndarray:
+        """A dense (bucket, site, category) cube of counts, in one bincount."""
+        n_sites, n_categories = len(self.sites), len(CATEGORIES)
+        flat = (buckets * n_sites + sites) * n_categories + categories
+        return np.bincount(flat, minlength=n_buckets * n_sites * n_categories).reshape(n_buckets, n_sites, n_categories)
+
+    def _score(self, bucket: int, x: np.ndarray) -> Optional[_Cluster]:
+        """Scores one bucket and updates the baselines; returns the cluster it opened, extended or closed."""
+        z = (x - self._mean) / np.sqrt(self._var + self.min_variance)
+        anomalous = (z >= self.z_threshold) & (x > 0)
+        flagged = np.flatnonzero(anomalous.any(axis=1))
+        mass = float(z[anomalous].sum())
+        fleet_z = (mass - self._fleet_mean) / np.sqrt(self._fleet_var + self.min_variance)
+
+        cluster = self._open
+        if (cluster is None and bucket >= self.warmup and len(flagged) >= self.min_sites
+                and fleet_z >= self.fleet_z_threshold):
+            cluster = self._open = _Cluster(bucket, fleet_z)
+        if cluster is not None:
+            if len(flagged) and fleet_z >= 1.0:
+                cluster.end = bucket
+                cluster.fleet_z = max(cluster.fleet_z, fleet_z)
+                cluster.peak_z = max(cluster.peak_z, float(z[anomalous].max()))
+                site_z = np.where(anomalous, z, 0.0)[flagged].sum(axis=1)
+                for site, score, site_counts in zip(flagged, site_z, np.where(anomalous, x, 0)[flagged]):
+                    cluster.site_z[site] = cluster.site_z.get(site, 0.0) + score
+                    cluster.site_counts[site] = cluster.site_counts.get(site, 0) + site_counts
+            elif bucket - cluster.end > self.gap:
+                self._open = None
+
+        # EWMA mean and variance, updated for every site at once. During an
+        # incident, anomalous counts barely move the baselines, so it stays visible.
+        alpha = np.where(anomalous, self.alpha * self.anomaly_learning, self.alpha) if self._open else self.alpha
+        diff = x - self._mean
+        increment = alpha * diff
+        self._mean += increment
+        self._var = (1 - alpha) * (self._var + diff * increment)
+        fleet_alpha = self.alpha * (self.anomaly_learning if self._open is not None else 1.0)
+        fleet_diff = mass - self._fleet_mean
+        self._fleet_mean += fleet_alpha * fleet_diff
+        self._fleet_var = (1 - fleet_alpha) * (self._fleet_var + fleet_alpha * fleet_diff ** 2)
+        return cluster
+
+    def flush(self) -> list[CandidateIncident]:
+        """Closes the cluster still open at the end of the data, if any."""
+        cluster, self._open = self._open, None
+        incident = self._incident(cluster) if cluster is not None else None
+        return [incident] if incident is not None else []
+
+    def _members(self, cluster: _Cluster) -> list[int]:
+        # A lone anomaly scores ~z_threshold; members need about two, or one strong one
+        return [site for site, score in cluster.site_z.items() if score >= 2 * self.z_threshold]
+
+    def _collect_samples(self, cluster: _Cluster, events: pd.DataFrame, buckets: np.ndarray, sites: np.ndarray):
+        room = self.max_samples - len(cluster.samples)
+        if room <= 0:
+            return
+        mask = (buckets >= cluster.start) & (buckets <= cluster.end) & np.isin(sites, self._members(cluster))
+        for row in events[mask].head(room).itertuples():
+            cluster.samples.append(f"{row.timestamp:%Y-%m-%d %H:%M:%S} {row.site} {row.message}")
+
+    def _incident(self, cluster: _Cluster) -> Optional[CandidateIncident]:
+        members = sorted(self._members(cluster), key=lambda site: -cluster.site_z[site])
+        if len(members) < self.min_sites:
+            return None
+        names = list(self.sites)
+        totals = sum(cluster.site_counts[site] for site in members)
+        return CandidateIncident(
+            start=self._origin + cluster.start * self.freq,
+            end=self._origin + (cluster.end + 1) * self.freq,
+            sites=[names[site] for site in members],
+            event_counts={category: int(count) for category, count in zip(CATEGORIES, totals) if count},
+            peak_z=cluster.peak_z,
+            fleet_z=float(cluster.fleet_z),
+            samples=cluster.samples,
+        )
+
+
+def detect_incidents(paths: Sequence, **options) -> list[CandidateIncident]:
+    """Runs a fresh detector over log files, most significant incident first."""
+    detector = AnomalyDetector(**options)
+    incidents = detector.update(load_events(paths)) + detector.flush()
+    return sorted(incidents, key=lambda incident: -incident.score)
@@ -0,0 +1,233 @@
+"""A compact, memory-mappable column store for Versa SD-WAN logs.
+
+`pd.read_csv` keeps every log line as Python strings: the timestamp, the site,
+the level and the message, each a separate object. At production volumes
+that is hundreds of bytes per line. A `LogStore` keeps:
+
+- timestamps as int64 nanoseconds,
+- low-cardinality columns (site, level, device, event type) as integer codes
+  into a dictionary,
+- messages as a code into a dictionary of distinct messages. Each distinct
+  message is itself a template ("VRRP group <*> on eth1 changed state") plus
+  its parameters, so thousands of variants of one line share a template.
+
+Every column is a raw binary file next to a `meta.json`, opened with
+`np.memmap`, so a store loads instantly and only the pages a query touches
+are read into memory.
+
+    python -m agents.logstore data/versa_sdwan_logs.csv data/versa_sdwan_logs.logstore
+"""
+
+import argparse
+import json
+import re
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+PLACEHOLDER = "<*>"
+# A literal "<*>" in a message is cut out like a parameter, so rendering puts it back
+PARAMETER = re.compile(r"\b\d+(?:\.\d+)*\b|\b0x[0-9a-fA-F]+\b|" + re.escape(PLACEHOLDER))
+SEPARATOR = "\x1f"
+
+
+def template(message: str) -> tuple[str, list[str]]:
+    """Splits a message into its template and the parameters cut out of it."""
+    return PARAMETER.sub(PLACEHOLDER, message), PARAMETER.findall(message)
+
+
+def _smallest_uint(cardinality: int):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if cardinality <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+class _Dictionary:
+    """Values to integer codes, in order of first appearance."""
+
+    def __init__(self, values: Sequence[str] = ()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def add(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, column: pd.Series) -> np.ndarray:
+        # Factorize first, so the Python-level lookup runs once per distinct value
+        local, uniques = pd.factorize(column)
+        return np.fromiter(map(self.add, uniques), dtype=np.int64, count=len(uniques))[local]
+
+
+class LogStore:
+    """
+    A directory of column files. Build one from CSV exports with `build`, and
+    open it with `open`.
+    """
+
+    def __init__(self, directory: Path, meta: dict):
+        self.directory = directory
+        self.meta = meta
+        self.rows = meta["rows"]
+        self.templates = meta["templates"]
+        self._columns = {
+            name: np.memmap(directory / f"{name}.bin", dtype=spec["dtype"], mode="r", shape=(spec["length"],))
+            if spec["length"] else np.empty(0, dtype=spec["dtype"])
+            for name, spec in meta["files"].items()
+        }
+        self._rendered: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @classmethod
+    def open(cls, directory: Union[str, Path]) -> "LogStore":
+        directory = Path(directory)
+        return cls(directory, json.loads((directory / "meta.json").read_text()))
+
+    @classmethod
+    def build(cls, csv_paths: Sequence, directory: Union[str, Path], time_column: str = "timestamp",
+              message_column: str = "message", chunksize: int = 1_000_000) -> "LogStore":
+        """
+        Converts CSV exports into a store, reading them in chunks so memory
+        stays bounded whatever their size. Every other column is dictionary
+        encoded.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        # Columns are appended chunk by chunk, so start from empty files
+        for stale in [*directory.glob("*.bin"), directory / "meta.json"]:
+            stale.unlink(missing_ok=True)
+        dictionaries: dict[str, _Dictionary] = {}
+        messages, templates = _Dictionary(), _Dictionary()
+        message_templates, message_params = [], []
+        rows, last_time, is_sorted = 0, None, True
+        files = {}
+
+        def write(name: str, values: np.ndarray):
+            with open(directory / f"{name}.bin", "ab") as f:
+                values.tofile(f)
+
+        for path in csv_paths:
+            for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False):
+                times = pd.to_datetime(chunk[time_column]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+                if len(times):
+                    is_sorted = is_sorted and bool(np.all(times[1:] >= times[:-1])) and bool(last_time is None or times[0] >= last_time)
+                    last_time = times[-1]
+                write(time_column, times)
+
+                for name in chunk.columns.drop([time_column, message_column]):
+                    write(name, dictionaries.setdefault(name, _Dictionary()).encode(chunk[name]).astype(np.uint32))
+
+                seen = len(messages.values)
+                write(message_column, messages.encode(chunk[message_column]).astype(np.uint32))
+                for message in messages.values[seen:]:
+                    text, params = template(message)
+                    message_templates.append(templates.add(text))
+                    message_params.append(SEPARATOR.join(params))
+                rows += len(chunk)
+
+        # Parameters of all distinct messages, as one UTF-8 blob plus offsets
+        encoded = [params.encode() for params in message_params]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(params) for params in encoded], out=offsets[1:])
+        write("message_templates", np.asarray(message_templates, dtype=_smallest_uint(len(templates.values))))
+        write("message_param_offsets", offsets)
+        write("message_params", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+        # Codes were written as uint32 while cardinalities were unknown; narrow them now
+        for name, dictionary in [*dictionaries.items(), (message_column, messages)]:
+            dtype = _smallest_uint(len(dictionary.values))
+            if dtype != np.uint32:
+                narrowed = np.fromfile(directory / f"{name}.bin", dtype=np.uint32).astype(dtype)
+                narrowed.tofile(directory / f"{name}.bin")
+            files[name] = {"dtype": np.dtype(dtype).name, "length": rows}
+        files[time_column] = {"dtype": "int64", "length": rows}
+        files["message_templates"] = {"dtype": np.dtype(_smallest_uint(len(templates.values))).name,
+                                      "length": len(message_templates)}
+        files["message_param_offsets"] = {"dtype": "int64", "length": len(offsets)}
+        files["message_params"] = {"dtype": "uint8", "length": int(offsets[-1])}
+
+        meta = {
+            "rows": rows,
+            "time_column": time_column,
+            "message_column": message_column,
+            "sorted": is_sorted,
+            "dictionaries": {name: dictionary.values for name, dictionary in dictionaries.items()},
+            "templates": templates.values,
+            "files": files,
+        }
+        (directory / "meta.json").write_text(json.dumps(meta))
+        return cls(directory, meta)
+
+    def column(self, name: str) -> np.ndarray:
+        """The raw codes (or int64 timestamps) of a column, memory-mapped."""
+        return self._columns[name]
+
+    def render(self, message_code: int) -> str:
+        """Rebuilds one distinct message from its template and parameters."""
+        if message_code not in self._rendered:
+            offsets = self._columns["message_param_offsets"]
+            blob = bytes(self._columns["message_params"][offsets[message_code]:offsets[message_code + 1]])
+            params = blob.decode().split(SEPARATOR) if blob else []
+            parts = self.templates[self._columns["message_templates"][message_code]].split(PLACEHOLDER)
+            self._rendered[message_code] = "".join(part + (params[i] if i < len(params) else "")
+                                                   for i, part in enumerate(parts))
+        return self._rendered[message_code]
+
+    def between(self, start=None, end=None) -> Union[slice, np.ndarray]:
+        """Rows with start <= timestamp < end: a slice when the store is time-sorted, else a mask."""
+        times = self._columns[self.meta["time_column"]]
+        low = pd.Timestamp(start).value if start is not None else np.iinfo(np.int64).min
+        high = pd.Timestamp(end).value if end is not None else np.iinfo(np.int64).max
+        if self.meta["sorted"]:
+            return slice(*map(int, np.searchsorted(times, [low, high])))
+        return (times >= low) & (times < high)
+
+    def frame(self, rows: Union[slice, np.ndarray, None] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Decodes rows into a DataFrame. Dictionary and message columns come back
+        as categoricals, so only the distinct values in `rows` become strings.
+        """
+        rows = slice(None) if rows is None else rows
+        time_column, message_column = self.meta["time_column"], self.meta["message_column"]
+        data = {}
+        for name in columns or [time_column, *self.meta["dictionaries"], message_column]:
+            codes = np.asarray(self._columns[name][rows])
+            if name == time_column:
+                data[name] = codes.view("datetime64[ns]")
+            elif name == message_column:
+                used = np.flatnonzero(np.bincount(codes, minlength=len(self._columns["message_templates"])))
+                local = np.empty(len(self._columns["message_templates"]), dtype=np.int64)
+                local[used] = np.arange(len(used))
+                data[name] = pd.Categorical.from_codes(local[codes], [self.render(int(code)) for code in used])
+            else:
+                data[name] = pd.Categorical.from_codes(codes.astype(np.int64), self.meta["dictionaries"][name])
+        return pd.DataFrame(data)
+
+    def template_counts(self, rows: Union[slice, np.ndarray, None] = None) -> pd.Series:
+        """Lines per message template, without decoding a single message."""
+        rows = slice(None) if rows is None else rows
+        message_templates = self._columns["message_templates"][self._columns[self.meta["message_column"]][rows]]
+        counts = np.bincount(message_templates, minlength=len(self.templates))
+        return pd.Series(counts, index=self.templates).sort_values(ascending=False).loc[lambda s: s > 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Versa SD-WAN CSV exports into a compact log store.")
+    parser.add_argument("csv", nargs="+", help="CSV files, in time order.")
+    parser.add_argument("store", help="Directory to write the store to.")
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    args = parser.parse_args()
+    store = LogStore.build(args.csv, args.store, chunksize=args.chunksize)
+    print(f"{len(store):,} rows, {len(store.templates)} templates -> {args.store}")
+
+
+if __name__ == "__main__":
+    main()
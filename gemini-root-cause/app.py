@@ -2,14 +2,29 @@ import streamlit as st
 import os
 import pandas as pd
 from dotenv import load_dotenv
-from agents.agent import create_rca_agent
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
+from agents.agent import DETECTOR_LOGS, create_rca_agent, incident_prompt, preload, ticket_date
+from agents.anomaly import detect_incidents
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.profiling import get_profiler, hot_spots, profiling_enabled, profiling_plugins
+from shared.warmup import warm_up
+import time
 
 # Load environment variables
 load_dotenv()
 
+@st.cache_data
+def get_candidate_incidents(paths):
+    # Pre-stage: only bursts across many sites at once are worth an RCA
+    return detect_incidents(list(paths))
+
+@st.cache_resource
+def get_session_service():
+    from shared.sessions import SqliteSessionService
+    # Sessions persist in .sessions/ across reruns and restarts
+    return SqliteSessionService()
+
 # Page Config
 st.set_page_config(page_title="Gemini RCA Agent", layout="wide")
 
@@ -22,6 +37,19 @@ with st.sidebar:
     project_id = st.text_input("Project ID", value=os.getenv("GOOGLE_CLOUD_PROJECT", ""), disabled=True)
     location = st.text_input("Location", value=os.getenv("GOOGLE_CLOUD_LOCATION", ""), disabled=True)
     model_name = st.selectbox("Model", ["gemini-1.5-flash", "gemini-2.5-flash", "gemini-2.5-pro"])
+    context_cache = st.checkbox("Cache agent instructions",
+                                help="Send each agent's instructions once as a Vertex AI context cache instead of with every "
+                                     "incident. They are below the 2,048-token minimum Vertex AI caches, so this has no effect yet.")
+
+    st.header("Profiling")
+    # Set for the whole process with AGENT_PROFILE=1: a per-session toggle would turn it off for everyone else
+    if profiling_enabled():
+        st.caption("Tools and callbacks are profiled (AGENT_PROFILE=1). This run's hot spots appear here, "
+                   "and every run is merged into .profiles/.")
+    else:
+        st.caption("Off. Start the app with AGENT_PROFILE=1 to profile tools and callbacks.")
+    profile_report = st.empty()
+    profiled_run = None
 
     if project_id:
         os.environ["PROJECT_ID"] = project_id
@@ -55,18 +83,36 @@ with col1:
         except FileNotFoundError:
             st.error("data/weather.csv not found.")
 
+    with st.expander("Detected Incidents", expanded=True):
+        try:
+            candidates = get_candidate_incidents(tuple(DETECTOR_LOGS))
+        except FileNotFoundError as e:
+            candidates = []
+            st.error(f"{e.filename} not found.")
+        for candidate in candidates:
+            st.code(candidate.to_prompt(), language=None)
+        if not candidates:
+            st.caption("No multi-site anomalies detected in the Versa logs.")
+
+    investigate_options = ["ServiceNow ticket", *(f"Detected incident at {c.start:%H:%M} ({len(c.sites)} sites)" for c in candidates)]
+    investigate = st.radio("Investigate", investigate_options)
+
 if st.button("Run Root Cause Analysis"):
     if not project_id or not location:
         st.error("Please provide a Project ID and Location.")
     else:
         try:
             import asyncio
+            # Usually already imported by the warm-up
+            from google.adk.agents.run_config import RunConfig, StreamingMode
+            from google.adk.runners import Runner
+            from google.genai import types
 
             # Create the RCA pipeline
-            pipeline = create_rca_agent(project_id, location, model_name)
+            pipeline = create_rca_agent(project_id, location, model_name, context_cache=context_cache)
             
             # Set up ADK session and runner
-            session_service = InMemorySessionService()
+            session_service = get_session_service()
             
             async def create_session_async():
                 return await session_service.create_session(
@@ -79,49 +125,114 @@ if st.button("Run Root Cause Analysis"):
             runner = Runner(
                 agent=pipeline, 
                 app_name="rca_agent", 
-                session_service=session_service
+                session_service=session_service,
+                plugins=profiling_plugins(),
             )
             
-            # The initial prompt for the researcher agent
+            # The initial prompt for the researcher agent, led by the evidence bundle when a detected incident is picked
+            if investigate == "ServiceNow ticket":
+                prompt = incident_prompt(ticket_date())
+            else:
+                candidate = candidates[investigate_options.index(investigate) - 1]
+                # Point the researcher at every log the detector read, so it can check the evidence at its source
+                prompt = incident_prompt(f"{candidate.start:%Y-%m-%d}", evidence=candidate.to_prompt(),
+                                         log_files=DETECTOR_LOGS)
             user_content = types.Content(
                 role='user', 
-                parts=[types.Part(text="Analyze the logs from ['data/servicenow_incidents.csv', 'data/versa_sdwan_logs.csv']")]
+                parts=[types.Part(text=prompt)]
             )
             
             researcher_output = ""
+            weather_output = ""
             hypothesis_output = ""
             dispatcher_output = ""
+
+            # Lay out the result panes first so each agent's answer streams into place
+            with col2:
+                st.subheader("Agent Analysis")
+                with st.expander("Researcher's Findings", expanded=True):
+                    researcher_placeholder = st.empty()
+                with st.expander("Weather Context", expanded=True):
+                    weather_placeholder = st.empty()
+                with st.expander("Hypothesis", expanded=True):
+                    hypothesis_placeholder = st.empty()
+
+                st.subheader("Final Recommendation")
+                dispatcher_placeholder = st.empty()
+                latency_caption = st.empty()
+
+            placeholders = {
+                "NetworkLogResearcher": researcher_placeholder,
+                "WeatherResearcher": weather_placeholder,
+                "NetworkAnalyst": hypothesis_placeholder,
+                "DispatchCoordinator": dispatcher_placeholder,
+            }
+            streamed_text = {author: "" for author in placeholders}
             
             with st.status("Running Root Cause Analysis Pipeline...", expanded=True) as main_status:
+                run_started_at = time.perf_counter()
+                first_token_s = None
+                critical_path = None
+                # The log and weather researchers run in parallel, so their events interleave
+                started_authors = []
+
+                # SSE streaming yields partial events with text deltas before each aggregated final event
                 events = runner.run(
                     user_id="user1", 
                     session_id=session.id, 
-                    new_message=user_content
+                    new_message=user_content,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE)
                 )
                 
                 for event in events:
-                    if event.author == "NetworkLogResearcher":
-                        if event.is_final_response() and event.content:
+                    profiled_run = event.invocation_id
+                    if event.author in placeholders and event.author not in started_authors:
+                        started_authors.append(event.author)
+                        main_status.update(label=f"Running {event.author}...")
+                        st.write(f"🔄 **{event.author}** started")
+
+                    if event.actions.state_delta.get("critical_path"):
+                        critical_path = event.actions.state_delta["critical_path"]
+
+                    for call in event.get_function_calls():
+                        st.write(f"⚡ **{event.author}** calling `{call.name}` with `{call.args}`")
+
+                    if event.author not in placeholders or not event.content or not event.content.parts:
+                        continue
+                    text = "".join(part.text for part in event.content.parts if part.text)
+                    if not text:
+                        continue
+
+                    if first_token_s is None:
+                        first_token_s = time.perf_counter() - run_started_at
+                        latency_caption.caption(f"⏱️ First token after {first_token_s:.2f}s")
+
+                    if event.partial:
+                        streamed_text[event.author] += text
+                        placeholders[event.author].markdown(streamed_text[event.author])
+                    elif event.is_final_response():
+                        streamed_text[event.author] = ""
+                        if event.author == "NetworkLogResearcher":
                             researcher_output = event.content.parts[0].text
-                    elif event.author == "NetworkAnalyst":
-                        if event.is_final_response() and event.content:
+                            researcher_placeholder.write(researcher_output)
+                        elif event.author == "WeatherResearcher":
+                            weather_output = event.content.parts[0].text
+                            weather_placeholder.write(weather_output)
+                        elif event.author == "NetworkAnalyst":
                             hypothesis_output = event.content.parts[0].text
-                    elif event.author == "DispatchCoordinator":
-                        if event.is_final_response() and event.content:
+                            hypothesis_placeholder.write(hypothesis_output)
+                        elif event.author == "DispatchCoordinator":
                             dispatcher_output = event.content.parts[0].text
                 
                 main_status.update(label="Pipeline Complete", state="complete")
 
             with col2:
-                st.subheader("Agent Analysis")
-                with st.expander("Researcher's Findings", expanded=True):
-                    st.write(researcher_output)
-                
-                with st.expander("Hypothesis", expanded=True):
-                    st.write(hypothesis_output)
-                
-                st.subheader("Final Recommendation")
-                st.success(dispatcher_output)
+                dispatcher_placeholder.success(dispatcher_output)
+                first_token_label = f"{first_token_s:.2f}s" if first_token_s is not None else "n/a"
+                latency_caption.caption(f"⏱️ First token after {first_token_label} · Complete after {time.perf_counter() - run_started_at:.2f}s")
+                if critical_path:
+                    path = " → ".join(f"{step['stage']} ({step['duration_s']:.2f}s)" for step in critical_path["critical_path"])
+                    st.caption(f"🧭 Critical path: {path} · {critical_path['sequential_s']:.2f}s of agent time in {critical_path['total_s']:.2f}s")
 
                 st.write("Would you like to submit this recommendation?")
                 if st.button("Submit Recommendation"):
@@ -129,4 +240,13 @@ if st.button("Run Root Cause Analysis"):
 
         except Exception as e:
             st.error(f"An error occurred: {e}")
-            st.exception(e)
\ No newline at end of file
+            st.exception(e)
+
+# This run's hot spots, without other sessions' calls; the files in .profiles/ accumulate every run's
+if profiling_enabled() and profiled_run is not None:
+    rows = get_profiler().report(top=5, run=profiled_run)
+    profile_dir = get_profiler().save()
+    profile_report.caption("  \n".join(hot_spots(rows) + [f"Flamegraph: {profile_dir / 'profile.speedscope.json'}"]))
+
+# The page is on screen; load ADK and the Vertex AI SDK before the first run needs them
+warm_up(preload)
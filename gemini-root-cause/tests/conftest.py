@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# `agents` is imported as a package from the project folder, as when the app runs from it
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(PROJECT_DIR), str(PROJECT_DIR.parent)]
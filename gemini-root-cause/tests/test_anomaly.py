@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from agents.anomaly import detect_incidents, load_events
+
+
+def write_logs(path, rows):
+    pd.DataFrame(rows, columns=["timestamp", "site_id", "log_level", "message"]).to_csv(path, index=False)
+    return path
+
+
+def test_empty_messages_get_no_category(tmp_path):
+    path = write_logs(tmp_path / "logs.csv", [
+        ("2025-07-24 07:45:00", "SITE-01", "WARN", "VPN tunnel flap detected."),
+        ("2025-07-24 07:46:00", "SITE-02", "WARN", ""),
+        ("2025-07-24 07:47:00", "SITE-03", "WARN", "High latency on primary link."),
+    ])
+    events = load_events([path])
+    assert list(events["site"]) == ["SITE-01", "SITE-03"]
+    assert list(events["category"]) == ["tunnel", "latency"]
+
+
+def test_a_burst_across_sites_is_one_incident(tmp_path):
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2025-07-24 06:00")
+    rows = [(start + pd.Timedelta(minutes=int(minute)), f"SITE-{site:02d}", "WARN", "Intermittent packet loss detected.")
+            for minute in range(180) for site in range(20) if rng.random() < 0.02]
+    # A storm of tunnel flaps at 8 sites between 08:00 and 08:05
+    rows += [(start + pd.Timedelta(minutes=120 + minute), f"SITE-{site:02d}", "ERROR", "VPN tunnel flap detected.")
+             for minute in range(5) for site in range(8) for _ in range(3)]
+    incidents = detect_incidents([write_logs(tmp_path / "logs.csv", sorted(rows))])
+
+    assert len(incidents) == 1
+    incident = incidents[0]
+    assert sorted(incident.sites) == [f"SITE-{site:02d}" for site in range(8)]
+    assert incident.start == pd.Timestamp("2025-07-24 08:00")
+    assert incident.event_counts["tunnel"] == 8 * 5 * 3
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from agents.logstore import LogStore, template
+
+MESSAGES = [
+    "VRRP group 1 on eth1 changed state from master to backup",
+    "VRRP group 12 on eth1 changed state from master to backup",
+    "Tunnel 0x1F to 10.0.0.1 down",
+    "a <*> literal 5",
+    "<*>",
+    "",
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    csv = tmp_path / "logs.csv"
+    pd.DataFrame({
+        "timestamp": pd.date_range("2025-07-24 09:00", periods=len(MESSAGES), freq="1min").astype(str),
+        "site_id": ["SITE-01", "SITE-02"] * (len(MESSAGES) // 2),
+        "message": MESSAGES,
+    }).to_csv(csv, index=False)
+    return LogStore.build([csv], tmp_path / "logs.logstore", chunksize=4)
+
+
+def test_variants_of_a_line_share_a_template():
+    assert template(MESSAGES[0])[0] == template(MESSAGES[1])[0] == "VRRP group <*> on eth1 changed state from master to backup"
+
+
+def test_messages_round_trip_including_literal_placeholders(store):
+    assert [store.render(code) for code in range(len(MESSAGES))] == MESSAGES
+    assert list(LogStore.open(store.directory).frame()["message"].astype(str)) == MESSAGES
+
+
+def test_time_ranges_select_rows(store):
+    rows = store.between("2025-07-24 09:01", "2025-07-24 09:03")
+    assert list(store.frame(rows)["site_id"].astype(str)) == ["SITE-02", "SITE-01"]
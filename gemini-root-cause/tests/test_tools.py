@@ -0,0 +1,38 @@
+import pytest
+
+from agents.agent import DETECTOR_LOGS, PROJECT_DIR, _resolve, detect_log_anomalies, incident_prompt, read_logs, ticket_date
+
+
+def test_relative_paths_resolve_against_the_project_folder():
+    assert _resolve("data/weather.csv") == PROJECT_DIR / "data" / "weather.csv"
+
+
+@pytest.mark.parametrize("path", ["/etc/passwd", "../README.md", "data/../../shared/sessions.py"])
+def test_paths_outside_the_project_folder_are_refused(path):
+    with pytest.raises(PermissionError):
+        _resolve(path)
+
+
+def test_tools_report_refused_paths_instead_of_reading_them():
+    assert "Access denied" in read_logs(["/etc/passwd"])
+    assert "root:" not in read_logs(["/etc/passwd"])
+    assert detect_log_anomalies(["../README.md"]).startswith("Access denied")
+
+
+def test_tools_still_read_project_files():
+    logs = read_logs(["data/weather.csv"])
+    assert logs.startswith("--- data/weather.csv ---")
+    assert "Access denied" not in logs and "File not found" not in logs
+
+
+def test_incident_prompt_states_the_date_and_location_for_the_weather_stage():
+    assert ticket_date() == "2025-07-24"
+    prompt = incident_prompt("2025-08-02", "Edmonton", evidence="Detected incident: 3 sites anomalous")
+    assert prompt.startswith("Detected incident: 3 sites anomalous\n\n")
+    assert "Incident date: 2025-08-02. Affected location: Edmonton." in prompt
+
+
+def test_detected_incidents_point_the_researcher_at_the_detector_logs():
+    assert "['data/servicenow_incidents.csv', 'data/versa_sdwan_logs.csv']" in incident_prompt("2025-07-24")
+    prompt = incident_prompt("2025-07-24", evidence="Detected incident", log_files=DETECTOR_LOGS)
+    assert "'data/versa_networks.csv'" in prompt and "'data/versa_sdwan_logs.csv'" in prompt
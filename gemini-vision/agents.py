@@ -1,18 +1,75 @@
 import os
+import sys
 import json
-import vertexai
-from google.adk.agents import Agent, SequentialAgent
-from vertexai.preview.generative_models import (
-    GenerativeModel,
-    Part,
-    GenerationConfig,
-    Image,
-)
-from pydantic import BaseModel, Field
-from typing import List
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+from pydantic import BaseModel
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.profiling import profiled
+from corridor import LABEL_TOKENS, OUTPUT_TOKENS_PER_FRAME, image_tokens
+from results import (OUTPUT_KEYS, CorridorRiskAssessment, CorridorScoutOutput, DispatcherOutput, RiskAssessment,
+                     ScoutOutput)
+
+# ADK and the Vertex AI SDK take seconds to import, so they are imported where
+# a pipeline is built or run; preload() does that ahead of time
+if TYPE_CHECKING:
+    from google.adk.agents import SequentialAgent
+    from google.adk.models import BaseLlm
+
+# The Vertex AI SDK class analyze_aerial_image calls, resolved on first use.
+# The benchmarks and the service swap it for a replay stand-in.
+GenerativeModel = None
+
+PROJECT_DIR = Path(__file__).resolve().parent
+ASSETS_DIR = PROJECT_DIR / "assets"
+# Uploaded images are written here, by the app and by the service
+UPLOAD_DIR = Path(tempfile.gettempdir()) / "skyguard-uploads"
+
+
+def _generative_model_class():
+    global GenerativeModel
+    if GenerativeModel is None:
+        from vertexai.preview.generative_models import GenerativeModel
+    return GenerativeModel
+
+
+async def _generate(model_name: str, contents: list, tokens: int):
+    """Asks for a JSON answer, queued with every other Gemini call in the process so batches stay under quota."""
+    from vertexai.preview.generative_models import GenerationConfig
+    from shared.scheduler import UNTHROTTLED, get_scheduler
+
+    model = _generative_model_class()(model_name)
+    call = lambda: model.generate_content_async(
+        contents, generation_config=GenerationConfig(response_mime_type="application/json"))
+    # Replayed responses come from disk, so only the quota is lifted
+    quota = UNTHROTTLED if getattr(model, "mode", None) == "replay" else None
+    return await get_scheduler().call(model_name, call, tokens=tokens, quota=quota)
+
+
+def _resolve(path: str) -> Path:
+    # Paths come from the model (and, behind the service, from the prompt), so
+    # only the bundled assets and uploads can be read, ".." and symlinks included
+    resolved = (PROJECT_DIR / path).resolve()
+    if not any(resolved.is_relative_to(folder.resolve()) for folder in (ASSETS_DIR, UPLOAD_DIR)):
+        raise PermissionError(f"{path} is outside the assets and upload folders")
+    return resolved
+
+
+def preload():
+    """Imports what a pipeline run needs and initializes the Vertex AI SDK, for `shared.warmup.warm_up`."""
+    import google.adk.runners
+    from google.adk.agents import Agent, SequentialAgent
+    from shared.scheduler import init_vertexai
+    _generative_model_class()
+    init_vertexai(os.environ.get("GOOGLE_CLOUD_PROJECT"), os.environ.get("GOOGLE_CLOUD_LOCATION"))
 
 
 # Mock Permit Database Tool
+@profiled
 def check_permit_database(gps_location: str) -> dict:
     """Checks the permit database for a given GPS location.
 
@@ -42,7 +99,8 @@ def check_permit_database(gps_location: str) -> dict:
 
 
 # Vision Analysis Function Tool - Uses genai client
-def analyze_aerial_image(image_path: str, model_name: str = "gemini-2.5-flash") -> dict:
+@profiled
+async def analyze_aerial_image(image_path: str, model_name: str = "gemini-2.5-flash") -> dict:
     """Analyzes an aerial image for energy infrastructure monitoring.
 
     Args:
@@ -53,13 +111,15 @@ def analyze_aerial_image(image_path: str, model_name: str = "gemini-2.5-flash")
         dict: A dictionary with 'scene_description' (string) and 'detected_objects' (list of strings).
     """
     try:
-        project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
-        location = os.environ.get("GOOGLE_CLOUD_LOCATION")
+        from vertexai.preview.generative_models import Part
+        from shared.scheduler import DEFAULT_OUTPUT_TOKENS, init_vertexai
 
-        vertexai.init(project=project_id, location=location)
+        # Initializes the SDK on the first image only
+        init_vertexai(os.environ.get("GOOGLE_CLOUD_PROJECT"), os.environ.get("GOOGLE_CLOUD_LOCATION"))
 
         # Read image
-        with open(image_path, "rb") as f:
+        path = _resolve(image_path)
+        with open(path, "rb") as f:
             image_bytes = f.read()
 
         prompt = (
@@ -75,26 +135,103 @@ def analyze_aerial_image(image_path: str, model_name: str = "gemini-2.5-flash")
         if image_path.lower().endswith((".jpg", ".jpeg")):
             mime_type = "image/jpeg"
 
-        model = GenerativeModel(model_name)
-        response = model.generate_content(
-            [Part.from_data(data=image_bytes, mime_type=mime_type), prompt],
-            generation_config=GenerationConfig(response_mime_type="application/json"),
-        )
+        response = await _generate(model_name, [Part.from_data(data=image_bytes, mime_type=mime_type), prompt],
+                                   tokens=image_tokens(str(path)) + len(prompt) // 4 + DEFAULT_OUTPUT_TOKENS)
 
-        # Parse the JSON response
-        return json.loads(response.text)
+        # Parse and validate the JSON response in one pass
+        return ScoutOutput.model_validate_json(response.text).model_dump()
     except Exception as e:
         return {"error": str(e), "scene_description": "", "detected_objects": []}
 
+
+# What the model answers per frame in a corridor request; frames are referred to by index
+class _FrameObservation(ScoutOutput):
+    frame_index: int
+
+
+class _CorridorObservation(BaseModel):
+    frames: List[_FrameObservation]
+
+
+# Corridor Vision Function Tool - One request for a segment of adjacent frames
+@profiled
+async def analyze_corridor_segment(image_paths: list[str], model_name: str = "gemini-2.5-flash") -> dict:
+    """Analyzes consecutive aerial frames of one infrastructure corridor in a single request.
+
+    Args:
+        image_paths (list[str]): Paths of the frames, in flight order.
+        model_name (str): The Gemini model to use for analysis.
+
+    Returns:
+        dict: A dictionary with 'frames', a list with the 'frame' path, 'scene_description' and 'detected_objects' of each frame.
+    """
+    try:
+        from vertexai.preview.generative_models import Part
+        from shared.scheduler import init_vertexai
+
+        init_vertexai(os.environ.get("GOOGLE_CLOUD_PROJECT"), os.environ.get("GOOGLE_CLOUD_LOCATION"))
+
+        prompt = (
+            "You are an expert aerial surveyor for energy infrastructure. "
+            f"The {len(image_paths)} images above are consecutive frames along one right-of-way corridor, "
+            "in flight order, each preceded by its frame index. "
+            "For every frame, provide a detailed scene description (weather, terrain, lighting) "
+            "and a structured list of potential risks or objects (vehicles, heavy machinery, digging activity, people, livestock). "
+            "Use neighbouring frames as context, e.g. a trench or machine that continues across frames, "
+            "but list an object only for the frames it appears in. "
+            "Output JSON with key 'frames': a list with one entry per frame, each with keys "
+            "'frame_index' (integer), 'scene_description' (string) and 'detected_objects' (list of strings)."
+        )
+
+        paths = [_resolve(image_path) for image_path in image_paths]
+        contents = []
+        for index, (image_path, path) in enumerate(zip(image_paths, paths)):
+            with open(path, "rb") as f:
+                image_bytes = f.read()
+            mime_type = "image/jpeg" if image_path.lower().endswith((".jpg", ".jpeg")) else "image/png"
+            contents += [f"Frame {index}: {Path(image_path).name}", Part.from_data(data=image_bytes, mime_type=mime_type)]
+        contents.append(prompt)
+
+        response = await _generate(model_name, contents,
+                                   tokens=(len(prompt) // 4 + sum(image_tokens(str(path)) for path in paths)
+                                           + len(image_paths) * (LABEL_TOKENS + OUTPUT_TOKENS_PER_FRAME)))
+
+        observations = {o.frame_index: o for o in _CorridorObservation.model_validate_json(response.text).frames}
+        frames = []
+        for index, image_path in enumerate(image_paths):
+            observation = observations.get(index)
+            if observation is None:
+                frames.append({"frame": image_path, "scene_description": "Not covered by the model's answer.", "detected_objects": []})
+            else:
+                frames.append({"frame": image_path, **observation.model_dump(exclude={"frame_index"})})
+        return {"frames": frames}
+    except Exception as e:
+        return {"error": str(e), "frames": []}
+
 # Scout Agent - Uses vision analysis tool
-def get_scout_agent(model_name="gemini-2.5-flash"):
-    class ScoutOutput(BaseModel):
-        scene_description: str = Field(description="Detailed description of the scene including weather, terrain, and lighting conditions.")
-        detected_objects: List[str] = Field(description="List of detected objects or potential risks in the image.")
-    
+def get_scout_agent(model_name="gemini-2.5-flash", corridor: bool = False):
+    from google.adk.agents import Agent
+    from shared.scheduler import scheduled_model
+
+    if corridor:
+        return Agent(
+            name="scout_agent",
+            model=scheduled_model(model_name),
+            description="Aerial surveyor analyzing a corridor of infrastructure images.",
+            instruction=(
+                "You are an expert aerial surveyor for energy infrastructure. "
+                "Use the 'analyze_corridor_segment' tool once, with all the frame paths provided, in the order given. "
+                "The tool will return a scene description and list of detected objects for each frame. "
+                "Present the results for every frame, keeping each frame's path exactly as returned."
+            ),
+            tools=[analyze_corridor_segment],
+            output_schema=CorridorScoutOutput,
+            output_key=OUTPUT_KEYS["scout_agent"]
+        )
+
     return Agent(
         name="scout_agent",
-        model=model_name,
+        model=scheduled_model(model_name),
         description="Aerial surveyor analyzing infrastructure images.",
         instruction=(
             "You are an expert aerial surveyor for energy infrastructure. "
@@ -104,53 +241,85 @@ def get_scout_agent(model_name="gemini-2.5-flash"):
         ),
         tools=[analyze_aerial_image],
         output_schema=ScoutOutput,
-        output_key="scout_results"
+        output_key=OUTPUT_KEYS["scout_agent"]
     )
 
 
+# The risk officer's rules, for a single image and for a corridor segment alike
+RISK_RULES = (
+    "ASSUME BENIGN CONDITIONS for typical rural scenes:\n"
+    "- Livestock (cows, horses, etc.) are normal and expected - risk is LOW\n"
+    "- Standard vehicles on roads or farm vehicles (pickups, tractors, combines) are normal - risk is LOW\n"
+    "- Clear weather and typical terrain features are normal - risk is LOW\n\n"
+    "ONLY check permits using 'check_permit_database' if you detect unusual activities such as:\n"
+    "- Heavy machinery (excavators, backhoes, bulldozers)\n"
+    "- Digging or excavation activity\n"
+    "- Unexpected vehicles or equipment out of place for a rural setting\n"
+    "- Suspicious or unauthorized activities near infrastructure\n\n"
+    "If you need to check permits:\n"
+    "- Use the tool to retrieve active permits\n"
+    "- Compare detected activities against permitted activities (Vegetation Management, ATV Based Inspection)\n"
+    "- If activity matches permits, risk is LOW\n"
+    "- If activity does NOT match any permits, risk is HIGH\n\n"
+)
+
+
 # Risk Agent - Reasoning + Tool with state injection
-def get_risk_agent(model_name="gemini-2.5-flash"):
-    class RiskAssessment(BaseModel):
-        risk_level: str = Field(description="Risk level assessment: either 'High' or 'Low'.")
-        reasoning: str = Field(description="Detailed explanation of the risk assessment decision.")
-    
+def get_risk_agent(model_name="gemini-2.5-flash", corridor: bool = False, context_cache: bool = False):
+    from google.adk.agents import Agent
+    from shared.context_cache import model_callbacks, split_instruction
+    from shared.scheduler import scheduled_model
+
+    # The scout's results change with every image; with context_cache the rules
+    # after them are cached once instead (see shared/context_cache.py)
+    if corridor:
+        return Agent(
+            name="risk_agent",
+            model=scheduled_model(model_name),
+            description="Risk assessment officer checking compliance along a corridor segment.",
+            **split_instruction(
+                "You are a risk assessment officer. "
+                "Review the scout's analysis of consecutive frames along one corridor segment: {scout_results}\n\n"
+                "Assess the segment as a whole: activity that spans frames, such as a trench or a machine moving "
+                "along the line, is one activity.\n\n",
+                RISK_RULES +
+                "Output a structured assessment with 'risk_level' (High/Low) for the segment, which is High if any frame is, "
+                "'reasoning' (string explanation naming the frames that drive it), "
+                "and 'frames': the 'frame' path and 'risk_level' of every frame.",
+                context_cache,
+            ),
+            **model_callbacks(context_cache=context_cache),
+            tools=[check_permit_database],
+            output_schema=CorridorRiskAssessment,
+            output_key=OUTPUT_KEYS["risk_agent"]
+        )
+
     return Agent(
         name="risk_agent",
-        model=model_name,
+        model=scheduled_model(model_name),
         description="Risk assessment officer checking compliance.",
-        instruction=(
+        **split_instruction(
             "You are a risk assessment officer. "
-            "Review the scout's analysis: {scout_results}\n\n"
-            "ASSUME BENIGN CONDITIONS for typical rural scenes:\n"
-            "- Livestock (cows, horses, etc.) are normal and expected - risk is LOW\n"
-            "- Standard vehicles on roads or farm vehicles (pickups, tractors, combines) are normal - risk is LOW\n"
-            "- Clear weather and typical terrain features are normal - risk is LOW\n\n"
-            "ONLY check permits using 'check_permit_database' if you detect unusual activities such as:\n"
-            "- Heavy machinery (excavators, backhoes, bulldozers)\n"
-            "- Digging or excavation activity\n"
-            "- Unexpected vehicles or equipment out of place for a rural setting\n"
-            "- Suspicious or unauthorized activities near infrastructure\n\n"
-            "If you need to check permits:\n"
-            "- Use the tool to retrieve active permits\n"
-            "- Compare detected activities against permitted activities (Vegetation Management, ATV Based Inspection)\n"
-            "- If activity matches permits, risk is LOW\n"
-            "- If activity does NOT match any permits, risk is HIGH\n\n"
-            "Output a structured assessment with 'risk_level' (High/Low) and 'reasoning' (string explanation)."
+            "Review the scout's analysis: {scout_results}\n\n",
+            RISK_RULES +
+            "Output a structured assessment with 'risk_level' (High/Low) and 'reasoning' (string explanation).",
+            context_cache,
         ),
+        **model_callbacks(context_cache=context_cache),
         tools=[check_permit_database],
         output_schema=RiskAssessment,
-        output_key="risk_assessment"
+        output_key=OUTPUT_KEYS["risk_agent"]
     )
 
 
 # Dispatcher Agent - Action with state injection
 def get_dispatcher_agent(model_name="gemini-2.5-flash"):
-    class DispatcherOutput(BaseModel):
-        message: str = Field(description="The final output message - either an urgent SMS alert or a standard log entry.")
-    
+    from google.adk.agents import Agent
+    from shared.scheduler import scheduled_model
+
     return Agent(
         name="dispatcher_agent",
-        model=model_name,
+        model=scheduled_model(model_name),
         description="Operations dispatcher generating alerts.",
         instruction=(
             "You are an operations dispatcher. "
@@ -160,23 +329,30 @@ def get_dispatcher_agent(model_name="gemini-2.5-flash"):
             "- If Risk is LOW, generate a standard log entry."
         ),
         output_schema=DispatcherOutput,
-        output_key="final_action"
+        output_key=OUTPUT_KEYS["dispatcher_agent"]
     )
 
 
 # Sequential Agent Pipeline
-def get_infrastructure_monitoring_pipeline(model_name: str = "gemini-2.5-flash"):
+def get_infrastructure_monitoring_pipeline(model_name: str = "gemini-2.5-flash", model: Optional["BaseLlm"] = None,
+                                           corridor: bool = False, context_cache: bool = False) -> "SequentialAgent":
     """Creates a sequential agent pipeline for infrastructure monitoring.
     
     Args:
         model_name (str): The Gemini model to use for analysis.
+        model (BaseLlm, optional): A pre-built model (e.g. a replay stand-in) used instead of `model_name`.
+        corridor (bool): Analyze a segment of adjacent frames per run instead of one image (see corridor.py).
+        context_cache (bool): Cache the risk officer's rules once instead of sending them with every image.
+            At ~250 tokens they are below Vertex AI's 2,048-token minimum, so for now they are still sent as they are.
 
     Returns:
         SequentialAgent: A pipeline that sequentially executes scout, risk, and dispatcher agents.
     """
-    scout_agent = get_scout_agent(model_name=model_name)
-    risk_agent = get_risk_agent(model_name=model_name)
-    dispatcher_agent = get_dispatcher_agent(model_name=model_name)
+    from google.adk.agents import SequentialAgent
+
+    scout_agent = get_scout_agent(model_name=model or model_name, corridor=corridor)
+    risk_agent = get_risk_agent(model_name=model or model_name, corridor=corridor, context_cache=context_cache)
+    dispatcher_agent = get_dispatcher_agent(model_name=model or model_name)
     
     return SequentialAgent(
         name="infrastructure_monitoring_pipeline",
@@ -188,5 +364,5 @@ def get_infrastructure_monitoring_pipeline(model_name: str = "gemini-2.5-flash")
 # Backward compatibility: keep the old function for existing code
 def run_scout_agent(image_path, model_name="gemini-2.5-flash"):
     """Legacy function for backward compatibility. Use get_infrastructure_monitoring_pipeline() for new code."""
-    result = analyze_aerial_image(image_path, model_name)
+    result = asyncio.run(analyze_aerial_image(image_path, model_name))
     return json.dumps(result)
@@ -1,16 +1,27 @@
 import streamlit as st
 import os
-import json
+import tempfile
 from dotenv import load_dotenv
-from agents import run_scout_agent, get_infrastructure_monitoring_pipeline
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
+from agents import UPLOAD_DIR, get_infrastructure_monitoring_pipeline, preload
+from corridor import Frame, segment_message
+from results import OUTPUT_KEYS, SkyGuardResult, corridor_results
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.profiling import get_profiler, hot_spots, profiling_enabled, profiling_plugins
+from shared.warmup import warm_up
+import time
 
 # Load environment variables from .env file in the same directory as this script
 env_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path=env_path)
 
+@st.cache_resource
+def get_session_service():
+    from shared.sessions import SqliteSessionService
+    # Sessions persist in .sessions/ across reruns and restarts
+    return SqliteSessionService()
+
 # Page Config
 st.set_page_config(page_title="SkyGuard ROW Monitor", layout="wide")
 
@@ -30,10 +41,29 @@ with st.sidebar:
 
     st.header("Scenario Selector")
     scenario = st.radio("Choose a Scenario:", ["Clear", "Farm", "Excavator"])
+    corridor_mode = st.checkbox(
+        "Corridor mode",
+        help="Analyze every scenario frame, and the upload, as one corridor segment in a single vision request."
+    )
+    context_cache = st.checkbox(
+        "Cache risk rules",
+        help="Send the risk officer's rules once as a Vertex AI context cache instead of with every image. "
+             "They are below the 2,048-token minimum Vertex AI caches, so this has no effect yet."
+    )
     
     st.header("Custom Upload")
     uploaded_file = st.file_uploader("Upload an aerial image", type=["png", "jpg", "jpeg"])
 
+    st.header("Profiling")
+    # Set for the whole process with AGENT_PROFILE=1: a per-session toggle would turn it off for everyone else
+    if profiling_enabled():
+        st.caption("Tools and callbacks are profiled (AGENT_PROFILE=1). This run's hot spots appear here, "
+                   "and every run is merged into .profiles/.")
+    else:
+        st.caption("Off. Start the app with AGENT_PROFILE=1 to profile tools and callbacks.")
+    profile_report = st.empty()
+    profiled_run = None
+
 # Main Layout
 col1, col2, col3 = st.columns(3)
 
@@ -53,19 +83,28 @@ image_path = None
 temp_image_path = None
 
 if uploaded_file:
-    # Save uploaded file to temp path for reading
-    temp_image_path = f"temp_{uploaded_file.name}"
-    with open(temp_image_path, "wb") as f:
+    # Save uploaded file to temp path for reading; the vision tools only read the assets and this folder
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=Path(uploaded_file.name).suffix, delete=False) as f:
         f.write(uploaded_file.getbuffer())
+    temp_image_path = f.name
     image_path = temp_image_path
     st.toast("Using uploaded image")
 else:
     image_path = load_asset(scenario)
 
+# In corridor mode the scenario frames stand in for consecutive frames of one sweep
+frame_paths = [path for path in (load_asset(name) for name in ["Clear", "Farm", "Excavator"]) if path]
+if temp_image_path:
+    frame_paths.append(temp_image_path)
+
 # Column 1: The View
 with col1:
     st.header("The View")
-    if image_path and os.path.exists(image_path):
+    if corridor_mode and frame_paths:
+        for index, path in enumerate(frame_paths):
+            st.image(path, caption=f"Frame {index}: {Path(path).name}", width="stretch")
+    elif image_path and os.path.exists(image_path):
         st.image(image_path, caption="Aerial Feed", width="stretch")
     else:
         st.warning(f"Image not found: {image_path}")
@@ -73,17 +112,24 @@ with col1:
 
 # Execution Button
 if st.button("Analyze Sector"):
-    if not image_path or not os.path.exists(image_path):
+    if corridor_mode and not frame_paths:
+        st.error("No scenario frames found for corridor mode.")
+    elif not corridor_mode and (not image_path or not os.path.exists(image_path)):
         st.error("Please select or upload a valid image.")
     else:
         try:
             import asyncio
+            # Usually already imported by the warm-up
+            from google.adk.agents.run_config import RunConfig, StreamingMode
+            from google.adk.runners import Runner
+            from google.genai import types
             
             # Create the sequential agent pipeline
-            pipeline = get_infrastructure_monitoring_pipeline(model_name=selected_model)
+            pipeline = get_infrastructure_monitoring_pipeline(model_name=selected_model, corridor=corridor_mode,
+                                                              context_cache=context_cache)
             
             # Set up ADK session and runner using async
-            session_service = InMemorySessionService()
+            session_service = get_session_service()
             
             # Use asyncio to create session properly
             async def create_session_async():
@@ -97,80 +143,121 @@ if st.button("Analyze Sector"):
             runner = Runner(
                 agent=pipeline, 
                 app_name="infrastructure_monitoring_pipeline", 
-                session_service=session_service
+                session_service=session_service,
+                plugins=profiling_plugins(),
             )
             
-            # Create user message with the image path
+            # Create user message with the image path, or the frame paths of the segment
+            if corridor_mode:
+                message = segment_message([Frame(path) for path in frame_paths])
+            else:
+                message = f"Please analyze this aerial image: {image_path}"
             user_content = types.Content(
                 role='user', 
-                parts=[types.Part(text=f"Please analyze this aerial image: {image_path}")]
+                parts=[types.Part(text=message)]
             )
             
-            # Run the sequential pipeline and collect outputs
-            scout_output = ""
-            risk_assessment_text = ""
-            final_alert_text = ""
+            # Each agent's validated answer, as ADK writes it to session state
+            state = {}
+
+            # Lay out the result panes first so each agent's output streams into place
+            with col2:
+                st.header("The Brain")
+                with st.expander("Scout Analysis", expanded=True):
+                    st.write("**Scout Output:**")
+                    scout_placeholder = st.empty()
+                    scout_placeholder.info("Scout analysis in progress...")
+                with st.expander("Risk Assessment", expanded=True):
+                    st.write("**Risk Officer Output:**")
+                    risk_placeholder = st.empty()
+                    risk_placeholder.info("Risk assessment in progress...")
+
+            with col3:
+                st.header("The Action")
+                with st.expander("Dispatcher Alert", expanded=True):
+                    alert_placeholder = st.empty()
+                    alert_placeholder.info("Generating alert...")
+                latency_caption = st.empty()
+
+            placeholders = {
+                "scout_agent": scout_placeholder,
+                "risk_agent": risk_placeholder,
+                "dispatcher_agent": alert_placeholder,
+            }
+            streamed_text = {author: "" for author in placeholders}
             
             with st.status("Running Infrastructure Monitoring Pipeline...", expanded=True) as main_status:
+                run_started_at = time.perf_counter()
+                first_token_s = None
+                current_author = None
+
+                # SSE streaming yields partial events with text deltas before each aggregated final event
                 events = runner.run(
                     user_id="user1", 
                     session_id=session.id, 
-                    new_message=user_content
+                    new_message=user_content,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE)
                 )
                 
                 for event in events:
+                    profiled_run = event.invocation_id
                     # Track which agent is currently active
-                    if event.author == "scout_agent":
-                        if event.is_final_response() and event.content:
-                            scout_output = event.content.parts[0].text
-                    elif event.author == "risk_agent":
-                        if event.is_final_response() and event.content:
-                            risk_assessment_text = event.content.parts[0].text
-                    elif event.author == "dispatcher_agent":
-                        if event.is_final_response() and event.content:
-                            final_alert_text = event.content.parts[0].text
+                    if event.author in placeholders and event.author != current_author:
+                        current_author = event.author
+                        main_status.update(label=f"Running {current_author}...")
+                        st.write(f"🔄 **{current_author}** started")
+
+                    for call in event.get_function_calls():
+                        st.write(f"⚡ **{event.author}** calling `{call.name}` with `{call.args}`")
+
+                    state.update(event.actions.state_delta)
+                    if event.author not in placeholders or not event.content or not event.content.parts:
+                        continue
+                    text = "".join(part.text for part in event.content.parts if part.text)
+                    if not text:
+                        continue
+
+                    if first_token_s is None:
+                        first_token_s = time.perf_counter() - run_started_at
+                        latency_caption.caption(f"⏱️ First token after {first_token_s:.2f}s")
+
+                    if event.partial:
+                        # Structured outputs arrive as JSON fragments; show them raw until complete
+                        streamed_text[event.author] += text
+                        placeholders[event.author].code(streamed_text[event.author], language="json")
+                    elif event.is_final_response():
+                        streamed_text[event.author] = ""
                 
                 main_status.update(label="Pipeline Complete", state="complete")
             
-            # Display results in columns
-            with col2:
-                st.header("The Brain")
-                
-                # Scout Results
-                with st.expander("Scout Analysis", expanded=True):
-                    st.write("**Scout Output:**")
-                    if scout_output:
-                        try:
-                            # Try to parse as JSON if it looks like JSON
-                            if scout_output.strip().startswith('{'):
-                                scout_json = json.loads(scout_output)
-                                st.json(scout_json)
-                            else:
-                                st.write(scout_output)
-                        except:
-                            st.write(scout_output)
-                    else:
-                        st.info("Scout analysis in progress...")
-                
-                # Risk Assessment Results
-                with st.expander("Risk Assessment", expanded=True):
-                    st.write("**Risk Officer Output:**")
-                    if risk_assessment_text:
-                        st.write(risk_assessment_text)
-                    else:
-                        st.info("Risk assessment in progress...")
-            
-            with col3:
-                st.header("The Action")
-                with st.expander("Dispatcher Alert", expanded=True):
-                    if final_alert_text:
-                        # Determine style based on content (simple heuristic)
-                        if "STOP WORK" in final_alert_text.upper() or "HIGH" in final_alert_text.upper():
-                            st.error(final_alert_text)
-                        else:
-                            st.success(final_alert_text)
-                    else:
-                        st.info("Generating alert...")
+            # Replace the streamed fragments with the answers ADK validated and stored in state
+            if corridor_mode:
+                frame_results = corridor_results(state)
+                if frame_results:
+                    scout_placeholder.json({r.image: r.scout.model_dump() for r in frame_results})
+                # The segment's verdict drives the alert; the frames' levels are listed under it
+                result = SkyGuardResult.model_validate({
+                    "risk": state.get(OUTPUT_KEYS["risk_agent"]),
+                    "action": state.get(OUTPUT_KEYS["dispatcher_agent"]),
+                })
+            else:
+                frame_results = []
+                result = SkyGuardResult.from_state(state, image=image_path)
+                if result.scout:
+                    scout_placeholder.json(result.scout.model_dump())
+
+            if result.risk:
+                frame_levels = "".join(f"\n- {Path(r.image).name}: {r.risk.risk_level}" for r in frame_results if r.risk)
+                risk_placeholder.write(f"**Risk level:** {result.risk.risk_level}\n\n{result.risk.reasoning}\n{frame_levels}")
+
+            if result.action:
+                if result.is_high_risk:
+                    alert_placeholder.error(result.action.message)
+                else:
+                    alert_placeholder.success(result.action.message)
+
+            first_token_label = f"{first_token_s:.2f}s" if first_token_s is not None else "n/a"
+            latency_caption.caption(f"⏱️ First token after {first_token_label} · Complete after {time.perf_counter() - run_started_at:.2f}s")
                 
         except Exception as e:
             st.error(f"An error occurred: {e}")
@@ -179,3 +266,12 @@ if st.button("Analyze Sector"):
 # Cleanup temp file
 if temp_image_path and os.path.exists(temp_image_path):
     os.remove(temp_image_path)
+
+# This run's hot spots, without other sessions' calls; the files in .profiles/ accumulate every run's
+if profiling_enabled() and profiled_run is not None:
+    rows = get_profiler().report(top=5, run=profiled_run)
+    profile_dir = get_profiler().save()
+    profile_report.caption("  \n".join(hot_spots(rows) + [f"Flamegraph: {profile_dir / 'profile.speedscope.json'}"]))
+
+# The page is on screen; load ADK and the Vertex AI SDK before the first run needs them
+warm_up(preload)
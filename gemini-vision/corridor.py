@@ -0,0 +1,130 @@
+"""Corridor batching: adjacent frames of a right-of-way sweep in one vision request.
+
+A drone flying a line captures frames one after another. Analyzing each on
+its own repeats the prompt and a full scout/risk/dispatcher run per image,
+and the scout never sees that the trench at the edge of one frame continues
+into the next. In corridor mode, `plan_segments` groups consecutive frames
+into segments sized to a token budget, and `analyze_corridor_segment` (in
+agents.py) sends a segment as one multimodal request whose answer is indexed
+by frame. The risk and dispatcher agents then assess the segment as a whole.
+
+Frames stay in capture order. When their positions are known, e.g. from the
+flight log, a gap wider than `max_gap_m` starts a new segment, so frames of
+two different lines are never assessed together.
+"""
+
+import math
+import struct
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+# Gemini bills an image up to 384x384 as one tile and crops and scales
+# larger ones into 768x768 tiles, each 258 tokens
+TILE_TOKENS = 258
+TILE_PX = 768
+SMALL_IMAGE_PX = 384
+# The "Frame i: name" label that precedes each image in a segment request
+LABEL_TOKENS = 16
+# One frame's entry in the answer: a scene description and a few objects
+OUTPUT_TOKENS_PER_FRAME = 200
+
+DEFAULT_TOKEN_BUDGET = 32_000
+DEFAULT_MAX_FRAMES = 8
+DEFAULT_MAX_GAP_M = 500.0
+
+# JPEG start-of-frame markers; C4, C8 and CC share the range but are not frames
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+@dataclass(frozen=True)
+class Frame:
+    path: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+def image_size(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Reads the width and height of a JPEG or PNG from its header, without decoding it.
+
+    Returns:
+        tuple: (width, height), or None if the format is not recognized
+    """
+    with open(path, "rb") as f:
+        head = f.read(24)
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            return struct.unpack(">II", head[16:24])
+        if not head.startswith(b"\xff\xd8"):
+            return None
+        # Walk the segments up to the start-of-frame; EXIF blocks can be tens of KB
+        f.seek(2)
+        while True:
+            marker = f.read(4)
+            if len(marker) < 4 or marker[0] != 0xFF:
+                return None
+            if marker[1] in _JPEG_SOF:
+                height, width = struct.unpack(">xHH", f.read(5))
+                return width, height
+            f.seek(struct.unpack(">H", marker[2:])[0] - 2, 1)
+
+
+def image_tokens(path: str) -> int:
+    """Input tokens Gemini bills for an image, by its tiles; one tile if the size cannot be read."""
+    try:
+        size = image_size(path)
+    except OSError:
+        size = None
+    if size is None or max(size) <= SMALL_IMAGE_PX:
+        return TILE_TOKENS
+    width, height = size
+    return math.ceil(width / TILE_PX) * math.ceil(height / TILE_PX) * TILE_TOKENS
+
+
+def frame_tokens(frame: Frame) -> int:
+    """What one frame adds to a segment request: its image, its label and its share of the answer."""
+    return image_tokens(frame.path) + LABEL_TOKENS + OUTPUT_TOKENS_PER_FRAME
+
+
+def distance_m(a: Frame, b: Frame) -> Optional[float]:
+    """Great-circle distance between two frames, or None if either position is unknown."""
+    if None in (a.latitude, a.longitude, b.latitude, b.longitude):
+        return None
+    lat1, lat2 = math.radians(a.latitude), math.radians(b.latitude)
+    dlat, dlon = lat2 - lat1, math.radians(b.longitude - a.longitude)
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * 6_371_000 * math.asin(math.sqrt(h))
+
+
+def plan_segments(frames: Iterable[Frame], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                  max_frames: int = DEFAULT_MAX_FRAMES, max_gap_m: float = DEFAULT_MAX_GAP_M,
+                  prompt_tokens: int = 200) -> List[List[Frame]]:
+    """
+    Groups frames, in capture order, into corridor segments.
+
+    A segment ends when the next frame would take it over `token_budget`
+    (prompt, images, labels and answer), past `max_frames`, or more than
+    `max_gap_m` away from the previous frame. A frame over budget on its own
+    still gets a segment of its own.
+    """
+    segments, segment, tokens = [], [], prompt_tokens
+    for frame in frames:
+        cost = frame_tokens(frame)
+        gap = distance_m(segment[-1], frame) if segment else None
+        if segment and (tokens + cost > token_budget or len(segment) >= max_frames
+                        or (gap is not None and gap > max_gap_m)):
+            segments.append(segment)
+            segment, tokens = [], prompt_tokens
+        segment.append(frame)
+        tokens += cost
+    if segment:
+        segments.append(segment)
+    return segments
+
+
+def segment_message(segment: List[Frame]) -> str:
+    """The user message that starts a corridor run of the pipeline."""
+    lines = []
+    for frame in segment:
+        position = f" at {frame.latitude:.5f}, {frame.longitude:.5f}" if frame.latitude is not None and frame.longitude is not None else ""
+        lines.append(f"- {frame.path}{position}")
+    return f"Analyze this corridor segment of {len(segment)} frames, in flight order:\n" + "\n".join(lines)
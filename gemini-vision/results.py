@@ -0,0 +1,158 @@
+"""Typed results of the SkyGuard pipeline.
+
+The scout, risk and dispatcher agents answer with structured output, for
+one image or, in corridor mode, for a segment of adjacent frames (see
+`corridor.py`). ADK validates each answer against the agent's
+`output_schema` and stores it in session state under the agent's
+`output_key` as a plain dict. Results are read from there, or from the
+`state_delta` of the event that wrote them, instead of re-parsing the
+streamed text.
+
+Batch runs keep one `SkyGuardResult` per image as JSON lines. `load_results`
+parses and validates each line in pydantic-core, without an intermediate
+dict, and `summarize` rolls tens of thousands of them up in milliseconds.
+"""
+
+import gc
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Literal, Mapping, Optional, Union
+
+from pydantic import BaseModel, Field
+
+
+class ScoutOutput(BaseModel):
+    scene_description: str = Field(description="Detailed description of the scene including weather, terrain, and lighting conditions.")
+    detected_objects: List[str] = Field(description="List of detected objects or potential risks in the image.")
+
+
+class RiskAssessment(BaseModel):
+    risk_level: Literal["High", "Low"] = Field(description="Risk level assessment: either 'High' or 'Low'.")
+    reasoning: str = Field(description="Detailed explanation of the risk assessment decision.")
+
+
+class DispatcherOutput(BaseModel):
+    message: str = Field(description="The final output message - either an urgent SMS alert or a standard log entry.")
+
+
+class FrameScoutOutput(ScoutOutput):
+    frame: str = Field(description="Path of the frame, exactly as given to the analysis tool.")
+
+
+class CorridorScoutOutput(BaseModel):
+    frames: List[FrameScoutOutput] = Field(description="The analysis of every frame in the segment, in corridor order.")
+
+
+class FrameRisk(BaseModel):
+    frame: str = Field(description="Path of the frame, exactly as in the scout's analysis.")
+    risk_level: Literal["High", "Low"] = Field(description="Risk level of this frame: either 'High' or 'Low'.")
+
+
+class CorridorRiskAssessment(BaseModel):
+    risk_level: Literal["High", "Low"] = Field(description="Risk level of the whole segment: 'High' if any frame is high risk.")
+    reasoning: str = Field(description="Detailed explanation of the assessment, naming the frames that drive it.")
+    frames: List[FrameRisk] = Field(description="The risk level of every frame in the segment.")
+
+
+# Where each agent's validated answer lives in session state
+OUTPUT_KEYS = {
+    "scout_agent": "scout_results",
+    "risk_agent": "risk_assessment",
+    "dispatcher_agent": "final_action",
+}
+
+
+class SkyGuardResult(BaseModel):
+    """One image through the pipeline. Stages that did not finish are None."""
+    image: Optional[str] = None
+    scout: Optional[ScoutOutput] = None
+    risk: Optional[RiskAssessment] = None
+    action: Optional[DispatcherOutput] = None
+
+    @property
+    def is_high_risk(self) -> bool:
+        return self.risk is not None and self.risk.risk_level == "High"
+
+    @classmethod
+    def from_state(cls, state: Mapping, image: Optional[str] = None) -> "SkyGuardResult":
+        """Builds a result from session state, or from the state_deltas of a run merged together."""
+        return cls.model_validate({
+            "image": image,
+            "scout": state.get(OUTPUT_KEYS["scout_agent"]),
+            "risk": state.get(OUTPUT_KEYS["risk_agent"]),
+            "action": state.get(OUTPUT_KEYS["dispatcher_agent"]),
+        })
+
+
+def corridor_results(state: Mapping) -> List[SkyGuardResult]:
+    """
+    Splits a corridor segment's state into one result per frame, so segments
+    and single images aggregate the same way. Every frame shares the
+    segment's reasoning and dispatcher message.
+    """
+    scout = CorridorScoutOutput.model_validate(state.get(OUTPUT_KEYS["scout_agent"]) or {"frames": []})
+    risk = state.get(OUTPUT_KEYS["risk_agent"])
+    risk = CorridorRiskAssessment.model_validate(risk) if risk is not None else None
+    action = state.get(OUTPUT_KEYS["dispatcher_agent"])
+    levels = {frame.frame: frame.risk_level for frame in risk.frames} if risk else {}
+
+    results = []
+    for frame in scout.frames:
+        results.append(SkyGuardResult.model_validate({
+            "image": frame.frame,
+            "scout": frame.model_dump(exclude={"frame"}),
+            # A frame the risk officer skipped takes the segment's level
+            "risk": {"risk_level": levels.get(frame.frame, risk.risk_level), "reasoning": risk.reasoning} if risk else None,
+            "action": action,
+        }))
+    return results
+
+
+def dump_results(results: Iterable[SkyGuardResult], path: Union[str, Path]):
+    """Appends results to a JSON lines file."""
+    with open(path, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(result.model_dump_json(exclude_none=True) + "\n")
+
+
+def load_results(path: Union[str, Path]) -> List[SkyGuardResult]:
+    """Reads a JSON lines file of results, validating every line against the schemas."""
+    lines = Path(path).read_bytes().splitlines()
+    # Hundreds of thousands of new objects would trigger a cyclic GC pass every
+    # few hundred lines, each over everything loaded so far: 3-4x the parse time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return [SkyGuardResult.model_validate_json(line) for line in lines if line.strip()]
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@dataclass
+class BatchSummary:
+    images: int = 0
+    high_risk: int = 0
+    low_risk: int = 0
+    # Images whose risk stage never produced an answer
+    incomplete: int = 0
+    detected_objects: Counter = field(default_factory=Counter)
+    high_risk_images: List[str] = field(default_factory=list)
+
+
+def summarize(results: Iterable[SkyGuardResult]) -> BatchSummary:
+    summary = BatchSummary()
+    for result in results:
+        summary.images += 1
+        if result.scout is not None:
+            summary.detected_objects.update(result.scout.detected_objects)
+        if result.risk is None:
+            summary.incomplete += 1
+        elif result.is_high_risk:
+            summary.high_risk += 1
+            if result.image:
+                summary.high_risk_images.append(result.image)
+        else:
+            summary.low_risk += 1
+    return summary
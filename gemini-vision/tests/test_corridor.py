@@ -0,0 +1,43 @@
+import struct
+from pathlib import Path
+
+from corridor import (LABEL_TOKENS, OUTPUT_TOKENS_PER_FRAME, TILE_TOKENS, Frame, image_size, image_tokens,
+                      plan_segments, segment_message)
+
+EXCAVATOR = str(Path(__file__).resolve().parent.parent / "assets" / "excavator.jpg")
+FRAME_TOKENS = 9 * TILE_TOKENS + LABEL_TOKENS + OUTPUT_TOKENS_PER_FRAME
+
+
+def png(path, width: int, height: int) -> str:
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", width, height))
+    return str(path)
+
+
+def test_images_are_billed_by_768px_tile(tmp_path):
+    assert image_size(EXCAVATOR) == (2048, 2048)
+    assert image_tokens(EXCAVATOR) == 9 * TILE_TOKENS
+    assert image_tokens(png(tmp_path / "small.png", 384, 200)) == TILE_TOKENS
+    assert image_tokens(png(tmp_path / "wide.png", 1600, 700)) == 3 * TILE_TOKENS
+    assert image_tokens(str(tmp_path / "missing.jpg")) == TILE_TOKENS
+
+
+def test_segments_respect_the_token_budget_and_frame_cap():
+    frames = [Frame(EXCAVATOR)] * 10
+    assert [len(s) for s in plan_segments(frames, token_budget=200 + 3 * FRAME_TOKENS)] == [3, 3, 3, 1]
+    assert [len(s) for s in plan_segments(frames, token_budget=10**6, max_frames=4)] == [4, 4, 2]
+
+
+def test_a_frame_over_budget_gets_its_own_segment():
+    assert [len(s) for s in plan_segments([Frame(EXCAVATOR)] * 2, token_budget=100)] == [1, 1]
+
+
+def test_a_gap_in_positions_starts_a_new_segment():
+    # ~111 m per 0.001 degree of latitude
+    frames = [Frame(EXCAVATOR, 51.0 + 0.001 * i, 0.0) for i in range(3)] + [Frame(EXCAVATOR, 51.05, 0.0)]
+    assert [len(s) for s in plan_segments(frames, token_budget=10**6, max_gap_m=500)] == [3, 1]
+
+
+def test_segment_message_lists_frames_in_order():
+    message = segment_message([Frame("a.jpg", 51.0, -1.5), Frame("b.jpg")])
+    assert message.splitlines() == ["Analyze this corridor segment of 2 frames, in flight order:",
+                                    "- a.jpg at 51.00000, -1.50000", "- b.jpg"]
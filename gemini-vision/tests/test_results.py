@@ -0,0 +1,37 @@
+from results import OUTPUT_KEYS, SkyGuardResult, corridor_results, dump_results, load_results, summarize
+
+SCOUT = {"scene_description": "Dry grass along the line", "detected_objects": ["excavator", "trench"]}
+
+
+def test_results_are_read_from_state():
+    result = SkyGuardResult.from_state({
+        OUTPUT_KEYS["scout_agent"]: SCOUT,
+        OUTPUT_KEYS["risk_agent"]: {"risk_level": "High", "reasoning": "Digging near the pipeline"},
+    }, image="excavator.jpg")
+    assert result.is_high_risk and result.action is None
+    assert result.scout.detected_objects == ["excavator", "trench"]
+
+
+def test_corridor_state_splits_into_one_result_per_frame():
+    results = corridor_results({
+        OUTPUT_KEYS["scout_agent"]: {"frames": [{**SCOUT, "frame": "a.jpg"}, {**SCOUT, "frame": "b.jpg"}]},
+        OUTPUT_KEYS["risk_agent"]: {"risk_level": "High", "reasoning": "Trench in frame a",
+                                    "frames": [{"frame": "a.jpg", "risk_level": "High"}]},
+        OUTPUT_KEYS["dispatcher_agent"]: {"message": "URGENT: excavation at a.jpg"},
+    })
+    assert [(r.image, r.risk.risk_level) for r in results] == [("a.jpg", "High"), ("b.jpg", "High")]
+    assert all(r.action.message == "URGENT: excavation at a.jpg" for r in results)
+
+
+def test_results_round_trip_and_summarize(tmp_path):
+    path = tmp_path / "results.jsonl"
+    dump_results([
+        SkyGuardResult.from_state({OUTPUT_KEYS["scout_agent"]: SCOUT,
+                                   OUTPUT_KEYS["risk_agent"]: {"risk_level": "High", "reasoning": "r"}}, "a.jpg"),
+        SkyGuardResult.from_state({OUTPUT_KEYS["risk_agent"]: {"risk_level": "Low", "reasoning": "r"}}, "b.jpg"),
+        SkyGuardResult.from_state({}, "c.jpg"),
+    ], path)
+    summary = summarize(load_results(path))
+    assert (summary.images, summary.high_risk, summary.low_risk, summary.incomplete) == (3, 1, 1, 1)
+    assert summary.high_risk_images == ["a.jpg"]
+    assert summary.detected_objects["excavator"] == 1
@@ -0,0 +1,26 @@
+import pytest
+
+import agents
+from agents import ASSETS_DIR, UPLOAD_DIR, _resolve
+
+
+def test_resolve_allows_assets_and_uploads(tmp_path, monkeypatch):
+    assert _resolve("assets/excavator.jpg") == (ASSETS_DIR / "excavator.jpg").resolve()
+    monkeypatch.setattr(agents, "UPLOAD_DIR", tmp_path)
+    upload = tmp_path / "upload.jpg"
+    assert _resolve(str(upload)) == upload.resolve()
+
+
+@pytest.mark.parametrize("path", ["/etc/passwd", "agents.py", "assets/../agents.py", "../service/app.py",
+                                  str(UPLOAD_DIR / ".." / "secret.jpg")])
+def test_resolve_refuses_other_files(path):
+    with pytest.raises(PermissionError):
+        _resolve(path)
+
+
+def test_resolve_follows_symlinks_out_of_the_uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(agents, "UPLOAD_DIR", tmp_path)
+    link = tmp_path / "link.jpg"
+    link.symlink_to(ASSETS_DIR.parent / "agents.py")
+    with pytest.raises(PermissionError):
+        _resolve(str(link))
@@ -0,0 +1,70 @@
+import asyncio
+import time
+from collections import deque
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; `status` is the HTTP status to answer with."""
+
+    def __init__(self, status: int, reason: str, retry_after_s: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    """
+    Bounds how many pipeline runs execute at once and how many may wait.
+
+    Up to `max_concurrent` runs hold a slot. Up to `max_queue` more wait for
+    one, each for at most `queue_timeout_s`. Anything beyond that is rejected
+    immediately with 429 rather than queued, so a burst degrades into fast
+    refusals instead of every caller timing out.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 128, queue_timeout_s: float = 30.0, window: int = 1000):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waits = deque(maxlen=window)
+
+    async def acquire(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(429, "queue full", retry_after_s=1.0)
+
+        started_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded(503, "timed out waiting for a slot", retry_after_s=self.queue_timeout_s / 2)
+        finally:
+            self.waiting -= 1
+
+        self._waits.append(time.perf_counter() - started_at)
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    def snapshot(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queue_wait_p95_s": round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else 0.0,
+        }
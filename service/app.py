@@ -0,0 +1,325 @@
+"""Headless HTTP API for the RCA, SkyGuard and P&ID pipelines.
+
+    uvicorn service.app:app --host 0.0.0.0 --port 8080
+
+    POST /v1/{rca|skyguard|pid}/runs     start or continue a session
+    GET  /metrics                        admission and latency counters
+    GET  /healthz
+
+Each pipeline's agent tree is built once at startup and shared. Sessions are
+stored per tenant (the `X-Tenant-ID` header), and every pipeline has its own
+admission controller so a burst on one cannot starve the others.
+"""
+
+import base64
+import binascii
+import json
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.runners import Runner
+from google.genai import types
+from pydantic import BaseModel
+
+from shared.context_cache import get_context_cache
+from shared.dag import CRITICAL_PATH_KEY
+from shared.profiling import get_profiler, profiling_enabled
+from shared.scheduler import LANES, get_scheduler, lane
+from shared.sessions import SqliteSessionService
+
+from .admission import AdmissionController, Overloaded
+from .pipelines import REPO_ROOT, Pipeline, build_pipelines, context_cache_enabled
+
+load_dotenv()
+
+TENANT_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$")
+SESSION_DIR = Path(os.getenv("SERVICE_SESSION_DIR", REPO_ROOT / ".sessions" / "service"))
+# Optional comma-separated allow-list; without it any well-formed tenant id is served
+ALLOWED_TENANTS = {tenant.strip() for tenant in os.getenv("SERVICE_TENANTS", "").split(",") if tenant.strip()}
+# Each open tenant holds a SQLite connection, so idle ones are closed past this many
+MAX_OPEN_TENANTS = int(os.getenv("SERVICE_MAX_OPEN_TENANTS", "64"))
+SKYGUARD_SCENARIOS = {path.stem: path for path in (REPO_ROOT / "gemini-vision" / "assets").glob("*.jpg")}
+
+
+class RunRequest(BaseModel):
+    message: Optional[str] = None
+    session_id: Optional[str] = None
+    stream: bool = False
+    # "batch" for bulk jobs, so model calls for interactive requests go first
+    priority: str = "interactive"
+    # SkyGuard only: either a bundled scenario ("excavator") or an uploaded image
+    scenario: Optional[str] = None
+    image_base64: Optional[str] = None
+    image_name: str = "upload.jpg"
+
+
+class Tenant:
+    """One tenant's session and artifact stores, and a runner per pipeline bound to them."""
+
+    def __init__(self, tenant_id: str):
+        # One database file per tenant keeps their histories physically apart
+        self.sessions = SqliteSessionService(SESSION_DIR / f"{tenant_id}.db")
+        self.artifacts = InMemoryArtifactService()
+        self._runners: dict[str, Runner] = {}
+        # Requests in flight; a tenant is only closed when this is 0
+        self.active = 0
+
+    def runner(self, pipeline: Pipeline) -> Runner:
+        if pipeline.name not in self._runners:
+            self._runners[pipeline.name] = Runner(agent=pipeline.root, app_name=pipeline.app_name,
+                                                  session_service=self.sessions, artifact_service=self.artifacts)
+        return self._runners[pipeline.name]
+
+    def close(self):
+        self.sessions.close()
+
+
+pipelines: dict[str, Pipeline] = {}
+tenants: OrderedDict[str, Tenant] = OrderedDict()
+admission: dict[str, AdmissionController] = {}
+latencies: dict[str, deque] = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pipelines.update(build_pipelines())
+    for name in pipelines:
+        admission[name] = AdmissionController(
+            max_concurrent=int(os.getenv("SERVICE_MAX_CONCURRENT", "32")),
+            max_queue=int(os.getenv("SERVICE_MAX_QUEUE", "128")),
+            queue_timeout_s=float(os.getenv("SERVICE_QUEUE_TIMEOUT_S", "30")),
+        )
+        latencies[name] = deque(maxlen=1000)
+    yield
+    while tenants:
+        tenants.popitem()[1].close()
+    if profiling_enabled():
+        # AGENT_PROFILE=1: merge this process's samples into .profiles/
+        get_profiler().save()
+
+
+app = FastAPI(title="Gemini Enterprise Agent Kits", lifespan=lifespan)
+
+
+def _tenant(tenant_id: str) -> Tenant:
+    if not TENANT_PATTERN.match(tenant_id):
+        raise HTTPException(400, "X-Tenant-ID must be 1-64 letters, digits, '.', '_' or '-', not starting with '.'")
+    if ALLOWED_TENANTS and tenant_id not in ALLOWED_TENANTS:
+        raise HTTPException(403, f"Unknown tenant '{tenant_id}'")
+    if tenant_id not in tenants:
+        tenants[tenant_id] = Tenant(tenant_id)
+    tenants.move_to_end(tenant_id)
+    return tenants[tenant_id]
+
+
+def _close_idle_tenants():
+    """Closes least recently used tenants without requests in flight until at most MAX_OPEN_TENANTS are open.
+
+    Their sessions stay in their database files and are reopened on the next request.
+    """
+    for tenant_id in list(tenants):
+        if len(tenants) <= MAX_OPEN_TENANTS:
+            break
+        if tenants[tenant_id].active == 0:
+            tenants.pop(tenant_id).close()
+
+
+def _describe(event) -> list[dict]:
+    """Flattens an ADK event into the payloads sent to clients."""
+    payloads = []
+    base = {"author": event.author}
+    if event.content and event.content.parts:
+        for part in event.content.parts:
+            if part.function_call:
+                payloads.append({**base, "type": "tool_call", "name": part.function_call.name,
+                                 "args": part.function_call.args})
+            elif part.function_response:
+                payloads.append({**base, "type": "tool_result", "name": part.function_response.name})
+            elif part.text:
+                kind = "thought" if part.thought else ("delta" if event.partial else "text")
+                payloads.append({**base, "type": kind, "text": part.text})
+    if event.actions and event.actions.transfer_to_agent:
+        payloads.append({**base, "type": "transfer", "to": event.actions.transfer_to_agent})
+    if event.actions and event.actions.state_delta.get(CRITICAL_PATH_KEY):
+        payloads.append({**base, "type": "critical_path", **event.actions.state_delta[CRITICAL_PATH_KEY]})
+    return payloads
+
+
+def _sse(kind: str, data: dict) -> str:
+    return f"event: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _open_session(pipeline: Pipeline, tenant: Tenant, tenant_id: str, session_id: Optional[str]):
+    if session_id:
+        session = await tenant.sessions.get_session(app_name=pipeline.app_name, user_id=tenant_id, session_id=session_id)
+        if session is None:
+            raise HTTPException(404, f"Unknown session '{session_id}'")
+        # Artifacts are kept in memory, so a tenant that was closed in between has lost them
+        if pipeline.prepare_session is not None and not await tenant.artifacts.list_artifact_keys(
+                app_name=pipeline.app_name, user_id=tenant_id, session_id=session.id):
+            await pipeline.prepare_session(app_name=pipeline.app_name, user_id=tenant_id, session_id=session.id,
+                                           artifact_service=tenant.artifacts)
+        return session
+
+    session = await tenant.sessions.create_session(app_name=pipeline.app_name, user_id=tenant_id)
+    if pipeline.prepare_session is not None:
+        await pipeline.prepare_session(app_name=pipeline.app_name, user_id=tenant_id, session_id=session.id,
+                                       artifact_service=tenant.artifacts)
+    return session
+
+
+def _message(pipeline: Pipeline, request: RunRequest) -> tuple[str, Optional[Path]]:
+    """Returns the prompt and, for uploads, a temporary file to delete afterwards."""
+    if pipeline.name != "skyguard":
+        return request.message or pipeline.default_message, None
+
+    if request.image_base64:
+        try:
+            image = base64.b64decode(request.image_base64, validate=True)
+        except binascii.Error as error:
+            raise HTTPException(422, f"image_base64 is not valid base64: {error}")
+        suffix = Path(request.image_name).suffix or ".jpg"
+        # The vision tools refuse to read anything outside the assets and this folder
+        pipeline.upload_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=pipeline.upload_dir, suffix=suffix, delete=False) as f:
+            f.write(image)
+        image_path = upload = Path(f.name)
+    elif request.scenario in SKYGUARD_SCENARIOS:
+        image_path, upload = SKYGUARD_SCENARIOS[request.scenario], None
+    else:
+        raise HTTPException(422, f"Provide image_base64 or one of the scenarios {sorted(SKYGUARD_SCENARIOS)}")
+    # Only the placeholder is substituted: other braces in the message are left as they are
+    return (request.message or pipeline.default_message).replace("{image_path}", str(image_path)), upload
+
+
+@app.post("/v1/{pipeline_name}/runs")
+async def run(pipeline_name: str, request: RunRequest, x_tenant_id: str = Header("default")):
+    if pipeline_name not in pipelines:
+        raise HTTPException(404, f"Unknown pipeline '{pipeline_name}'")
+    if request.priority not in LANES:
+        raise HTTPException(422, f"priority must be one of {LANES}")
+    pipeline = pipelines[pipeline_name]
+    tenant = _tenant(x_tenant_id)
+    controller = admission[pipeline_name]
+    # Counted before queueing, so the tenant cannot be closed while this request waits
+    tenant.active += 1
+    _close_idle_tenants()
+
+    try:
+        await controller.acquire()
+    except BaseException as e:
+        tenant.active -= 1
+        if not isinstance(e, Overloaded):
+            raise
+        return JSONResponse({"error": e.reason}, status_code=e.status,
+                            headers={"Retry-After": str(max(int(e.retry_after_s), 1))})
+
+    # From here on the slot must be released exactly once, including when a stream is abandoned
+    upload = None
+    try:
+        session = await _open_session(pipeline, tenant, x_tenant_id, request.session_id)
+        prompt, upload = _message(pipeline, request)
+    except BaseException:
+        controller.release()
+        tenant.active -= 1
+        raise
+
+    runner = tenant.runner(pipeline)
+    content = types.Content(role="user", parts=[types.Part(text=prompt)])
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE) if request.stream else RunConfig()
+    started_at = time.perf_counter()
+
+    def finish():
+        controller.release()
+        tenant.active -= 1
+        _close_idle_tenants()
+        latencies[pipeline_name].append(time.perf_counter() - started_at)
+        if upload is not None:
+            upload.unlink(missing_ok=True)
+
+    events = runner.run_async(user_id=x_tenant_id, session_id=session.id, new_message=content, run_config=run_config)
+
+    if request.stream:
+        async def stream():
+            try:
+                yield _sse("session", {"session_id": session.id, "tenant": x_tenant_id})
+                with lane(request.priority):
+                    async for event in events:
+                        for payload in _describe(event):
+                            yield _sse(payload["type"], payload)
+                yield _sse("done", {"session_id": session.id, "latency_s": round(time.perf_counter() - started_at, 3)})
+            except Exception as e:
+                yield _sse("error", {"message": str(e)})
+            finally:
+                finish()
+
+        return StreamingResponse(stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    responses, outputs, tool_calls, critical_path = {}, {}, [], None
+    try:
+        with lane(request.priority):
+            async for event in events:
+                for payload in _describe(event):
+                    if payload["type"] == "tool_call":
+                        tool_calls.append({"author": payload["author"], "name": payload["name"]})
+                    elif payload["type"] == "critical_path":
+                        critical_path = event.actions.state_delta[CRITICAL_PATH_KEY]
+                # Agents' output_key values, e.g. SkyGuard's schema-validated results
+                if event.actions:
+                    outputs.update((key, value) for key, value in event.actions.state_delta.items() if key != CRITICAL_PATH_KEY)
+                if event.is_final_response() and event.content and event.content.parts:
+                    text = "".join(part.text or "" for part in event.content.parts if not part.thought)
+                    if text:
+                        responses[event.author] = text
+    except Exception as e:
+        raise HTTPException(502, f"Pipeline failed: {e}")
+    finally:
+        finish()
+
+    return {
+        "session_id": session.id,
+        "responses": responses,
+        "outputs": outputs,
+        "tool_calls": tool_calls,
+        "critical_path": critical_path,
+        "latency_s": round(time.perf_counter() - started_at, 3),
+    }
+
+
+def _percentiles(samples) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda fraction: round(ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)], 4)
+    return {"p50_s": pick(0.5), "p95_s": pick(0.95), "p99_s": pick(0.99)}
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "tenants": len(tenants),
+        "pipelines": {
+            name: {**admission[name].snapshot(), "latency": _percentiles(latencies[name])}
+            for name in pipelines
+        },
+        "models": get_scheduler().metrics(),
+        **({"context_cache": get_context_cache().metrics()} if context_cache_enabled() else {}),
+        **({"profile": get_profiler().report()} if profiling_enabled() else {}),
+    }
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok" if pipelines else "starting", "pipelines": sorted(pipelines)}
@@ -0,0 +1,158 @@
+"""Load test for the headless service.
+
+By default it starts the service on a free port with every model swapped for
+the replay stand-in (`shared/replay.py`), so the numbers show what the
+service itself sustains:
+
+    python service/load_test.py --pipeline rca --concurrency 50 --duration 30 --latency 0.5
+
+Point it at a running deployment with --url instead.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+PAYLOADS = {
+    "rca": {},
+    "skyguard": {"scenario": "excavator"},
+    "pid": {"message": "What does the P&ID document pid_sample_1.pdf depict?"},
+}
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(args, session_dir: str) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = dict(os.environ,
+               SERVICE_MODEL_BACKEND="replay",
+               SERVICE_SESSION_DIR=session_dir,
+               SERVICE_REPLAY_LATENCY_S=str(args.latency),
+               SERVICE_REPLAY_JITTER_S=str(args.jitter))
+    if args.max_concurrent:
+        env["SERVICE_MAX_CONCURRENT"] = str(args.max_concurrent)
+    if args.max_queue is not None:
+        env["SERVICE_MAX_QUEUE"] = str(args.max_queue)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "service.app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/healthz", timeout=1).json()["status"] == "ok":
+                return process, url
+        except (httpx.HTTPError, KeyError, ValueError):
+            pass
+        if process.poll() is not None:
+            raise RuntimeError("Service exited during startup")
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Service did not become healthy within 60s")
+
+
+async def client(http: httpx.AsyncClient, args, deadline: float, results: list, index: int):
+    payload = {**PAYLOADS[args.pipeline], "stream": args.stream}
+    headers = {"X-Tenant-ID": f"tenant{index % args.tenants}"}
+    while time.perf_counter() < deadline:
+        started_at = time.perf_counter()
+        first_byte = None
+        try:
+            async with http.stream("POST", f"/v1/{args.pipeline}/runs", json=payload, headers=headers) as response:
+                async for _ in response.aiter_bytes():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started_at
+                status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        results.append((status, time.perf_counter() - started_at, first_byte))
+        if status == 429:
+            # Back off like a well-behaved client would
+            await asyncio.sleep(0.1)
+
+
+async def load(url: str, args) -> tuple[list, dict]:
+    results = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as http:
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(client(http, args, deadline, results, i) for i in range(args.concurrency)))
+        metrics = (await http.get("/metrics")).json()
+    return results, metrics
+
+
+def report(results: list, metrics: dict, args):
+    statuses = Counter(status for status, _, _ in results)
+    ok = [latency for status, latency, _ in results if status == 200]
+    first_bytes = [first for status, _, first in results if status == 200 and first is not None]
+
+    print(f"\n{args.pipeline}: {args.concurrency} clients x {args.duration:.0f}s, "
+          f"{'streaming' if args.stream else 'buffered'}, model latency {args.latency}s")
+    print(f"   requests   {len(results)}  ({', '.join(f'{s}: {n}' for s, n in sorted(statuses.items(), key=str))})")
+    print(f"   throughput {len(ok) / args.duration:.1f} req/s succeeded")
+    if ok:
+        print(f"   latency    p50 {_percentile(ok, 0.5):.3f}s  p95 {_percentile(ok, 0.95):.3f}s  "
+              f"p99 {_percentile(ok, 0.99):.3f}s  max {max(ok):.3f}s  mean {statistics.mean(ok):.3f}s")
+    if args.stream and first_bytes:
+        print(f"   first byte p50 {_percentile(first_bytes, 0.5):.3f}s  p95 {_percentile(first_bytes, 0.95):.3f}s")
+    service = metrics["pipelines"].get(args.pipeline, {})
+    print(f"   service    admitted {service.get('admitted')}  rejected {service.get('rejected')}  "
+          f"timed out {service.get('timed_out')}  queue wait p95 {service.get('queue_wait_p95_s')}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the headless agent service.")
+    parser.add_argument("--url", help="Existing service to test. Default: start one with replayed models.")
+    parser.add_argument("--pipeline", choices=sorted(PAYLOADS), default="rca")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run.")
+    parser.add_argument("--tenants", type=int, default=4, help="Spread clients across this many tenants.")
+    parser.add_argument("--stream", action="store_true", help="Request SSE streams instead of buffered JSON.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Replayed model latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform jitter added to the replayed latency.")
+    parser.add_argument("--max-concurrent", type=int, help="Service admission limit (SERVICE_MAX_CONCURRENT).")
+    parser.add_argument("--max-queue", type=int, help="Service queue depth (SERVICE_MAX_QUEUE).")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    session_dir = tempfile.TemporaryDirectory()
+    if url is None:
+        process, url = start_service(args, session_dir.name)
+    try:
+        results, metrics = asyncio.run(load(url, args))
+        report(results, metrics, args)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        session_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Loads the three pipelines into one process and builds their agent trees once.
+
+All three projects ship a top-level module called `agents`, and SkyGuard's
+also imports its own top-level `results` and `corridor`. So each project is
+imported from its own folder, and every top-level module of that folder is
+then removed from `sys.modules`; the loaded module objects are kept and used
+directly.
+"""
+
+import importlib
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CASSETTES = REPO_ROOT / "benchmarks" / "cassettes"
+
+
+@dataclass
+class Pipeline:
+    """A warm agent tree plus what the service needs to start a session on it."""
+    name: str
+    app_name: str
+    root: Any
+    default_message: str
+    # Loads per-session artifacts, e.g. the P&ID documents
+    prepare_session: Optional[Callable[..., Awaitable[Any]]] = None
+    models: dict = field(default_factory=dict)
+    # Where uploaded images are written for the pipeline's tools to read
+    upload_dir: Optional[Path] = None
+
+
+def _top_level_modules(project_dir: Path) -> set[str]:
+    """Names a project folder's modules and packages are imported under, e.g. `agents`, `results`."""
+    return ({path.stem for path in project_dir.glob("*.py")}
+            | {path.name for path in project_dir.iterdir() if (path / "__init__.py").is_file()})
+
+
+def load_project_module(project: str, module: str):
+    """Imports `module` from a project folder without leaving any of its modules registered by name."""
+    project_dir = REPO_ROOT / project
+    packages = _top_level_modules(project_dir)
+    scoped = lambda name: name.split(".")[0] in packages
+    previous = {name: mod for name, mod in sys.modules.items() if scoped(name)}
+    for name in previous:
+        del sys.modules[name]
+
+    sys.path.insert(0, str(project_dir))
+    try:
+        return importlib.import_module(module)
+    finally:
+        sys.path.remove(str(project_dir))
+        for name in [name for name in sys.modules if scoped(name)]:
+            del sys.modules[name]
+        sys.modules.update(previous)
+
+
+def _model_factory(pipeline: str, models: dict):
+    """Returns model_for(name): a replay stand-in when SERVICE_MODEL_BACKEND=replay, else None (use Gemini)."""
+    if os.getenv("SERVICE_MODEL_BACKEND", "gemini") != "replay":
+        return lambda model_name: None
+
+    from shared.replay import ReplayLlm
+
+    def model_for(model_name):
+        if model_name not in models:
+            models[model_name] = ReplayLlm(
+                model=model_name,
+                cassette_dir=str(Path(os.getenv("SERVICE_CASSETTES", CASSETTES)) / pipeline),
+                latency_s=float(os.getenv("SERVICE_REPLAY_LATENCY_S", "0.5")),
+                jitter_s=float(os.getenv("SERVICE_REPLAY_JITTER_S", "0.0")),
+                on_miss="synthetic",
+            )
+        return models[model_name]
+
+    return model_for
+
+
+def context_cache_enabled() -> bool:
+    """Whether agents cache their static prefixes (SERVICE_CONTEXT_CACHE=1); never with replayed models."""
+    return (os.getenv("SERVICE_CONTEXT_CACHE", "0") == "1"
+            and os.getenv("SERVICE_MODEL_BACKEND", "gemini") != "replay")
+
+
+def build_pipelines() -> dict[str, Pipeline]:
+    """
+    Builds every pipeline once at startup. Agent trees hold no per-request
+    state, so a single instance serves all tenants and sessions.
+    """
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.append(str(REPO_ROOT))
+
+    project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+    location = os.getenv("GOOGLE_CLOUD_LOCATION")
+    context_cache = context_cache_enabled()
+    pipelines = {}
+
+    rca = load_project_module("gemini-root-cause", "agents.agent")
+    models = {}
+    model_name = os.getenv("RCA_MODEL", "gemini-2.5-flash")
+    pipelines["rca"] = Pipeline(
+        name="rca",
+        app_name="rca_agent",
+        root=rca.create_rca_agent(project_id, location, model_name, model=_model_factory("rca", models)(model_name),
+                                   context_cache=context_cache),
+        default_message=rca.incident_prompt(rca.ticket_date()),
+        models=models,
+    )
+
+    vision = load_project_module("gemini-vision", "agents")
+    models = {}
+    model_name = os.getenv("SKYGUARD_MODEL", "gemini-2.5-flash")
+    model = _model_factory("skyguard", models)(model_name)
+    if model is not None:
+        from shared.replay import ReplayGenerativeModel
+        # analyze_aerial_image calls the Vertex AI SDK directly, so swap that too
+        vision.GenerativeModel = ReplayGenerativeModel.factory(
+            Path(model.cassette_dir) / "vision_tool", latency_s=model.latency_s, on_miss="synthetic",
+            synthetic_text=json.dumps({"scene_description": "synthetic", "detected_objects": []}),
+        )
+    pipelines["skyguard"] = Pipeline(
+        name="skyguard",
+        app_name="infrastructure_monitoring_pipeline",
+        root=vision.get_infrastructure_monitoring_pipeline(model_name, model=model, context_cache=context_cache),
+        default_message="Please analyze this aerial image: {image_path}",
+        models=models,
+        upload_dir=vision.UPLOAD_DIR,
+    )
+
+    pid = load_project_module("gemini-engineering-doc", "agents")
+    models = {}
+    model_for = _model_factory("pid", models)
+    pipelines["pid"] = Pipeline(
+        name="pid",
+        app_name="agents",
+        root=pid.create_pid_agent(project_id, location,
+                                  specialist_model=model_for("gemini-3-pro-preview") or "gemini-3-pro-preview",
+                                  overseer_model=model_for("gemini-3-pro-preview") or "gemini-3-pro-preview",
+                                  context_cache=context_cache),
+        default_message="What does the P&ID document pid_sample_1.pdf depict?",
+        prepare_session=pid.setup_artifact_service,
+        models=models,
+    )
+    return pipelines
@@ -0,0 +1,299 @@
+"""Explicit context caching of the agents' static prefixes.
+
+Every request of an agent starts with the same prefix: its system instruction,
+its tool declarations and, for the P&ID specialists, the PDF they answer from.
+Gemini charges for and processes that prefix on every request, although only
+the question after it changes. With caching on, `use_cached_prefix` (a
+`before_model_callback`) stores the prefix once as a Vertex AI cached content
+with a TTL and rewrites the request to reference it, so only the rest is
+sent. Requests with the same model and prefix share one cache across
+sessions and users; a changed prompt, tool or document hashes to a new one.
+
+What counts as the prefix:
+- `config.system_instruction`, `config.tools` and `config.tool_config` as
+  ADK built them. Instructions with state placeholders such as
+  `{scout_results}` put their static part in the agent's
+  `static_instruction`, so only that reaches the system instruction,
+- leading contents built with `document_content`, which callbacks insert at
+  the front of the request.
+
+Vertex AI only caches prefixes of at least 2,048 tokens (4,096 for Gemini 3).
+Shorter prefixes are sent as they are and counted as `too_small`.
+
+`record_cache_usage` (an `after_model_callback`) reads the cached and prompt
+token counts Gemini reports for every response. `get_context_cache().metrics()`
+returns the cached-token ratio and the latency of requests with and without a
+cache. Offline, `set_context_cache(ContextCache(caches=FakeCacheService()))`
+pairs it with `FakeVertexLlm` in `shared/fake_vertex.py`.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from google.genai import types
+
+from .profiling import profiled
+from .scheduler import blob_tokens
+
+if TYPE_CHECKING:
+    from google.adk.agents.callback_context import CallbackContext
+    from google.adk.models import LlmRequest, LlmResponse
+
+DEFAULT_TTL_S = 3600
+# A cache this close to expiry is replaced rather than referenced by a request that may outlive it
+REFRESH_MARGIN_S = 60
+# How long a prefix whose cache could not be created is sent uncached before trying again
+RETRY_AFTER_S = 300
+DOCUMENT_LABEL = "Attached document: "
+
+
+def minimum_tokens(model: str) -> int:
+    """The smallest prefix Vertex AI will cache for a model."""
+    return 4096 if model.rsplit("/", 1)[-1].startswith("gemini-3") else 2048
+
+
+def document_content(filename: str, part: types.Part) -> types.Content:
+    """A document as the first content of a request, where it can be cached with the instructions."""
+    return types.Content(role="user", parts=[types.Part(text=f"{DOCUMENT_LABEL}{filename}"), part])
+
+
+def _is_document(content: types.Content) -> bool:
+    parts = content.parts or []
+    return bool(parts) and bool(parts[0].text) and parts[0].text.startswith(DOCUMENT_LABEL)
+
+
+@dataclass
+class CachedPrefix:
+    name: str
+    expire_time: float
+    tokens: int
+
+
+class ContextCache:
+    """
+    One explicit cache per static prefix, shared by every request in the process.
+
+    Args:
+        caches: What creates the caches, with the signature of the genai
+            client's `aio.caches.create`. Defaults to a Vertex AI client for
+            GOOGLE_CLOUD_PROJECT and GOOGLE_CLOUD_LOCATION.
+        ttl_s: Lifetime of each cache; CONTEXT_CACHE_TTL_S by default.
+        min_tokens: Smallest prefix to cache; the model's Vertex AI minimum by default.
+    """
+
+    def __init__(self, caches: Any = None, ttl_s: Optional[int] = None, min_tokens: Optional[int] = None):
+        self.caches = caches
+        self.ttl_s = ttl_s or int(os.getenv("CONTEXT_CACHE_TTL_S", DEFAULT_TTL_S))
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self._entries: dict[str, CachedPrefix] = {}
+        self._pending: dict[str, concurrent.futures.Future] = {}
+        # Prefixes sent uncached until a time: too small for good, failed creations for a while
+        self._uncacheable: dict[str, float] = {}
+        self._started: dict[tuple, tuple[float, bool]] = {}
+        self.stats = {"requests": 0, "hits": 0, "created": 0, "too_small": 0, "failed": 0,
+                      "prompt_tokens": 0, "cached_tokens": 0}
+        self._latencies: dict[bool, list[float]] = {True: [], False: []}
+
+    def _client_caches(self):
+        if self.caches is None:
+            from google import genai
+            client = genai.Client(vertexai=True, project=os.getenv("GOOGLE_CLOUD_PROJECT"),
+                                  location=os.getenv("GOOGLE_CLOUD_LOCATION"))
+            self.caches = client.aio.caches
+        return self.caches
+
+    async def apply(self, llm_request: "LlmRequest") -> Optional[CachedPrefix]:
+        """Moves the request's static prefix into a cache and references it; None if it is sent uncached."""
+        config = llm_request.config
+        if config is None or config.cached_content or not llm_request.model:
+            return None
+        documents = 0
+        while documents < len(llm_request.contents) - 1 and _is_document(llm_request.contents[documents]):
+            documents += 1
+        prefix = types.CreateCachedContentConfig(
+            system_instruction=config.system_instruction,
+            tools=config.tools,
+            tool_config=config.tool_config,
+            contents=llm_request.contents[:documents] or None,
+            ttl=f"{self.ttl_s}s",
+        )
+        key = hashlib.sha256(llm_request.model.encode() + prefix.model_dump_json(exclude_none=True).encode()).hexdigest()
+
+        entry = await self._entry(key, llm_request.model, prefix)
+        if entry is None:
+            return None
+        config.system_instruction = None
+        config.tools = None
+        config.tool_config = None
+        config.cached_content = entry.name
+        llm_request.contents = llm_request.contents[documents:]
+        return entry
+
+    async def _entry(self, key: str, model: str, prefix: types.CreateCachedContentConfig) -> Optional[CachedPrefix]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expire_time - now > REFRESH_MARGIN_S:
+                self.stats["hits"] += 1
+                return entry
+            if self._uncacheable.get(key, 0) > now:
+                return None
+            pending = self._pending.get(key)
+            creator = pending is None
+            if creator:
+                pending = self._pending[key] = concurrent.futures.Future()
+
+        if not creator:
+            # Another request, maybe on another event loop, is creating this cache
+            entry = await asyncio.wrap_future(pending)
+            if entry is not None:
+                with self._lock:
+                    self.stats["hits"] += 1
+            return entry
+
+        entry = None
+        try:
+            entry = await self._create(key, model, prefix)
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if entry is not None:
+                    self._entries[key] = entry
+            pending.set_result(entry)
+        return entry
+
+    async def _create(self, key: str, model: str, prefix: types.CreateCachedContentConfig) -> Optional[CachedPrefix]:
+        tokens = prefix_tokens(prefix)
+        if tokens < (self.min_tokens if self.min_tokens is not None else minimum_tokens(model)):
+            with self._lock:
+                self.stats["too_small"] += 1
+                self._uncacheable[key] = float("inf")
+            return None
+        try:
+            cached = await self._client_caches().create(model=model, config=prefix)
+        except Exception as e:
+            print(f"⚠️ Could not cache the {model} prefix ({tokens:,} tokens): {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+                self._uncacheable[key] = time.time() + RETRY_AFTER_S
+            return None
+        expire_time = cached.expire_time.timestamp() if isinstance(cached.expire_time, datetime) else time.time() + self.ttl_s
+        usage = cached.usage_metadata.total_token_count if cached.usage_metadata else None
+        with self._lock:
+            self.stats["created"] += 1
+        return CachedPrefix(cached.name, expire_time, usage or tokens)
+
+    def started(self, callback_context: "CallbackContext", cached: bool):
+        with self._lock:
+            self._started[(callback_context.invocation_id, callback_context.agent_name)] = (time.perf_counter(), cached)
+
+    def record(self, callback_context: "CallbackContext", llm_response: "LlmResponse"):
+        if llm_response.partial:
+            return
+        with self._lock:
+            started = self._started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+            if started is None:
+                return
+            started_at, cached = started
+            self.stats["requests"] += 1
+            self._latencies[cached].append(time.perf_counter() - started_at)
+            usage = llm_response.usage_metadata
+            if usage is not None:
+                self.stats["prompt_tokens"] += usage.prompt_token_count or 0
+                self.stats["cached_tokens"] += usage.cached_content_token_count or 0
+
+    def metrics(self) -> dict:
+        with self._lock:
+            cached, uncached = self._latencies[True], self._latencies[False]
+            mean = lambda values: round(sum(values) / len(values), 4) if values else None
+            return {
+                **self.stats,
+                "caches": len(self._entries),
+                "cached_token_ratio": round(self.stats["cached_tokens"] / self.stats["prompt_tokens"], 4)
+                if self.stats["prompt_tokens"] else 0.0,
+                "mean_latency_s": {"cached": mean(cached), "uncached": mean(uncached)},
+                # Only meaningful when both kinds of request served similar work
+                "latency_saved_s": round((mean(uncached) - mean(cached)) * len(cached), 2)
+                if cached and uncached else None,
+            }
+
+
+def prefix_tokens(prefix: types.CreateCachedContentConfig) -> int:
+    """A rough count of the prefix, like `prompt_tokens`: ~4 characters per token, documents by page."""
+    chars = len(prefix.system_instruction) if isinstance(prefix.system_instruction, str) else 0
+    chars += sum(len(json.dumps(tool.model_dump(exclude_none=True, mode="json"))) for tool in prefix.tools or [])
+    media = 0
+    for content in prefix.contents or []:
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            elif part.inline_data or part.file_data:
+                media += blob_tokens(part.inline_data)
+    return chars // 4 + media
+
+
+_context_cache: Optional[ContextCache] = None
+_context_cache_lock = threading.Lock()
+
+
+def get_context_cache() -> ContextCache:
+    global _context_cache
+    with _context_cache_lock:
+        if _context_cache is None:
+            _context_cache = ContextCache()
+        return _context_cache
+
+
+def set_context_cache(context_cache: ContextCache) -> ContextCache:
+    """Replaces the process-wide cache, e.g. with the offline stand-in in benchmarks."""
+    global _context_cache
+    with _context_cache_lock:
+        _context_cache = context_cache
+    return context_cache
+
+
+@profiled
+async def use_cached_prefix(callback_context: "CallbackContext", llm_request: "LlmRequest") -> None:
+    """`before_model_callback`: sends the request's static prefix as a reference to its cache."""
+    context_cache = get_context_cache()
+    entry = await context_cache.apply(llm_request)
+    context_cache.started(callback_context, cached=entry is not None)
+
+
+@profiled
+async def record_cache_usage(callback_context: "CallbackContext", llm_response: "LlmResponse") -> None:
+    """`after_model_callback`: records the cached tokens and latency of the response."""
+    get_context_cache().record(callback_context, llm_response)
+
+
+def model_callbacks(before_model_callback: Optional[Callable] = None, context_cache: bool = False) -> dict:
+    """
+    Agent keyword arguments for an agent's own `before_model_callback` and,
+    with `context_cache`, the caching callbacks after it, so whatever it adds
+    to the request is part of the prefix.
+    """
+    if not context_cache:
+        return {"before_model_callback": before_model_callback}
+    before = [before_model_callback] if before_model_callback else []
+    return {"before_model_callback": before + [use_cached_prefix], "after_model_callback": record_cache_usage}
+
+
+def split_instruction(instruction: str, static_instruction: str, context_cache: bool = False) -> dict:
+    """
+    Agent keyword arguments for an instruction whose state placeholders come
+    before a static part. With `context_cache`, the static part becomes the
+    agent's `static_instruction` and can be cached; without, the two are
+    sent as one instruction, as before.
+    """
+    if not context_cache:
+        return {"instruction": instruction + static_instruction}
+    return {"instruction": instruction, "static_instruction": static_instruction}
@@ -0,0 +1,162 @@
+"""Agent pipelines declared as dependency graphs.
+
+A pipeline is a list of `Stage`s: an agent plus the stages whose output it
+needs. `build_pipeline` turns the graph into ADK agents. Stages whose
+dependencies have all finished run together in a `ParallelAgent`, and those
+waves run one after another in a `SequentialAgent`. Stages pass results
+through session state (`output_key`), so a join is a stage listing several
+dependencies and reading their keys in its instruction.
+
+Every stage is timed. When a run finishes, its critical path is written to
+session state under `critical_path`: the chain of dependent stages that set
+the run's latency, with the time each one took.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, Optional, Sequence
+
+from google.adk.agents import BaseAgent, ParallelAgent, SequentialAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+
+CRITICAL_PATH_KEY = "critical_path"
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    Attributes:
+        agent: The agent that runs this stage; its name is the stage's name.
+        after: Names of the stages that must finish before this one starts.
+    """
+    agent: BaseAgent
+    after: tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return self.agent.name
+
+
+def waves(stages: Sequence[Stage]) -> list[list[Stage]]:
+    """Groups stages into waves that can run in parallel, in dependency order."""
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        unknown = set(stage.after) - by_name.keys()
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages {sorted(unknown)}")
+
+    done, remaining, result = set(), list(stages), []
+    while remaining:
+        ready = [stage for stage in remaining if done.issuperset(stage.after)]
+        if not ready:
+            raise ValueError(f"Stages {[stage.name for stage in remaining]} form a dependency cycle")
+        result.append(ready)
+        done.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage.name not in done]
+    return result
+
+
+def _with_callback(existing, callback):
+    if existing is None:
+        return callback
+    return [*existing, callback] if isinstance(existing, list) else [existing, callback]
+
+
+class StageTimer:
+    """Records when each stage of a run starts and ends, keyed by invocation."""
+
+    def __init__(self):
+        self._runs: dict[str, dict] = {}
+
+    def run_started(self, callback_context: CallbackContext):
+        self._runs[callback_context.invocation_id] = {"started_at": time.perf_counter(), "stages": {}}
+
+    def stage_started(self, callback_context: CallbackContext):
+        run = self._runs.get(callback_context.invocation_id)
+        if run is not None:
+            run["stages"][callback_context.agent_name] = [time.perf_counter(), None]
+
+    def stage_finished(self, callback_context: CallbackContext):
+        run = self._runs.get(callback_context.invocation_id)
+        if run is not None and callback_context.agent_name in run["stages"]:
+            run["stages"][callback_context.agent_name][1] = time.perf_counter()
+
+    def run_finished(self, callback_context: CallbackContext):
+        run = self._runs.pop(callback_context.invocation_id, None)
+        if run is not None:
+            callback_context.state[CRITICAL_PATH_KEY] = self.report(run["started_at"], time.perf_counter(), run["stages"])
+
+    def discard(self, invocation_id: str):
+        """Forgets a run that ended without `run_finished`, e.g. on an error or a cancelled stream."""
+        self._runs.pop(invocation_id, None)
+
+    def report(self, started_at: float, finished_at: float, spans: dict) -> dict:
+        """
+        Walks back from the last stage to finish, each time to the stage that
+        finished last before it started, since that is the one it waited on.
+        With wave scheduling this can be a slower stage of the previous wave
+        rather than a declared dependency.
+        """
+        finished = {name: span for name, span in spans.items() if span[1] is not None}
+        path, current = [], max(finished, key=lambda name: finished[name][1], default=None)
+        while current is not None:
+            start, end = finished[current]
+            path.append({"stage": current, "start_s": round(start - started_at, 3), "duration_s": round(end - start, 3)})
+            waited_on = [name for name, (_, other_end) in finished.items() if other_end <= start]
+            current = max(waited_on, key=lambda name: finished[name][1], default=None)
+
+        return {
+            "total_s": round(finished_at - started_at, 3),
+            "critical_path": path[::-1],
+            # What running every stage one after another would have cost
+            "sequential_s": round(sum(end - start for start, end in finished.values()), 3),
+            "stages": {name: round(end - start, 3) for name, (start, end) in finished.items()},
+        }
+
+
+class TimedPipeline(SequentialAgent):
+    """The root agent of a stage graph; its timer forgets the run however it ends."""
+
+    timer: StageTimer
+
+    async def run_async(self, parent_context: InvocationContext) -> AsyncGenerator[Event, None]:
+        try:
+            async for event in super().run_async(parent_context):
+                yield event
+        finally:
+            # after_agent_callback (run_finished) is skipped when a stage raises
+            self.timer.discard(parent_context.invocation_id)
+
+
+def build_pipeline(name: str, stages: Sequence[Stage], description: str = "",
+                   timer: Optional[StageTimer] = None) -> TimedPipeline:
+    """
+    Builds a runnable agent from a stage graph.
+
+    Waves are a simple schedule: a stage waits for its whole wave to finish,
+    not just for its own dependencies. That is exact for fork-join graphs
+    like the RCA pipeline.
+
+    Args:
+        name: Name of the root agent.
+        stages: The graph, in any order.
+        description: Description of the root agent.
+        timer: Where stage timings go; one is created if not given.
+    """
+    timer = timer or StageTimer()
+    for stage in stages:
+        stage.agent.before_agent_callback = _with_callback(stage.agent.before_agent_callback, timer.stage_started)
+        stage.agent.after_agent_callback = _with_callback(stage.agent.after_agent_callback, timer.stage_finished)
+
+    steps = []
+    for index, wave in enumerate(waves(stages)):
+        if len(wave) == 1:
+            steps.append(wave[0].agent)
+        else:
+            steps.append(ParallelAgent(name=f"{name}_wave_{index + 1}", sub_agents=[stage.agent for stage in wave],
+                                       description=" + ".join(stage.name for stage in wave)))
+
+    return TimedPipeline(name=name, description=description, sub_agents=steps, timer=timer,
+                         before_agent_callback=timer.run_started, after_agent_callback=timer.run_finished)
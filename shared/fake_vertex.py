@@ -0,0 +1,152 @@
+"""A local stand-in for a Vertex AI model endpoint that throttles like the real one.
+
+`FakeVertexEndpoint` enforces its own quota over a rolling window and answers
+with 429 `ResourceExhausted` errors once it is exceeded. Latency grows with
+the number of requests in flight and, optionally, with the length of the
+answer and of the prompt it has to read. Random throttling can be injected
+to mimic contention on shared quota. `FakeVertexLlm` puts an endpoint behind
+the ADK model interface, so the scheduler and the pipelines can be exercised
+offline. `FakeCacheService` stands in for Vertex AI context caching: requests
+that reference one of its caches are billed and timed as cache hits.
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncGenerator, Optional
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from pydantic import ConfigDict
+
+from .scheduler import estimate_tokens, prompt_tokens
+
+
+class ResourceExhausted(Exception):
+    """What the endpoint raises when over quota; mirrors the SDKs' 429 errors."""
+    code = 429
+
+    def __init__(self, message: str = "429 RESOURCE_EXHAUSTED: Quota exceeded"):
+        super().__init__(message)
+
+
+class FakeVertexEndpoint:
+    """
+    Args:
+        rpm: Requests per minute the endpoint accepts.
+        tpm: Tokens per minute the endpoint accepts.
+        window_s: Window the quota is enforced over (scaled from per-minute).
+        base_latency_s: Latency of a request on an idle endpoint.
+        congestion_s: Extra latency per request already in flight.
+        throttle_probability: Chance of a 429 even when under quota.
+        decode_s_per_token: Extra latency per output token, for answers whose length varies.
+        prefill_s_per_token: Extra latency per prompt token not served from a context cache.
+    """
+
+    def __init__(self, rpm: float = 600, tpm: float = 1_000_000, window_s: float = 10.0, base_latency_s: float = 0.4,
+                 congestion_s: float = 0.01, throttle_probability: float = 0.0, seed: int = 7,
+                 decode_s_per_token: float = 0.0, prefill_s_per_token: float = 0.0):
+        self.max_requests = rpm * window_s / 60
+        self.max_tokens = tpm * window_s / 60
+        self.window_s = window_s
+        self.base_latency_s = base_latency_s
+        self.congestion_s = congestion_s
+        self.throttle_probability = throttle_probability
+        self.decode_s_per_token = decode_s_per_token
+        self.prefill_s_per_token = prefill_s_per_token
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.accepted = 0
+        self.throttled = 0
+        self._recent: deque = deque()
+        self._recent_tokens = 0
+
+    def _admit(self, tokens: int):
+        now = time.monotonic()
+        while self._recent and now - self._recent[0][0] > self.window_s:
+            self._recent_tokens -= self._recent.popleft()[1]
+        over_quota = len(self._recent) + 1 > self.max_requests or self._recent_tokens + tokens > self.max_tokens
+        if over_quota or self.rng.random() < self.throttle_probability:
+            self.throttled += 1
+            raise ResourceExhausted()
+        self._recent.append((now, tokens))
+        self._recent_tokens += tokens
+        self.accepted += 1
+
+    async def generate(self, tokens: int, output_tokens: int = 0, prefill_tokens: int = 0) -> float:
+        """
+        Serves one request of `tokens` tokens, `output_tokens` of them generated
+        and `prefill_tokens` read from scratch; returns its latency.
+        """
+        self._admit(tokens)
+        self.in_flight += 1
+        try:
+            latency = (self.base_latency_s + self.congestion_s * self.in_flight
+                       + self.decode_s_per_token * output_tokens + self.prefill_s_per_token * prefill_tokens)
+            await asyncio.sleep(latency * self.rng.uniform(0.8, 1.2))
+            return latency
+        finally:
+            self.in_flight -= 1
+
+
+class FakeCacheService:
+    """
+    Creates cached contents like the genai client's `aio.caches`, without
+    storing anything remotely. Each cache remembers how many tokens its prefix
+    holds, which `FakeVertexLlm` bills as cached on every request that uses it.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self._tokens: dict[str, int] = {}
+        self._names = itertools.count(1)
+
+    async def create(self, model: str, config) -> types.CachedContent:
+        from .context_cache import prefix_tokens
+        tokens = prefix_tokens(config)
+        name = f"projects/fake/locations/local/cachedContents/{next(self._names)}"
+        self._tokens[name] = tokens
+        self.created += 1
+        ttl_s = int(str(config.ttl or "3600s").rstrip("s"))
+        return types.CachedContent(
+            name=name,
+            model=model,
+            expire_time=datetime.now(timezone.utc) + timedelta(seconds=ttl_s),
+            usage_metadata=types.CachedContentUsageMetadata(total_token_count=tokens),
+        )
+
+    def tokens(self, name: Optional[str]) -> int:
+        """Tokens held by the cache `name`; 0 for no cache."""
+        if not name:
+            return 0
+        if name not in self._tokens:
+            raise ValueError(f"404 NOT_FOUND: cached content {name} does not exist")
+        return self._tokens[name]
+
+
+class FakeVertexLlm(BaseLlm):
+    """An ADK model served by a `FakeVertexEndpoint`."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    endpoint: FakeVertexEndpoint
+    # Resolves requests that reference a cached prefix
+    caches: Optional[FakeCacheService] = None
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        config = llm_request.config
+        cached = self.caches.tokens(config.cached_content if config else None) if self.caches else 0
+        prompt = prompt_tokens(llm_request)
+        tokens = estimate_tokens(llm_request) + cached
+        await self.endpoint.generate(tokens, prefill_tokens=prompt)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=f"[fake] {self.model} response")]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt + cached,
+                cached_content_token_count=cached or None,
+                total_token_count=tokens,
+            ),
+        )
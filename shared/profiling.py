@@ -0,0 +1,438 @@
+"""Opt-in profiling of the agents' tools and callbacks.
+
+Tools and callbacks are decorated with `profiled`. While profiling is off
+(the default) the decorator only checks a flag. Profiling is a setting of
+the whole process, not of a session: turn it on with AGENT_PROFILE=1, or
+`set_profiling(True)` from a benchmark or admin script. Each call then
+records:
+
+- wall and CPU time (`time.thread_time`, so other threads are excluded),
+- allocations from tracemalloc: the peak above the memory in use when the
+  call started, and what it still holds when it returns. tracemalloc has
+  one peak for the whole process, so it is only reset when no other
+  profiled call is in flight; under concurrency a call's peak is an upper
+  bound that includes the calls overlapping it,
+- bytes moved: the text and binary payload of the arguments going in, and
+  of the return value plus whatever the call added to its arguments (e.g. a
+  PDF a callback attaches to the request) coming out.
+
+A sampling thread also records the Python stack of every profiled call in
+flight every AGENT_PROFILE_INTERVAL_MS (5 ms by default). `save` merges the
+samples and the per-call totals recorded since the previous `save` into
+AGENT_PROFILE_DIR (`.profiles/` by default), so reports aggregate across
+runs and processes:
+
+- `stacks.folded`: collapsed stacks for flamegraph.pl or speedscope,
+- `profile.speedscope.json`: the same samples for https://www.speedscope.app,
+- `calls.json`: the totals per tool and callback.
+
+    python -m shared.profiling           # the hottest tools and callbacks in .profiles/
+
+Totals are also kept per ADK invocation, for the last RECENT_RUNS runs, so
+an app can show one run's hot spots while other sessions run: pass
+`profiling_plugins()` to the `Runner`, and `report(run=event.invocation_id)`.
+
+Async callbacks share their thread with every other task on the event loop,
+so under concurrency their CPU time and allocations include work done by
+other tasks while they were suspended. Samples are attributed to the
+innermost profiled call on each thread.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_INTERVAL_MS = 5.0
+# Invocations whose totals are kept for per-run reports
+RECENT_RUNS = 64
+# Deepest nesting walked when counting the bytes of an argument or result
+MAX_PAYLOAD_DEPTH = 8
+
+
+def payload_bytes(value: Any, depth: int = 0) -> int:
+    """The text and binary bytes a value carries: strings, bytes and the containers and models holding them."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", "ignore"))
+    if depth >= MAX_PAYLOAD_DEPTH or value is None or isinstance(value, (bool, int, float)):
+        return 0
+    if isinstance(value, dict):
+        return sum(payload_bytes(item, depth + 1) for item in value.values())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(payload_bytes(item, depth + 1) for item in value)
+    # Data models such as ADK requests and genai parts; contexts and services are plain classes and skipped
+    model_fields = getattr(type(value), "model_fields", None)
+    if isinstance(model_fields, dict):
+        return sum(payload_bytes(getattr(value, name, None), depth + 1) for name in model_fields)
+    return 0
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    max_wall_s: float = 0.0
+    # Sum over calls of the peak allocated above the memory in use at the start of the call
+    alloc_peak_bytes: int = 0
+    alloc_retained_bytes: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    def add(self, other: "CallStats"):
+        for field in fields(self):
+            if field.name == "max_wall_s":
+                self.max_wall_s = max(self.max_wall_s, other.max_wall_s)
+            else:
+                setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+    def since(self, earlier: "CallStats") -> "CallStats":
+        """What was added after `earlier`, a copy of these totals; the max is kept as it is."""
+        delta = CallStats()
+        for field in fields(self):
+            value = getattr(self, field.name)
+            setattr(delta, field.name, value if field.name == "max_wall_s" else value - getattr(earlier, field.name))
+        return delta
+
+
+# The ADK invocation a profiled call belongs to, set by `profiling_plugins()`
+current_run: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("profiled_run", default=None)
+
+
+class Profiler:
+    """
+    Per-call totals and stack samples for every profiled function, shared by the process.
+
+    Args:
+        interval_ms: How often the sampling thread records the stacks of calls
+            in flight; AGENT_PROFILE_INTERVAL_MS by default.
+    """
+
+    def __init__(self, interval_ms: Optional[float] = None):
+        self.interval_s = (interval_ms or float(os.getenv("AGENT_PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS))) / 1000
+        self._lock = threading.Lock()
+        self.calls: dict[str, CallStats] = {}
+        self.stacks: Counter = Counter()
+        self.runs: OrderedDict[str, dict[str, CallStats]] = OrderedDict()
+        # What the last `save` wrote, so the next one only merges what came after
+        self._saved_calls: dict[str, CallStats] = {}
+        self._saved_stacks: Counter = Counter()
+        # Profiled calls in flight in the process, for the tracemalloc peak
+        self._in_flight = 0
+        # Thread id to the labels of the profiled calls running on it, innermost last
+        self._active: dict[int, list[str]] = {}
+        self._wrapper_codes: set = set()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._started_tracemalloc = False
+
+    def start(self):
+        with self._lock:
+            if self._sampler is not None:
+                return
+            if not tracemalloc.is_tracing():
+                # One frame per allocation keeps tracing overhead low; only totals are read
+                tracemalloc.start(1)
+                self._started_tracemalloc = True
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_forever, name="agent-profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        with self._lock:
+            sampler, self._sampler = self._sampler, None
+        if sampler is None:
+            return
+        self._stop.set()
+        sampler.join()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _sample_forever(self):
+        while not self._stop.wait(self.interval_s):
+            with self._lock:
+                active = {thread_id: labels[-1] for thread_id, labels in self._active.items() if labels}
+            if not active:
+                continue
+            frames = sys._current_frames()
+            samples = []
+            for thread_id, label in active.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                # Walk out to the profiled wrapper; everything inside it belongs to the call
+                while frame is not None and frame.f_code not in self._wrapper_codes:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if frame is None:
+                    # An async call suspended at an await; the thread is running something else
+                    stack = ["<awaiting>"]
+                samples.append(";".join([label, *reversed(stack)]))
+            with self._lock:
+                self.stacks.update(samples)
+
+    def _enter(self, label: str) -> bool:
+        """Registers a call; True if it is the only one in flight, so it may reset the tracemalloc peak."""
+        with self._lock:
+            self._active.setdefault(threading.get_ident(), []).append(label)
+            self._in_flight += 1
+            alone = self._in_flight == 1
+            if alone and tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            return alone
+
+    def _exit(self, label: str, stats: CallStats, run: Optional[str] = None):
+        with self._lock:
+            labels = self._active.get(threading.get_ident())
+            if labels:
+                labels.remove(label)
+            self._in_flight -= 1
+            self.calls.setdefault(label, CallStats()).add(stats)
+            if run is not None:
+                if run not in self.runs:
+                    self.runs[run] = {}
+                    while len(self.runs) > RECENT_RUNS:
+                        self.runs.popitem(last=False)
+                self.runs[run].setdefault(label, CallStats()).add(stats)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.stacks.clear()
+            self.runs.clear()
+            self._saved_calls.clear()
+            self._saved_stacks.clear()
+
+    def report(self, top: int = 10, run: Optional[str] = None) -> list[dict]:
+        """The hottest tools and callbacks by total wall time, in the process or in one ADK invocation."""
+        with self._lock:
+            calls = self.calls if run is None else self.runs.get(run, {})
+            calls = sorted(calls.items(), key=lambda item: item[1].wall_s, reverse=True)
+        return [{"name": name, **asdict(stats)} for name, stats in calls[:top]]
+
+    def save(self, directory: Optional[Path] = None) -> Path:
+        """
+        Merges what was recorded since the last save into the reports in
+        `directory`. The in-memory totals are left as they are, for other
+        sessions' reports.
+        """
+        directory = Path(directory or os.getenv("AGENT_PROFILE_DIR", REPO_ROOT / ".profiles"))
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stacks = self.stacks - self._saved_stacks
+            calls = {name: stats.since(self._saved_calls.get(name, CallStats()))
+                     for name, stats in self.calls.items()}
+            calls = {name: stats for name, stats in calls.items() if stats.calls}
+            self._saved_stacks = Counter(self.stacks)
+            self._saved_calls = {name: CallStats(**asdict(stats)) for name, stats in self.calls.items()}
+
+        folded = directory / "stacks.folded"
+        if folded.exists():
+            for line in folded.read_text().splitlines():
+                stack, _, count = line.rpartition(" ")
+                if stack:
+                    stacks[stack] += int(count)
+        calls_file = directory / "calls.json"
+        if calls_file.exists():
+            for name, saved in json.loads(calls_file.read_text()).items():
+                calls.setdefault(name, CallStats()).add(CallStats(**saved))
+
+        folded.write_text("".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items())))
+        calls_file.write_text(json.dumps({name: asdict(stats) for name, stats in calls.items()}, indent=1))
+        (directory / "profile.speedscope.json").write_text(json.dumps(speedscope(stacks, self.interval_s)))
+        return directory
+
+
+def hot_spots(report: list[dict]) -> list[str]:
+    """One line per entry of `Profiler.report`, for the apps' sidebars."""
+    return [f"{row['name']}: {row['calls']} calls · {row['wall_s']:.2f}s · CPU {row['cpu_s']:.2f}s · "
+            f"peak {row['alloc_peak_bytes'] / 2**20:.1f} MB · out {row['bytes_out'] / 2**20:.1f} MB"
+            for row in report]
+
+
+def speedscope(stacks: Counter, interval_s: float, name: str = "agent tools and callbacks") -> dict:
+    """Collapsed stack counts as a speedscope sampled profile, weighted in milliseconds."""
+    frames: dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in stacks.items():
+        samples.append([frames.setdefault(frame, len(frames)) for frame in stack.split(";")])
+        weights.append(round(count * interval_s * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": [{"name": frame} for frame in frames]},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": name,
+        "exporter": "shared.profiling",
+    }
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+_enabled = False
+
+
+def get_profiler() -> Profiler:
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler()
+        return _profiler
+
+
+def set_profiling(enabled: bool) -> Profiler:
+    """
+    Turns profiling of the decorated tools and callbacks on or off for the
+    whole process, every session included: for benchmarks and admin scripts,
+    not for a per-user setting.
+    """
+    global _enabled
+    profiler = get_profiler()
+    if enabled:
+        profiler.start()
+    else:
+        profiler.stop()
+    _enabled = enabled
+    return profiler
+
+
+def profiling_enabled() -> bool:
+    return _enabled
+
+
+def profiling_plugins() -> list:
+    """
+    ADK plugins for a `Runner` that attribute profiled calls to their
+    invocation, for `Profiler.report(run=...)`; none while profiling is off.
+    """
+    if not _enabled:
+        return []
+    from google.adk.plugins.base_plugin import BasePlugin
+
+    class RunTagPlugin(BasePlugin):
+        async def before_run_callback(self, *, invocation_context):
+            # Set in the run's task, so its agents, callbacks and tools (and the tasks and threads they start) see it
+            current_run.set(invocation_context.invocation_id)
+
+    return [RunTagPlugin(name="profiled_run")]
+
+
+class _Call:
+    """Measures one call of a profiled function."""
+
+    def __init__(self, label: str, args: tuple, kwargs: dict):
+        self.label = label
+        self.args = args
+        self.kwargs = kwargs
+
+    def __enter__(self):
+        self.profiler = get_profiler()
+        self.run = current_run.get()
+        self.bytes_in = payload_bytes(self.args) + payload_bytes(self.kwargs)
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            self.memory_at_start = tracemalloc.get_traced_memory()[0]
+        self.profiler._enter(self.label)
+        self.cpu_at_start = time.thread_time()
+        self.started_at = time.perf_counter()
+        return self
+
+    def finish(self, result: Any = None, error: bool = False):
+        wall = time.perf_counter() - self.started_at
+        cpu = time.thread_time() - self.cpu_at_start
+        stats = CallStats(calls=1, errors=int(error), wall_s=wall, cpu_s=cpu, max_wall_s=wall)
+        if self.tracing and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            stats.alloc_peak_bytes = max(peak - self.memory_at_start, 0)
+            stats.alloc_retained_bytes = max(current - self.memory_at_start, 0)
+        stats.bytes_in = self.bytes_in
+        # Callbacks hand data back by adding it to their arguments, e.g. the LLM request
+        grown = payload_bytes(self.args) + payload_bytes(self.kwargs) - self.bytes_in
+        stats.bytes_out = payload_bytes(result) + max(grown, 0)
+        self.profiler._exit(self.label, stats, self.run)
+
+
+def profiled(func: Callable) -> Callable:
+    """Profiles every call of a tool or callback while profiling is on; a flag check otherwise."""
+    label = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not _enabled:
+                return await func(*args, **kwargs)
+            call = _Call(label, args, kwargs).__enter__()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException:
+                call.finish(error=True)
+                raise
+            call.finish(result)
+            return result
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            call = _Call(label, args, kwargs).__enter__()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                call.finish(error=True)
+                raise
+            call.finish(result)
+            return result
+
+    get_profiler()._wrapper_codes.add(wrapper.__code__)
+    return wrapper
+
+
+if os.getenv("AGENT_PROFILE", "0") == "1":
+    set_profiling(True)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the hottest tools and callbacks in a saved profile.")
+    parser.add_argument("directory", nargs="?", type=Path,
+                        default=Path(os.getenv("AGENT_PROFILE_DIR", REPO_ROOT / ".profiles")))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    calls = json.loads((args.directory / "calls.json").read_text())
+    print(f"{'tool / callback':<28}{'calls':>7}{'wall s':>9}{'cpu s':>8}{'max s':>8}{'peak alloc MB':>15}"
+          f"{'in MB':>8}{'out MB':>8}")
+    for name, stats in sorted(calls.items(), key=lambda item: item[1]["wall_s"], reverse=True)[:args.top]:
+        print(f"{name:<28}{stats['calls']:>7}{stats['wall_s']:>9.2f}{stats['cpu_s']:>8.2f}{stats['max_wall_s']:>8.2f}"
+              f"{stats['alloc_peak_bytes'] / 2**20:>15.1f}{stats['bytes_in'] / 2**20:>8.1f}"
+              f"{stats['bytes_out'] / 2**20:>8.1f}")
+    print(f"\nflamegraph: {args.directory / 'profile.speedscope.json'} (https://www.speedscope.app)"
+          f" or {args.directory / 'stacks.folded'} (flamegraph.pl)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Record/replay stand-ins for the Gemini models used by the three pipelines.
+
+`ReplayLlm` plugs into the `model` slot of an ADK `Agent`. In record mode it
+forwards each request to a real Gemini model and writes the responses to a
+cassette directory; in replay mode it serves them back from disk after a
+configurable synthetic latency, so pipelines run offline and deterministically.
+
+`ReplayGenerativeModel` does the same for tools that call the Vertex AI
+`GenerativeModel` directly (e.g. SkyGuard's `analyze_aerial_image`).
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, AsyncGenerator, Literal, Optional
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+
+# Per-run accounting. Benchmarks set a fresh dict before each session so the
+# model time spent inside that session can be separated from pipeline overhead.
+run_stats: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("replay_run_stats", default=None)
+
+# Fields that differ between otherwise identical runs and must not affect the key.
+VOLATILE_KEYS = {"id", "thought_signature", "video_metadata"}
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def request_key(model: str, llm_request: LlmRequest) -> str:
+    """A stable hash of everything in a request that can change the answer."""
+    config = llm_request.config
+    system_instruction = config.system_instruction if config else None
+    if isinstance(system_instruction, types.Content):
+        system_instruction = system_instruction.model_dump(mode="json", exclude_none=True)
+
+    payload = {
+        "model": model,
+        "system_instruction": system_instruction,
+        "tools": sorted(llm_request.tools_dict or {}),
+        "contents": _strip_volatile([c.model_dump(mode="json", exclude_none=True) for c in llm_request.contents]),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+
+def record_time(kind: str, seconds: float):
+    """Adds time spent on `kind` (e.g. "model_s") to the current run's stats, if one is being tracked."""
+    stats = run_stats.get()
+    if stats is not None:
+        stats[kind] = stats.get(kind, 0.0) + seconds
+        stats[f"{kind}_calls"] = stats.get(f"{kind}_calls", 0) + 1
+
+
+class Cassette:
+    """A directory of recorded responses, one JSON file per request key."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._loaded: dict[str, Optional[list]] = {}
+
+    def load(self, key: str) -> Optional[list]:
+        if key not in self._loaded:
+            path = self.directory / f"{key}.json"
+            self._loaded[key] = json.loads(path.read_text())["responses"] if path.exists() else None
+        return self._loaded[key]
+
+    def save(self, key: str, model: str, responses: list):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{key}.json").write_text(json.dumps({"model": model, "responses": responses}, indent=1))
+        self._loaded[key] = responses
+
+
+def _placeholder(schema) -> Any:
+    """A minimal instance of a Pydantic output schema, for synthetic answers."""
+    values = {}
+    for name, field in schema.model_fields.items():
+        annotation = getattr(field.annotation, "__origin__", field.annotation)
+        if annotation is Literal:
+            values[name] = field.annotation.__args__[0]
+            continue
+        values[name] = {str: "synthetic", int: 0, float: 0.0, bool: False, list: [], dict: {}}.get(annotation, None)
+    return values
+
+
+class ReplayLlm(BaseLlm):
+    """
+    An ADK model that records and replays Gemini responses.
+
+    Attributes:
+        cassette_dir: Where recorded responses live.
+        mode: "record" forwards to a real Gemini model and saves responses,
+            "replay" serves them from the cassette.
+        latency_s: Synthetic latency added to every replayed call.
+        jitter_s: Uniform random jitter added on top of `latency_s`.
+        on_miss: "error" fails on an unrecorded request, "synthetic" answers
+            with a placeholder so pipeline overhead can still be measured.
+    """
+
+    cassette_dir: str
+    mode: str = "replay"
+    latency_s: float = 0.0
+    jitter_s: float = 0.0
+    on_miss: str = "error"
+    delegate: Optional[BaseLlm] = None
+
+    misses: int = 0
+
+    _cassette: Cassette = PrivateAttr()
+
+    def model_post_init(self, __context):
+        self._cassette = Cassette(self.cassette_dir)
+        if self.mode == "record" and self.delegate is None:
+            from google.adk.models import Gemini
+            self.delegate = Gemini(model=self.model)
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"replay/.*"]
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        key = request_key(self.model, llm_request)
+        started_at = time.perf_counter()
+
+        if self.mode == "record":
+            recorded = []
+            async for response in self.delegate.generate_content_async(llm_request, stream=stream):
+                recorded.append(json.loads(response.model_dump_json(exclude_none=True)))
+                yield response
+            self._cassette.save(key, self.model, recorded)
+            record_time("model_s", time.perf_counter() - started_at)
+            return
+
+        recorded = self._cassette.load(key)
+        if recorded is None:
+            if self.on_miss != "synthetic":
+                raise KeyError(f"No recorded response for {self.model} request {key} in {self.cassette_dir}")
+            self.misses += 1
+            recorded = [self._synthetic_response(llm_request)]
+
+        delay = self.latency_s + (random.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        record_time("model_s", time.perf_counter() - started_at)
+        for response in recorded:
+            yield LlmResponse.model_validate_json(json.dumps(response))
+
+    def _synthetic_response(self, llm_request: LlmRequest) -> dict:
+        schema = llm_request.config.response_schema if llm_request.config else None
+        # Agents with both tools and an output schema answer through ADK's set_model_response tool instead
+        set_response = (llm_request.tools_dict or {}).get("set_model_response")
+        if set_response is not None and getattr(set_response, "_model_type", None) is not None:
+            call = types.FunctionCall(name="set_model_response", args=_placeholder(set_response._model_type))
+            part = types.Part(function_call=call)
+        elif isinstance(schema, type) and hasattr(schema, "model_fields"):
+            part = types.Part(text=json.dumps(_placeholder(schema)))
+        else:
+            part = types.Part(text=f"[replay] synthetic {self.model} response")
+        response = LlmResponse(content=types.Content(role="model", parts=[part]))
+        return json.loads(response.model_dump_json(exclude_none=True))
+
+
+class _ReplayText:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ReplayGenerativeModel:
+    """
+    Drop-in for `vertexai.generative_models.GenerativeModel` inside tools.
+
+    Use `ReplayGenerativeModel.factory(...)` to build a callable with the same
+    signature as the `GenerativeModel` constructor.
+    """
+
+    def __init__(self, model_name: str, cassette: Cassette, mode: str, latency_s: float, on_miss: str, synthetic_text: str):
+        self.model_name = model_name
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_s = latency_s
+        self.on_miss = on_miss
+        self.synthetic_text = synthetic_text
+
+    @classmethod
+    def factory(cls, cassette_dir, mode: str = "replay", latency_s: float = 0.0, on_miss: str = "error",
+                synthetic_text: str = "{}"):
+        cassette = Cassette(cassette_dir)
+        return lambda model_name, **_: cls(model_name, cassette, mode, latency_s, on_miss, synthetic_text)
+
+    def _key(self, contents) -> str:
+        digest = hashlib.sha256(self.model_name.encode())
+        for item in contents:
+            if hasattr(item, "to_dict"):
+                digest.update(json.dumps(item.to_dict(), sort_keys=True, default=str).encode())
+            else:
+                digest.update(str(item).encode())
+        return digest.hexdigest()[:24]
+
+    def _replayed(self, key: str) -> str:
+        recorded = self.cassette.load(key)
+        if recorded is None:
+            if self.on_miss != "synthetic":
+                raise KeyError(f"No recorded response for {self.model_name} request {key} in {self.cassette.directory}")
+            recorded = [self.synthetic_text]
+        return recorded[0]
+
+    def generate_content(self, contents, **kwargs):
+        key = self._key(contents)
+        started_at = time.perf_counter()
+
+        if self.mode == "record":
+            from vertexai.generative_models import GenerativeModel
+            text = GenerativeModel(self.model_name).generate_content(contents, **kwargs).text
+            self.cassette.save(key, self.model_name, [text])
+        else:
+            text = self._replayed(key)
+            # Blocks the calling thread exactly like the real SDK call would
+            time.sleep(self.latency_s)
+        # Counted separately: this time is already inside the calling tool's time
+        record_time("tool_model_s", time.perf_counter() - started_at)
+        return _ReplayText(text)
+
+    async def generate_content_async(self, contents, **kwargs):
+        key = self._key(contents)
+        started_at = time.perf_counter()
+
+        if self.mode == "record":
+            from vertexai.generative_models import GenerativeModel
+            text = (await GenerativeModel(self.model_name).generate_content_async(contents, **kwargs)).text
+            self.cassette.save(key, self.model_name, [text])
+        else:
+            text = self._replayed(key)
+            await asyncio.sleep(self.latency_s)
+        record_time("tool_model_s", time.perf_counter() - started_at)
+        return _ReplayText(text)
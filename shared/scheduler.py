@@ -0,0 +1,444 @@
+"""Process-wide scheduler for Gemini calls on Vertex AI.
+
+Every model call in the three pipelines goes through one `VertexScheduler`:
+ADK agents via `scheduled_model(...)`, which wraps their model, and tools that
+call the SDK directly via `get_scheduler().call(...)`. For each model it keeps
+
+- token buckets for requests/min and tokens/min, so bursts are smoothed to
+  the project's quota instead of being answered with 429s,
+- two priority lanes: "interactive" (the default) is always served before
+  "batch", and batch work may only use part of the concurrency limit,
+- an adaptive concurrency limit that grows while calls queue for a slot and
+  is halved on every 429, plus a short cooldown before retrying,
+- queue metrics (`get_scheduler().metrics()`).
+
+Quotas come from VERTEX_RPM / VERTEX_TPM, or per model from VERTEX_QUOTAS,
+e.g. '{"gemini-3-pro-preview": {"rpm": 60, "tpm": 400000}}'.
+Replayed models get `UNTHROTTLED`: no quota, but the same lanes and limit.
+
+The scheduler is thread-safe and works across event loops, since Streamlit's
+`Runner.run` starts a fresh loop in a worker thread for every run.
+"""
+
+import asyncio
+import contextvars
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional, Union
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+
+LANES = ("interactive", "batch")
+IMAGE_TOKENS = 258
+DEFAULT_OUTPUT_TOKENS = 1024
+
+current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("vertex_lane", default="interactive")
+
+
+@contextmanager
+def lane(name: str):
+    """Runs model calls made inside the block in the given priority lane."""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane '{name}', expected one of {LANES}")
+    token = current_lane.set(name)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+@lru_cache(maxsize=None)
+def init_vertexai(project_id: Optional[str], location: Optional[str]):
+    """Initializes the Vertex AI SDK once per project and location."""
+    import vertexai
+    vertexai.init(project=project_id, location=location)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for quota errors from the genai client, the Vertex AI SDK or the local fake."""
+    code = getattr(error, "code", None)
+    if callable(code):
+        code = code()
+    code = getattr(code, "value", code)
+    return code == 429 or getattr(error, "status_code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+@lru_cache(maxsize=64)
+def _pdf_pages(data: bytes) -> int:
+    return max(len(re.findall(rb"/Type\s*/Page\b(?!s)", data)), 1)
+
+
+def blob_tokens(blob: Any) -> int:
+    """Input tokens of an inline image or document: Gemini bills every PDF page like one image."""
+    if getattr(blob, "mime_type", None) == "application/pdf" and getattr(blob, "data", None):
+        return _pdf_pages(blob.data) * IMAGE_TOKENS
+    return IMAGE_TOKENS
+
+
+def prompt_tokens(llm_request: LlmRequest) -> int:
+    """A rough count of what a request sends: ~4 characters per token, images and documents by size."""
+    chars = 0
+    media = 0
+    config = llm_request.config
+    if config and isinstance(config.system_instruction, str):
+        chars += len(config.system_instruction)
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            elif part.inline_data or part.file_data:
+                media += blob_tokens(part.inline_data)
+            elif part.function_call or part.function_response:
+                chars += 200
+    return chars // 4 + media
+
+
+def estimate_tokens(llm_request: LlmRequest) -> int:
+    """A rough pre-call token count: the prompt plus output and thinking allowances."""
+    config = llm_request.config
+    output = (config.max_output_tokens if config and config.max_output_tokens else DEFAULT_OUTPUT_TOKENS)
+    thinking = config.thinking_config.thinking_budget if config and config.thinking_config else None
+    return prompt_tokens(llm_request) + output + max(thinking or 0, 0)
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage else None
+
+
+@dataclass
+class ModelQuota:
+    rpm: float = 300
+    tpm: float = 1_000_000
+    initial_concurrency: int = 16
+    max_concurrency: int = 64
+
+
+# For replayed models: there is no quota to protect, but their calls still go
+# through admission, the lanes and the adaptive limit, so benchmarks measure them
+UNTHROTTLED = ModelQuota(rpm=math.inf, tpm=math.inf)
+
+
+def _quota_from_env(model: str) -> ModelQuota:
+    quota = ModelQuota(
+        rpm=float(os.getenv("VERTEX_RPM", ModelQuota.rpm)),
+        tpm=float(os.getenv("VERTEX_TPM", ModelQuota.tpm)),
+        max_concurrency=int(os.getenv("VERTEX_MAX_CONCURRENCY", ModelQuota.max_concurrency)),
+    )
+    overrides = json.loads(os.getenv("VERTEX_QUOTAS", "{}")).get(model, {})
+    for key, value in overrides.items():
+        setattr(quota, key, value)
+    return quota
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` units per second up to `capacity`. Takes may
+    overdraw it (large requests, or reconciling an estimate with actual
+    usage); later callers then wait for the debt to refill.
+    """
+
+    def __init__(self, per_minute: float, burst_s: float = 1.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_s, 1.0)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_s(self, amount: float, now: float) -> float:
+        if math.isinf(self.rate):
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+
+class _Ticket:
+    __slots__ = ("lane", "tokens", "loop", "event", "enqueued_at")
+
+    def __init__(self, lane: str, tokens: int):
+        self.lane = lane
+        self.tokens = tokens
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.enqueued_at = time.monotonic()
+
+
+@dataclass
+class Grant:
+    model: str
+    lane: str
+    tokens: int
+    granted_at: float
+
+
+class _ModelState:
+    def __init__(self, quota: ModelQuota):
+        self.quota = quota
+        self.requests = TokenBucket(quota.rpm)
+        self.tokens = TokenBucket(quota.tpm)
+        self.limit = float(quota.initial_concurrency)
+        self.in_flight = 0
+        self.queues: dict[str, deque] = {name: deque() for name in LANES}
+        self.cooldown_until = 0.0
+        self.consecutive_throttles = 0
+        self.last_decrease = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.waits: dict[str, deque] = {name: deque(maxlen=500) for name in LANES}
+        self.counters = {"granted": 0, "throttled": 0, "retried": 0, "errors": 0}
+
+
+def _p95(samples) -> float:
+    ordered = sorted(samples)
+    return ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0
+
+
+class VertexScheduler:
+    """
+    Admits model calls per model under rate, token and concurrency limits.
+
+    Args:
+        batch_share: Fraction of the concurrency limit batch calls may use,
+            so interactive calls always find a free slot quickly.
+        max_retries: Retries for a call rejected with 429.
+    """
+
+    def __init__(self, batch_share: float = 0.75, max_retries: int = 4):
+        self.batch_share = batch_share
+        self.max_retries = max_retries
+        self._models: dict[str, _ModelState] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, model: str, quota: ModelQuota):
+        with self._lock:
+            self._models[model] = _ModelState(quota)
+
+    def _state(self, model: str, quota: Optional[ModelQuota] = None) -> _ModelState:
+        """The model's limits, created from `quota` (or the environment) on its first call."""
+        if model not in self._models:
+            self._models[model] = _ModelState(quota or _quota_from_env(model))
+        return self._models[model]
+
+    # --- Admission ---
+
+    async def acquire(self, model: str, tokens: int, lane: Optional[str] = None,
+                      quota: Optional[ModelQuota] = None) -> Grant:
+        lane = lane or current_lane.get()
+        ticket = _Ticket(lane, tokens)
+        with self._lock:
+            state = self._state(model, quota)
+            state.queues[lane].append(ticket)
+        try:
+            while True:
+                with self._lock:
+                    ticket.event.clear()
+                    wait = self._try_grant(state, ticket, time.monotonic())
+                if wait == 0:
+                    return Grant(model, lane, tokens, time.monotonic())
+                try:
+                    await asyncio.wait_for(ticket.event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                if ticket in state.queues[lane]:
+                    state.queues[lane].remove(ticket)
+                    self._notify(state)
+            raise
+
+    def _try_grant(self, state: _ModelState, ticket: _Ticket, now: float) -> Optional[float]:
+        """0 when granted, seconds to wait for quota to refill, or None to wait for a release."""
+        queue = state.queues[ticket.lane]
+        if queue[0] is not ticket:
+            return None
+        if ticket.lane != "interactive" and state.queues["interactive"]:
+            return None
+        if now < state.cooldown_until:
+            return state.cooldown_until - now
+        cap = state.limit if ticket.lane == "interactive" else max(1.0, state.limit * self.batch_share)
+        if state.in_flight >= int(cap):
+            return None
+        wait = max(state.requests.wait_s(1, now), state.tokens.wait_s(ticket.tokens, now))
+        if wait > 0:
+            return wait
+
+        state.requests.take(1)
+        state.tokens.take(ticket.tokens)
+        state.in_flight += 1
+        state.counters["granted"] += 1
+        state.waits[ticket.lane].append(now - ticket.enqueued_at)
+        queue.popleft()
+        self._notify(state)
+        return 0
+
+    def _notify(self, state: _ModelState):
+        for name in LANES:
+            if state.queues[name]:
+                head = state.queues[name][0]
+                head.loop.call_soon_threadsafe(head.event.set)
+
+    def release(self, grant: Grant, latency_s: Optional[float] = None, throttled: bool = False,
+                actual_tokens: Optional[int] = None):
+        """Returns a slot and feeds the outcome back into the limits."""
+        with self._lock:
+            state = self._state(grant.model)
+            state.in_flight -= 1
+            if actual_tokens is not None:
+                state.tokens.take(actual_tokens - grant.tokens)
+
+            if throttled:
+                now = time.monotonic()
+                state.counters["throttled"] += 1
+                state.consecutive_throttles += 1
+                # Calls that were already in flight when the first 429 hit count as one congestion signal
+                if now - state.last_decrease > (state.latency_ewma or 1.0):
+                    state.limit = max(1.0, state.limit / 2)
+                    state.last_decrease = now
+                backoff = min(0.5 * 2 ** (state.consecutive_throttles - 1), 30.0)
+                state.cooldown_until = now + backoff * random.uniform(0.8, 1.2)
+            elif latency_s is not None:
+                state.consecutive_throttles = 0
+                self._adapt(state, latency_s)
+            self._notify(state)
+
+    def _adapt(self, state: _ModelState, latency_s: float):
+        state.latency_ewma = latency_s if state.latency_ewma is None else 0.8 * state.latency_ewma + 0.2 * latency_s
+        # Latency is not a congestion signal here: it scales with output and thinking
+        # tokens, so a run of long answers would look like an overloaded endpoint.
+        # Only 429s shrink the limit, and it only grows while calls wait for a slot.
+        if any(state.queues.values()):
+            state.limit = min(float(state.quota.max_concurrency), state.limit + 1.0 / state.limit)
+
+    # --- Calls ---
+
+    async def call(self, model: str, fn: Callable[[], Awaitable[Any]], tokens: int, lane: Optional[str] = None,
+                   quota: Optional[ModelQuota] = None) -> Any:
+        """Runs `fn()` once admitted, retrying on 429 after the model's cooldown."""
+        for attempt in range(self.max_retries + 1):
+            grant = await self.acquire(model, tokens, lane, quota)
+            started_at = time.monotonic()
+            try:
+                result = await fn()
+            except BaseException as e:
+                throttled = isinstance(e, Exception) and is_rate_limited(e)
+                self.release(grant, throttled=throttled)
+                if not throttled or attempt == self.max_retries:
+                    self._count(model, "errors")
+                    raise
+                self._count(model, "retried")
+                continue
+            self.release(grant, latency_s=time.monotonic() - started_at, actual_tokens=_usage_tokens(result))
+            return result
+
+    def _count(self, model: str, counter: str):
+        with self._lock:
+            self._state(model).counters[counter] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                model: {
+                    "concurrency_limit": round(state.limit, 2),
+                    "in_flight": state.in_flight,
+                    "queued": {name: len(queue) for name, queue in state.queues.items()},
+                    "queue_wait_p95_s": {name: round(_p95(waits), 4) for name, waits in state.waits.items()},
+                    "latency_ewma_s": round(state.latency_ewma, 4) if state.latency_ewma else None,
+                    "cooling_down": state.cooldown_until > time.monotonic(),
+                    **state.counters,
+                }
+                for model, state in self._models.items()
+            }
+
+
+_scheduler: Optional[VertexScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> VertexScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = VertexScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler: VertexScheduler) -> VertexScheduler:
+    """Replaces the process-wide scheduler, e.g. with differently tuned limits in tests."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+    return scheduler
+
+
+class ScheduledLlm(BaseLlm):
+    """An ADK model that sends every request of `inner` through the shared scheduler."""
+
+    inner: BaseLlm
+    lane: Optional[str] = None
+    # Limits for the model's first call when they should not come from the environment
+    quota: Optional[ModelQuota] = None
+
+    @property
+    def capabilities(self):
+        return self.inner.capabilities
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        scheduler = get_scheduler()
+        tokens = estimate_tokens(llm_request)
+        for attempt in range(scheduler.max_retries + 1):
+            grant = await scheduler.acquire(self.model, tokens, self.lane, self.quota)
+            started_at = time.monotonic()
+            held, yielded, usage = [], False, None
+            try:
+                async for response in self.inner.generate_content_async(llm_request, stream=stream):
+                    usage = _usage_tokens(response) or usage
+                    # ADK runs the function calls of a final response before it asks for the next one, so a
+                    # tool that calls Gemini itself would queue behind the slot its own agent still holds
+                    if not response.partial:
+                        held.append(response)
+                        continue
+                    yielded = True
+                    yield response
+            except Exception as e:
+                # Once output has reached the caller the request cannot be replayed transparently
+                throttled = is_rate_limited(e)
+                scheduler.release(grant, throttled=throttled)
+                if not throttled or yielded or attempt == scheduler.max_retries:
+                    scheduler._count(self.model, "errors")
+                    raise
+                scheduler._count(self.model, "retried")
+                continue
+            except BaseException:
+                scheduler.release(grant)
+                raise
+            scheduler.release(grant, latency_s=time.monotonic() - started_at, actual_tokens=usage)
+            for response in held:
+                yield response
+            return
+
+
+def scheduled_model(model: Union[str, BaseLlm], lane: Optional[str] = None) -> ScheduledLlm:
+    """Wraps a model name or instance so its calls go through the shared scheduler."""
+    if isinstance(model, ScheduledLlm):
+        return model
+    if isinstance(model, str):
+        from google.adk.models.registry import LLMRegistry
+        model = LLMRegistry.new_llm(model)
+    # Replayed responses come from disk, so only the quota is lifted
+    quota = UNTHROTTLED if getattr(model, "mode", None) == "replay" else None
+    return ScheduledLlm(model=model.model, inner=model, lane=lane, quota=quota)
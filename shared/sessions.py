@@ -0,0 +1,363 @@
+"""A persistent, compacting ADK session service backed by SQLite.
+
+`SqliteSessionService` is a drop-in for `InMemorySessionService`:
+
+    session_service = SqliteSessionService(".sessions/sessions.db")
+    runner = Runner(agent=..., app_name=..., session_service=session_service)
+
+Nothing is kept in process memory between calls, so memory stays flat no
+matter how many sessions exist. History is bounded: once a session holds more
+than `window + compact_batch` events, the oldest are folded into a plain-text
+summary that `get_session` returns as the first event, so long conversations
+stop resending their full history on every turn. Sessions untouched for
+`ttl_s` are deleted.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session, State
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.genai import types
+
+DEFAULT_DB = Path(os.getenv("ADK_SESSION_DB", ".sessions/sessions.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    summary TEXT NOT NULL DEFAULT '',
+    compacted INTEGER NOT NULL DEFAULT 0,
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    stored INTEGER NOT NULL DEFAULT 0,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE INDEX IF NOT EXISTS sessions_by_update_time ON sessions (update_time);
+CREATE TABLE IF NOT EXISTS events (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS events_by_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+# Fixed statement texts, so sqlite3's per-connection cache compiles each one once
+INSERT_SESSION = "INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_SESSION = ("SELECT state, summary, compacted, next_seq, stored, update_time FROM sessions "
+                  "WHERE app_name = ? AND user_id = ? AND id = ?")
+UPDATE_SESSION = ("UPDATE sessions SET state = ?, next_seq = ?, stored = ?, update_time = ? "
+                  "WHERE app_name = ? AND user_id = ? AND id = ?")
+UPDATE_SUMMARY = ("UPDATE sessions SET summary = ?, compacted = compacted + ?, stored = stored - ? "
+                  "WHERE app_name = ? AND user_id = ? AND id = ?")
+DELETE_SESSION = "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?"
+INSERT_EVENT = "INSERT INTO events (app_name, user_id, session_id, seq, timestamp, data) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_EVENTS = ("SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND timestamp > ? "
+                 "ORDER BY seq")
+SELECT_RECENT_EVENTS = ("SELECT data FROM (SELECT seq, data FROM events WHERE app_name = ? AND user_id = ? "
+                        "AND session_id = ? AND timestamp > ? ORDER BY seq DESC LIMIT ?) ORDER BY seq")
+SELECT_OLDEST_EVENTS = ("SELECT seq, data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                        "ORDER BY seq LIMIT ?")
+DELETE_EVENTS_UPTO = "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq <= ?"
+DELETE_EVENTS = "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+SELECT_APP_STATE = "SELECT state FROM app_states WHERE app_name = ?"
+UPSERT_APP_STATE = ("INSERT INTO app_states (app_name, state) VALUES (?, ?) "
+                    "ON CONFLICT (app_name) DO UPDATE SET state = excluded.state")
+SELECT_USER_STATE = "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?"
+UPSERT_USER_STATE = ("INSERT INTO user_states (app_name, user_id, state) VALUES (?, ?, ?) "
+                     "ON CONFLICT (app_name, user_id) DO UPDATE SET state = excluded.state")
+LIST_SESSIONS = "SELECT user_id, id, state, update_time FROM sessions WHERE app_name = ?"
+LIST_USER_SESSIONS = "SELECT user_id, id, state, update_time FROM sessions WHERE app_name = ? AND user_id = ?"
+EXPIRED_EVENTS = ("DELETE FROM events WHERE (app_name, user_id, session_id) IN "
+                  "(SELECT app_name, user_id, id FROM sessions WHERE update_time < ?)")
+EXPIRED_SESSIONS = "DELETE FROM sessions WHERE update_time < ?"
+
+SUMMARY_PREFIX = "Summary of the earlier conversation ({count} events):\n"
+
+
+def _split_state(state: dict) -> tuple[dict, dict, dict]:
+    """Splits a state dict into app-, user- and session-scoped parts; temp: keys are dropped."""
+    app, user, session = {}, {}, {}
+    for key, value in state.items():
+        if key.startswith(State.APP_PREFIX):
+            app[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+def _merge_state(session: dict, app: dict, user: dict) -> dict:
+    merged = dict(session)
+    merged.update({State.APP_PREFIX + key: value for key, value in app.items()})
+    merged.update({State.USER_PREFIX + key: value for key, value in user.items()})
+    return merged
+
+
+def summarize_event(event: Event, max_chars: int = 300) -> Optional[str]:
+    """One line describing an event for the rolling summary, or None if it adds nothing."""
+    if not event.content or not event.content.parts:
+        return None
+    pieces = []
+    for part in event.content.parts:
+        if part.thought:
+            continue
+        if part.function_call:
+            pieces.append(f"called {part.function_call.name}({', '.join(part.function_call.args or {})})")
+        elif part.function_response:
+            pieces.append(f"got a result from {part.function_response.name}")
+        elif part.text:
+            pieces.append(" ".join(part.text.split()))
+    if not pieces:
+        return None
+    line = f"{event.author}: {'; '.join(pieces)}"
+    return line if len(line) <= max_chars else line[:max_chars - 1] + "…"
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    ADK session service storing sessions and events in one SQLite file.
+
+    Args:
+        db_path: Database file; parent folders are created.
+        window: Events kept verbatim per session. Older ones are summarized.
+        compact_batch: How far past `window` a session may grow before
+            compacting, so compaction runs once per batch rather than on every append.
+        max_summary_chars: Cap on a session's summary; the oldest lines go first.
+        ttl_s: Sessions not updated for this long are deleted. None keeps them forever.
+        reclaim_interval_s: Minimum time between TTL sweeps.
+
+    The connection runs in WAL mode and is shared by all threads behind a lock.
+    Streamlit's `Runner.run` drives the event loop from a worker thread. Every
+    statement is short and indexed, so queries run inline rather than in an
+    executor.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB, window: int = 40, compact_batch: int = 10,
+                 max_summary_chars: int = 6000, ttl_s: Optional[float] = 7 * 24 * 3600,
+                 reclaim_interval_s: float = 300.0):
+        self.db_path = Path(db_path)
+        self.window = window
+        self.compact_batch = compact_batch
+        self.max_summary_chars = max_summary_chars
+        self.ttl_s = ttl_s
+        self.reclaim_interval_s = reclaim_interval_s
+        self._last_reclaim = 0.0
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False,
+                                     cached_statements=64)
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        # Lets reclaim_expired hand free pages back to the OS. This only takes
+        # effect on a file without tables, so it comes before journal_mode and
+        # the schema; files created before that are converted by one VACUUM.
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if self._conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self._conn.execute("VACUUM")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _read(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- BaseSessionService ---
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        self._maybe_reclaim()
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        app_delta, user_delta, session_state = _split_state(state or {})
+        now = time.time()
+
+        with self._transaction() as conn:
+            if conn.execute(SELECT_SESSION, (app_name, user_id, session_id)).fetchone():
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+            app_state = self._update_scoped(conn, SELECT_APP_STATE, UPSERT_APP_STATE, (app_name,), app_delta)
+            user_state = self._update_scoped(conn, SELECT_USER_STATE, UPSERT_USER_STATE, (app_name, user_id), user_delta)
+            conn.execute(INSERT_SESSION, (app_name, user_id, session_id, json.dumps(session_state), now, now))
+
+        return Session(id=session_id, app_name=app_name, user_id=user_id,
+                       state=_merge_state(session_state, app_state, user_state), events=[], last_update_time=now)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute(SELECT_SESSION, (app_name, user_id, session_id)).fetchone()
+            if row is None:
+                return None
+            state, summary, compacted, _, _, update_time = row
+
+            after = (config.after_timestamp if config and config.after_timestamp else None) or 0.0
+            if config and config.num_recent_events:
+                rows = self._conn.execute(SELECT_RECENT_EVENTS,
+                                          (app_name, user_id, session_id, after, config.num_recent_events)).fetchall()
+            else:
+                rows = self._conn.execute(SELECT_EVENTS, (app_name, user_id, session_id, after)).fetchall()
+            app_row = self._conn.execute(SELECT_APP_STATE, (app_name,)).fetchone()
+            user_row = self._conn.execute(SELECT_USER_STATE, (app_name, user_id)).fetchone()
+
+        events = [Event.model_validate_json(data) for (data,) in rows]
+        # A caller asking for only recent or newer events does not want the summary of older ones
+        if summary and not (config and (config.num_recent_events or config.after_timestamp)):
+            events.insert(0, self._summary_event(summary, compacted, events[0].timestamp if events else update_time))
+
+        return Session(
+            id=session_id, app_name=app_name, user_id=user_id,
+            state=_merge_state(json.loads(state), json.loads(app_row[0]) if app_row else {},
+                               json.loads(user_row[0]) if user_row else {}),
+            events=events, last_update_time=update_time,
+        )
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        if user_id is None:
+            rows = self._read(LIST_SESSIONS, (app_name,))
+        else:
+            rows = self._read(LIST_USER_SESSIONS, (app_name, user_id))
+        return ListSessionsResponse(sessions=[
+            Session(id=session_id, app_name=app_name, user_id=owner, state=json.loads(state), events=[],
+                    last_update_time=update_time)
+            for owner, session_id, state, update_time in rows
+        ])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(DELETE_EVENTS, (app_name, user_id, session_id))
+            conn.execute(DELETE_SESSION, (app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Applies the state delta to the in-memory session and drops temp: keys from the event
+        event = await super().append_event(session=session, event=event)
+        self._maybe_reclaim()
+
+        key = (session.app_name, session.user_id, session.id)
+        delta = event.actions.state_delta if event.actions else {}
+        app_delta, user_delta, session_delta = _split_state(delta or {})
+
+        with self._transaction() as conn:
+            row = conn.execute(SELECT_SESSION, key).fetchone()
+            if row is None:
+                raise ValueError(f"Session {session.id} not found; it may have expired.")
+            state, _, _, next_seq, stored, _ = row
+            if session_delta:
+                state = json.dumps({**json.loads(state), **session_delta})
+            if app_delta:
+                self._update_scoped(conn, SELECT_APP_STATE, UPSERT_APP_STATE, key[:1], app_delta)
+            if user_delta:
+                self._update_scoped(conn, SELECT_USER_STATE, UPSERT_USER_STATE, key[:2], user_delta)
+
+            conn.execute(INSERT_EVENT, (*key, next_seq, event.timestamp, event.model_dump_json(exclude_none=True)))
+            conn.execute(UPDATE_SESSION, (state, next_seq + 1, stored + 1, event.timestamp, *key))
+            if stored + 1 > self.window + self.compact_batch:
+                self._compact(conn, key, stored + 1 - self.window)
+
+        session.last_update_time = event.timestamp
+        return event
+
+    # --- Compaction and reclaim ---
+
+    def _compact(self, conn: sqlite3.Connection, key: tuple, count: int):
+        """Folds the `count` oldest stored events of a session into its summary."""
+        # Read one extra so a tool result is never separated from the call that produced it
+        rows = conn.execute(SELECT_OLDEST_EVENTS, (*key, count + self.compact_batch)).fetchall()
+        events = [(seq, Event.model_validate_json(data)) for seq, data in rows]
+        cut = count
+        while cut < len(events) and events[cut][1].get_function_responses():
+            cut += 1
+        folded = events[:cut]
+        if not folded:
+            return
+
+        lines = [line for _, event in folded if (line := summarize_event(event))]
+        summary = conn.execute(SELECT_SESSION, key).fetchone()[1]
+        summary = "\n".join(filter(None, [summary, *lines]))
+        if len(summary) > self.max_summary_chars:
+            summary = "…" + summary[-(self.max_summary_chars - 1):].split("\n", 1)[-1]
+
+        conn.execute(DELETE_EVENTS_UPTO, (*key, folded[-1][0]))
+        conn.execute(UPDATE_SUMMARY, (summary, len(folded), len(folded), *key))
+
+    def _summary_event(self, summary: str, compacted: int, before: float) -> Event:
+        return Event(
+            invocation_id="compacted-history",
+            author="user",
+            content=types.Content(role="user", parts=[types.Part(text=SUMMARY_PREFIX.format(count=compacted) + summary)]),
+            timestamp=before - 1e-3,
+        )
+
+    @staticmethod
+    def _update_scoped(conn, select_sql: str, upsert_sql: str, key: tuple, delta: dict) -> dict:
+        row = conn.execute(select_sql, key).fetchone()
+        state = json.loads(row[0]) if row else {}
+        if delta:
+            state.update(delta)
+            conn.execute(upsert_sql, (*key, json.dumps(state)))
+        return state
+
+    def reclaim_expired(self, now: Optional[float] = None) -> int:
+        """Deletes sessions (and their events) not updated within `ttl_s`. Returns how many."""
+        if self.ttl_s is None:
+            return 0
+        cutoff = (now or time.time()) - self.ttl_s
+        with self._transaction() as conn:
+            conn.execute(EXPIRED_EVENTS, (cutoff,))
+            reclaimed = conn.execute(EXPIRED_SESSIONS, (cutoff,)).rowcount
+        if reclaimed:
+            with self._lock:
+                # Each step of this pragma frees one page and sqlite3's execute() steps once, so
+                # it runs through executescript, which steps until every free page is released
+                self._conn.executescript("PRAGMA incremental_vacuum")
+                # The file is truncated once the freed pages are checkpointed out of the WAL
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return reclaimed
+
+    def _maybe_reclaim(self):
+        now = time.time()
+        if self.ttl_s is not None and now - self._last_reclaim >= self.reclaim_interval_s:
+            self._last_reclaim = now
+            self.reclaim_expired(now)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The shared modules are imported as `shared.*` from the repository root, as the projects do
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.dag import CRITICAL_PATH_KEY, Stage, StageTimer, build_pipeline, waves
+
+
+class SleepAgent(BaseAgent):
+    delay_s: float = 0.0
+    fail: bool = False
+
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(self.delay_s)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return
+        yield
+
+
+def run(pipeline) -> dict:
+    async def scenario():
+        sessions = InMemorySessionService()
+        session = await sessions.create_session(app_name="app", user_id="u")
+        runner = Runner(agent=pipeline, app_name="app", session_service=sessions)
+        message = types.Content(role="user", parts=[types.Part(text="go")])
+        async for _ in runner.run_async(user_id="u", session_id=session.id, new_message=message):
+            pass
+        return (await sessions.get_session(app_name="app", user_id="u", session_id=session.id)).state
+
+    return asyncio.run(scenario())
+
+
+def test_waves_follow_dependencies():
+    a, b, c = (Stage(SleepAgent(name=name)) for name in "abc")
+    join = Stage(SleepAgent(name="join"), after=("a", "b", "c"))
+    assert [[stage.name for stage in wave] for wave in waves([join, a, b, c])] == [["a", "b", "c"], ["join"]]
+
+
+def test_cycles_and_unknown_stages_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        waves([Stage(SleepAgent(name="a"), after=("b",)), Stage(SleepAgent(name="b"), after=("a",))])
+    with pytest.raises(ValueError, match="unknown"):
+        waves([Stage(SleepAgent(name="a"), after=("missing",))])
+
+
+def test_critical_path_runs_through_the_slowest_branch():
+    stages = [Stage(SleepAgent(name="fast", delay_s=0.01)), Stage(SleepAgent(name="slow", delay_s=0.1)),
+              Stage(SleepAgent(name="join"), after=("fast", "slow"))]
+    report = run(build_pipeline("pipeline", stages))[CRITICAL_PATH_KEY]
+    assert [step["stage"] for step in report["critical_path"]] == ["slow", "join"]
+
+
+def test_failed_runs_are_not_kept():
+    timer = StageTimer()
+    stages = [Stage(SleepAgent(name="ok")), Stage(SleepAgent(name="broken", fail=True), after=("ok",))]
+    with pytest.raises(RuntimeError):
+        run(build_pipeline("pipeline", stages, timer=timer))
+    assert timer._runs == {}
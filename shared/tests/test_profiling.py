@@ -0,0 +1,91 @@
+import asyncio
+import json
+from typing import AsyncGenerator
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared import profiling
+from shared.profiling import get_profiler, profiled, profiling_plugins, set_profiling
+
+
+@profiled
+def lookup(query: str) -> str:
+    """Looks something up."""
+    return query.upper()
+
+
+class ToolCallingLlm(BaseLlm):
+    """Calls `lookup` once, then answers."""
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        if any(part.function_response for content in llm_request.contents for part in content.parts or []):
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="done")]))
+            return
+        call = types.FunctionCall(name="lookup", args={"query": "valve"})
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+
+@pytest.fixture
+def profiler():
+    profiler = set_profiling(True)
+    profiler.reset()
+    yield profiler
+    set_profiling(False)
+    profiler.reset()
+
+
+def run_once(runner: Runner, session_service: InMemorySessionService) -> str:
+    session = asyncio.run(session_service.create_session(app_name="profiled", user_id="user"))
+    message = types.Content(role="user", parts=[types.Part(text="look it up")])
+    events = list(runner.run(user_id="user", session_id=session.id, new_message=message))
+    return events[-1].invocation_id
+
+
+def test_report_is_filtered_by_invocation(profiler):
+    session_service = InMemorySessionService()
+    agent = Agent(name="agent", model=ToolCallingLlm(model="fake"), tools=[lookup])
+    runner = Runner(agent=agent, app_name="profiled", session_service=session_service, plugins=profiling_plugins())
+
+    first = run_once(runner, session_service)
+    lookup("outside any run")
+    second = run_once(runner, session_service)
+
+    assert [row["calls"] for row in profiler.report(run=first)] == [1]
+    assert [row["calls"] for row in profiler.report(run=second)] == [1]
+    assert profiler.report()[0]["calls"] == 3
+    assert profiler.report(run="unknown") == []
+
+
+def test_plugins_are_off_with_profiling():
+    set_profiling(False)
+    assert profiling_plugins() == []
+
+
+def test_save_merges_only_new_calls(profiler, tmp_path):
+    lookup("a")
+    profiler.save(tmp_path)
+    lookup("b")
+    profiler.save(tmp_path)
+    profiler.save(tmp_path)
+
+    saved = json.loads((tmp_path / "calls.json").read_text())
+    assert saved["lookup"]["calls"] == 2
+    # Other sessions still report from the in-memory totals
+    assert profiler.report()[0]["calls"] == 2
+
+
+def test_peak_is_only_reset_by_a_call_running_alone(profiler, monkeypatch):
+    resets = []
+    monkeypatch.setattr(profiling.tracemalloc, "reset_peak", lambda: resets.append(True))
+
+    assert profiler._enter("outer")
+    assert not profiler._enter("inner")
+    profiler._exit("inner", profiling.CallStats(calls=1))
+    profiler._exit("outer", profiling.CallStats(calls=1))
+
+    assert len(resets) == 1
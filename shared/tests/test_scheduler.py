@@ -0,0 +1,118 @@
+import asyncio
+from typing import AsyncGenerator
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+from shared.scheduler import ModelQuota, ScheduledLlm, VertexScheduler, scheduled_model, set_scheduler
+
+MODEL = "test-model"
+
+
+def scheduler_with(limit: int, max_concurrency: int = 64) -> VertexScheduler:
+    scheduler = set_scheduler(VertexScheduler())
+    scheduler.configure(MODEL, ModelQuota(rpm=100_000, tpm=100_000_000, initial_concurrency=limit,
+                                          max_concurrency=max_concurrency))
+    return scheduler
+
+
+class EchoLlm(BaseLlm):
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="done")]))
+
+
+def test_slow_calls_do_not_shrink_the_limit():
+    scheduler = scheduler_with(limit=16)
+
+    async def calls():
+        # Answers get longer, as with growing outputs or thinking budgets, without any 429
+        for latency_s in (0.5, 2.0, 8.0, 30.0, 60.0):
+            scheduler.release(await scheduler.acquire(MODEL, 100), latency_s=latency_s)
+
+    asyncio.run(calls())
+    assert scheduler.metrics()[MODEL]["concurrency_limit"] == 16
+
+
+def test_limit_grows_only_while_calls_queue():
+    scheduler = scheduler_with(limit=1)
+
+    async def calls():
+        first = await scheduler.acquire(MODEL, 100)
+        waiting = asyncio.ensure_future(scheduler.acquire(MODEL, 100))
+        await asyncio.sleep(0.01)
+        scheduler.release(first, latency_s=1.0)
+        scheduler.release(await waiting, latency_s=1.0)
+
+    asyncio.run(calls())
+    assert scheduler.metrics()[MODEL]["concurrency_limit"] == 2
+
+
+def test_a_429_halves_the_limit_and_cools_down():
+    scheduler = scheduler_with(limit=16)
+
+    async def call():
+        scheduler.release(await scheduler.acquire(MODEL, 100), throttled=True)
+
+    asyncio.run(call())
+    metrics = scheduler.metrics()[MODEL]
+    assert metrics["concurrency_limit"] == 8
+    assert metrics["cooling_down"] and metrics["throttled"] == 1
+
+
+def test_interactive_calls_go_before_batch():
+    scheduler = scheduler_with(limit=1)
+    order = []
+
+    async def call(lane: str):
+        grant = await scheduler.acquire(MODEL, 100, lane)
+        order.append(lane)
+        scheduler.release(grant, latency_s=0.1)
+
+    async def calls():
+        holder = await scheduler.acquire(MODEL, 100)
+        batch = asyncio.ensure_future(call("batch"))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.ensure_future(call("interactive"))
+        await asyncio.sleep(0.01)
+        scheduler.release(holder, latency_s=0.1)
+        await asyncio.gather(batch, interactive)
+
+    asyncio.run(calls())
+    assert order == ["interactive", "batch"]
+
+
+def test_tools_calling_gemini_do_not_wait_on_their_own_agents_slot():
+    # ADK runs the tool calls of a final response before it resumes the model's generator.
+    # With a single slot, a tool that calls Gemini through the scheduler deadlocked while
+    # the agent's call still held it.
+    scheduler = scheduler_with(limit=1, max_concurrency=1)
+    model = ScheduledLlm(model=MODEL, inner=EchoLlm(model=MODEL))
+
+    async def agent_turn():
+        async for response in model.generate_content_async(LlmRequest(model=MODEL)):
+            assert response.content.parts[0].text == "done"
+            tool = scheduler.call(MODEL, lambda: asyncio.sleep(0, result="tool result"), tokens=100)
+            return await asyncio.wait_for(tool, timeout=2)
+
+    assert asyncio.run(agent_turn()) == "tool result"
+
+
+class ReplayedLlm(EchoLlm):
+    mode: str = "replay"
+
+
+def test_replayed_calls_go_through_the_scheduler_without_a_quota():
+    scheduler = set_scheduler(VertexScheduler())
+    model = scheduled_model(ReplayedLlm(model="replayed-model"))
+    assert isinstance(model, ScheduledLlm)
+
+    async def calls():
+        request = LlmRequest(contents=[types.Content(role="user", parts=[types.Part(text="x" * 400_000)])])
+        # Far more than the default quota of 300 requests and 1M tokens a minute
+        for _ in range(400):
+            async for _ in model.generate_content_async(request):
+                pass
+
+    asyncio.run(asyncio.wait_for(calls(), timeout=10))
+    metrics = scheduler.metrics()["replayed-model"]
+    assert metrics["granted"] == 400 and metrics["concurrency_limit"] == 16
@@ -0,0 +1,76 @@
+import asyncio
+import sqlite3
+import time
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from shared.sessions import SUMMARY_PREFIX, SqliteSessionService
+
+
+def message(author: str, text: str, **state) -> Event:
+    return Event(invocation_id="run", author=author, content=types.Content(role="user", parts=[types.Part(text=text)]),
+                 actions=EventActions(state_delta=state))
+
+
+def test_sessions_survive_a_restart(tmp_path):
+    async def scenario():
+        store = SqliteSessionService(tmp_path / "sessions.db")
+        session = await store.create_session(app_name="app", user_id="u", state={"user:name": "Ada"})
+        await store.append_event(session, message("user", "hello", topic="valves", **{"app:version": 2}))
+        store.close()
+
+        reopened = SqliteSessionService(tmp_path / "sessions.db")
+        restored = await reopened.get_session(app_name="app", user_id="u", session_id=session.id)
+        reopened.close()
+        return restored
+
+    restored = asyncio.run(scenario())
+    assert [event.content.parts[0].text for event in restored.events] == ["hello"]
+    assert restored.state == {"topic": "valves", "user:name": "Ada", "app:version": 2}
+
+
+def test_old_events_are_folded_into_a_summary(tmp_path):
+    async def scenario():
+        store = SqliteSessionService(tmp_path / "sessions.db", window=4, compact_batch=2)
+        session = await store.create_session(app_name="app", user_id="u")
+        for turn in range(10):
+            await store.append_event(session, message("user", f"question {turn}"))
+        return await store.get_session(app_name="app", user_id="u", session_id=session.id)
+
+    session = asyncio.run(scenario())
+    summary, *recent = session.events
+    assert summary.content.parts[0].text.startswith(SUMMARY_PREFIX.format(count=6))
+    assert "user: question 0" in summary.content.parts[0].text
+    assert [event.content.parts[0].text for event in recent] == [f"question {turn}" for turn in range(6, 10)]
+
+
+def test_reclaiming_expired_sessions_shrinks_the_file(tmp_path):
+    path = tmp_path / "sessions.db"
+
+    async def fill(store):
+        for _ in range(20):
+            session = await store.create_session(app_name="app", user_id="u")
+            for turn in range(20):
+                await store.append_event(session, message("model", f"answer {turn} " + "x" * 2000))
+
+    store = SqliteSessionService(path, ttl_s=60, reclaim_interval_s=float("inf"))
+    asyncio.run(fill(store))
+    store._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    filled = path.stat().st_size
+
+    assert store.reclaim_expired(now=time.time() + 3600) == 20
+    assert path.stat().st_size < filled / 4
+    store.close()
+
+
+def test_files_created_without_incremental_vacuum_are_converted(tmp_path):
+    path = tmp_path / "sessions.db"
+    legacy = sqlite3.connect(path)
+    legacy.execute("PRAGMA journal_mode=WAL")
+    legacy.execute("CREATE TABLE legacy (value TEXT)")
+    legacy.close()
+
+    store = SqliteSessionService(path)
+    assert store._conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    store.close()
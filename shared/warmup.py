@@ -0,0 +1,44 @@
+"""Background warm-up of the SDKs behind the pipelines.
+
+The agent modules import ADK, the genai types and the Vertex AI SDK lazily,
+inside the functions that build and run a pipeline, so an app can paint its
+first page without waiting seconds for them. Each project's agents module
+has a `preload()` that does that first use ahead of time: it imports what a
+run needs and initializes the SDK. The apps hand it to `warm_up` at the end
+of the script, once the page has been sent to the browser.
+
+If someone clicks Run before the warm-up is done, the run waits on Python's
+import lock for the rest instead of importing everything twice.
+"""
+
+import threading
+import time
+from typing import Callable
+
+_lock = threading.Lock()
+_started: dict[str, threading.Thread] = {}
+
+
+def _run(name: str, preload: Callable[[], None]):
+    started_at = time.perf_counter()
+    try:
+        preload()
+        print(f"🔥 Warmed up {name} in {time.perf_counter() - started_at:.1f}s")
+    except Exception as e:
+        # Best effort: the first real run raises the same error where the user can see it
+        print(f"⚠️ Warm-up of {name} failed: {e}")
+
+
+def warm_up(preload: Callable[[], None]) -> threading.Thread:
+    """
+    Runs `preload` in a daemon thread without waiting for it. Each preload
+    runs once per process; later calls, e.g. from every Streamlit rerun,
+    return the thread that is already running it.
+    """
+    name = f"{preload.__module__}.{preload.__qualname__}"
+    with _lock:
+        thread = _started.get(name)
+        if thread is None:
+            thread = _started[name] = threading.Thread(target=_run, args=(name, preload), name=f"warm-up {name}", daemon=True)
+            thread.start()
+    return thread